@@ -0,0 +1,262 @@
+import asyncio
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+
+import metrics
+from pipeline import (
+    classify_category, extract_merchants, generate_text, new_result, render_outputs, select_template,
+)
+from text_generated import get_response_texts_batched
+
+# Sentinel that tells a stage worker to stop
+_DONE = object()
+
+
+def _measured(stage, fn, *args, **kwargs):
+    """
+    Run fn as span `stage` inside its own metrics collector, so the timings can
+    travel back from a worker thread or process with the result.
+
+    :return: A tuple (fn's return value, metrics snapshot).
+    """
+    with metrics.collect() as collected:
+        with metrics.span(stage):
+            value = fn(*args, **kwargs)
+    return value, collected.snapshot()
+
+
+def _add_timings(result, snapshot):
+    merged = metrics.Metrics()
+    merged.merge(result["timings"])
+    merged.merge(snapshot)
+    result["timings"] = merged.snapshot()
+
+
+class RateLimiter:
+    """
+    Token bucket for asyncio tasks: at most `rate` acquisitions per `period` seconds.
+
+    Each acquisition reserves a token under the lock, letting the balance go
+    negative, and then sleeps outside the lock until its token is due, so
+    waiting callers do not hold up each other.
+    """
+
+    def __init__(self, rate, period=60.0):
+        """
+        :param rate: Number of requests allowed per period.
+        :param period: Length of the period in seconds.
+        """
+        self.rate = rate
+        self.period = period
+        self.tokens = float(rate)
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate / self.period)
+            self.updated = now
+            self.tokens -= 1
+            wait = -self.tokens * self.period / self.rate
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def acquire_from_thread(self, loop):
+        """
+        Acquire a token from a worker thread, blocking until it is due.
+
+        :param loop: The event loop the limiter is used on.
+        """
+        asyncio.run_coroutine_threadsafe(self.acquire(), loop).result()
+
+
+async def _extract_stage(store, cifs, llm_queue, results, workers):
+    for cif in cifs:
+        result = new_result(cif)
+        result["started"] = time.time()
+        try:
+            result["merchants"], timings = await asyncio.to_thread(
+                _measured, "stage.extract", extract_merchants, store, cif
+            )
+            _add_timings(result, timings)
+        except Exception as e:
+            result["error"] = str(e)
+        if result["error"] is None and not result["merchants"]:
+            result["status"] = "skipped"
+            result["error"] = "No matching data found for the given CIF."
+        elif result["error"] is None:
+            result["category"], timings = _measured("stage.classify", classify_category, result["merchants"])
+            _add_timings(result, timings)
+        if result["error"] is not None:
+            await results.put(result)
+            continue
+        # Blocks when the LLM stage is behind, which throttles extraction
+        await llm_queue.put(result)
+    for _ in range(workers):
+        await llm_queue.put(_DONE)
+
+
+async def _next_batch(llm_queue, batch_size):
+    """
+    Wait for one job, then take whatever else is already queued, up to batch_size.
+
+    :return: A tuple (jobs, done) where done means the stop sentinel was reached.
+    """
+    first = await llm_queue.get()
+    if first is _DONE:
+        return [], True
+    batch = [first]
+    while len(batch) < batch_size:
+        try:
+            job = llm_queue.get_nowait()
+        except asyncio.QueueEmpty:
+            break
+        if job is _DONE:
+            return batch, True
+        batch.append(job)
+    return batch, False
+
+
+async def _llm_stage(llm_queue, render_queue, results, limiter, executor, client, use_cache, batch_size):
+    loop = asyncio.get_running_loop()
+    done = False
+    while not done:
+        batch, done = await _next_batch(llm_queue, batch_size)
+        if not batch:
+            continue
+        try:
+            # Only requests that reach the model wait for the limiter, not cache hits; the batched
+            # call may also fall back to one request per customer, and each of those waits too
+            before_request = partial(limiter.acquire_from_thread, loop)
+            if batch_size > 1:
+                responses, timings = await loop.run_in_executor(executor, partial(
+                    _measured, "stage.llm", get_response_texts_batched,
+                    [job["merchants"] for job in batch], client, batch_size, use_cache,
+                    before_request=before_request,
+                ))
+            else:
+                response, timings = await loop.run_in_executor(executor, partial(
+                    _measured, "stage.llm", generate_text, batch[0]["merchants"], client, use_cache,
+                    before_request=before_request,
+                ))
+                responses = [response]
+            # One request serves the whole batch; charge it to the first customer so totals add up
+            _add_timings(batch[0], timings)
+        except Exception as e:
+            responses = [e] * len(batch)
+
+        for result, response in zip(batch, responses):
+            if response is None or isinstance(response, Exception):
+                result["error"] = str(response or "Failed to generate text.")
+                await results.put(result)
+                continue
+            result.update(llm_category=response[0], text=response[1])
+            # Blocks when every render worker is busy and the queue is full
+            await render_queue.put(result)
+
+
+async def _render_stage(render_queue, results, pool, output_dir, style, encoder, renditions):
+    loop = asyncio.get_running_loop()
+    while True:
+        result = await render_queue.get()
+        if result is _DONE:
+            return
+        try:
+            outputs, timings = await loop.run_in_executor(
+                pool, partial(_measured, "stage.render", render_outputs, encoder=encoder, renditions=renditions),
+                select_template(result["category"]), result["text"], result["cif"], output_dir, style,
+            )
+            _add_timings(result, timings)
+            if outputs is None:
+                result["error"] = "Failed to convert video to a compatible format."
+            else:
+                result.update(status="ok", output=next(iter(outputs.values())), outputs=outputs)
+        except Exception as e:
+            result["error"] = str(e)
+        await results.put(result)
+
+
+async def run_pipelined(store, cifs, output_dir="./output", style=None, client=None,
+                        llm_concurrency=8, requests_per_minute=30, render_workers=None,
+                        queue_size=None, on_result=None, pool=None, use_cache=True, llm_batch_size=1,
+                        encoder=None, renditions=None):
+    """
+    Run the batch pipeline with the LLM calls and the rendering overlapped.
+
+    Merchant extraction feeds a bounded queue of LLM requests; up to
+    llm_concurrency requests are in flight at once under a requests-per-minute
+    limit, each on a thread of a dedicated pool, and their captions feed a
+    bounded queue drained by a process pool of render workers. Full queues block the stage in front of them, so neither
+    side runs far ahead of the other.
+
+    :param store: A TransactionStore.
+    :param cifs: CIF values to render.
+    :param output_dir: Directory for the rendered videos.
+    :param style: Dict of add_text style arguments, see pipeline.DEFAULT_STYLE.
+    :param client: Groq-compatible client, e.g. a local stub; defaults to the shared Groq client.
+    :param llm_concurrency: Maximum number of LLM requests in flight.
+    :param requests_per_minute: Rate limit for LLM requests.
+    :param render_workers: Number of render processes (default: CPU count).
+    :param queue_size: Capacity of each stage queue (default: 2x the consumers of that queue).
+    :param on_result: Callback called with every finished result dict.
+    :param pool: Executor to render in, instead of a new process pool.
+    :param use_cache: Reuse cached LLM responses for the same merchant set.
+    :param llm_batch_size: Customers packed into one LLM request; 1 sends one request per customer.
+    :param encoder: Dict of libx264 options, see video_generated.ENCODER_DEFAULTS.
+    :param renditions: List of video_generated.RENDITIONS names to render from one decode.
+    :return: A list of result dicts, in completion order.
+    """
+    render_workers = render_workers or os.cpu_count() or 1
+    llm_queue = asyncio.Queue(maxsize=queue_size or 2 * llm_concurrency * llm_batch_size)
+    render_queue = asyncio.Queue(maxsize=queue_size or 2 * render_workers)
+    results = asyncio.Queue()
+    limiter = RateLimiter(requests_per_minute)
+    os.makedirs(output_dir, exist_ok=True)
+
+    own_pool = pool is None
+    pool = pool or ProcessPoolExecutor(max_workers=render_workers)
+    # Sized to llm_concurrency, unlike the shared default executor behind asyncio.to_thread
+    llm_executor = ThreadPoolExecutor(max_workers=llm_concurrency, thread_name_prefix="llm")
+    try:
+        async def stages():
+            try:
+                await _run_stages()
+            finally:
+                await results.put(_DONE)
+
+        async def _run_stages():
+            llm_tasks = [
+                asyncio.create_task(_llm_stage(
+                    llm_queue, render_queue, results, limiter, llm_executor, client, use_cache, llm_batch_size
+                ))
+                for _ in range(llm_concurrency)
+            ]
+            render_tasks = [
+                asyncio.create_task(_render_stage(render_queue, results, pool, output_dir, style, encoder, renditions))
+                for _ in range(render_workers)
+            ]
+            await _extract_stage(store, cifs, llm_queue, results, llm_concurrency)
+            await asyncio.gather(*llm_tasks)
+            for _ in range(render_workers):
+                await render_queue.put(_DONE)
+            await asyncio.gather(*render_tasks)
+
+        runner = asyncio.create_task(stages())
+        finished = []
+        while True:
+            result = await results.get()
+            if result is _DONE:
+                break
+            result["seconds"] = round(time.time() - result.pop("started"), 3)
+            finished.append(result)
+            if on_result:
+                on_result(result)
+        await runner
+        return finished
+    finally:
+        llm_executor.shutdown()
+        if own_pool:
+            pool.shutdown()
@@ -0,0 +1,247 @@
+"""
+Render personalized videos for a list of CIFs without the Streamlit UI.
+
+Usage:
+    python batch_render.py --all --workers 4
+    python batch_render.py --cifs cifs.txt --output-dir ./output/campaign
+    python batch_render.py --all --pipelined --llm-concurrency 16 --requests-per-minute 60
+    python batch_render.py --all --renditions 9:16,1:1,16:9
+
+With --renditions, each customer gets one file per format (e.g. 9:16, 1:1,
+16:9), all rendered from a single decode of the template.
+
+With --pipelined, LLM requests run concurrently (under a rate limit) while
+earlier customers are already rendering, instead of one after the other.
+
+Every finished CIF is appended to the manifest (JSON lines). Re-running the
+same command skips CIFs that already have an "ok" entry and an output file,
+so an interrupted run resumes where it stopped.
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import metrics
+from pipeline import DEFAULT_STYLE, LOGO_PATH, hex_to_bgr, open_store, run_cif
+from video_generated import ENCODER_DEFAULTS, RENDITIONS
+
+# Per-process state of the pool workers
+_worker = {}
+
+
+def _init_worker(data_path, torch_threads):
+    import torch
+    from get_data import warm_up
+
+    if torch_threads:
+        torch.set_num_threads(torch_threads)
+    _worker["store"] = open_store(data_path)
+    warm_up()
+
+
+def _run_worker(cif, output_dir, style, use_cache, encoder, renditions):
+    return run_cif(_worker["store"], cif, output_dir, style, use_cache=use_cache, encoder=encoder,
+                   renditions=renditions)
+
+
+def read_cifs(path):
+    """
+    Read one CIF per line, ignoring blank lines and # comments.
+
+    :param path: Path to the CIF list file.
+    :return: A list of CIF strings.
+    """
+    with open(path) as f:
+        lines = [line.split("#", 1)[0].strip() for line in f]
+    return [line for line in lines if line]
+
+
+def read_manifest(path):
+    """
+    :param path: Path to the manifest file.
+    :return: Dict of CIF (as string) -> last result recorded for it.
+    """
+    results = {}
+    if os.path.exists(path):
+        with open(path) as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    results[str(entry["cif"])] = entry
+    return results
+
+
+def pending_cifs(cifs, manifest):
+    """
+    Drop the CIFs that already rendered successfully in an earlier run.
+
+    :param cifs: List of CIFs to render.
+    :param manifest: Result dict from read_manifest().
+    :return: The CIFs that still need work.
+    """
+    done = {
+        cif for cif, entry in manifest.items()
+        if entry["status"] == "ok" and entry.get("output") and os.path.exists(entry["output"])
+    }
+    return [cif for cif in cifs if str(cif) not in done]
+
+
+def parse_cif(value):
+    """
+    Use an int for numeric CIFs, matching the type used by the Streamlit app.
+    """
+    return int(value) if str(value).isdigit() else value
+
+
+def parse_renditions(value):
+    """
+    Parse a comma-separated list of RENDITIONS names, e.g. "9:16,1:1,16:9".
+    """
+    names = [name.strip() for name in value.split(",") if name.strip()]
+    unknown = [name for name in names if name not in RENDITIONS]
+    if unknown:
+        raise argparse.ArgumentTypeError(f"unknown rendition(s): {', '.join(unknown)}")
+    return names
+
+
+def run_pool_batch(args, store, cifs, style, record):
+    """
+    Run every stage of each CIF inside a pool worker. The store is already
+    ingested, so each worker only memory-maps it.
+    """
+    with ProcessPoolExecutor(
+        max_workers=args.workers, initializer=_init_worker, initargs=(store.source_path, args.torch_threads)
+    ) as pool:
+        futures = {
+            pool.submit(
+                _run_worker, cif, args.output_dir, style, not args.no_llm_cache, encoder_from_args(args), args.renditions
+            ): cif
+            for cif in cifs
+        }
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as e:
+                result = {"cif": futures[future], "status": "error", "error": str(e)}
+            record(result)
+
+
+def run_pipelined_batch(args, store, cifs, style, record):
+    """
+    Extract merchants in this process and overlap LLM calls with rendering in pool workers.
+    """
+    from async_pipeline import run_pipelined
+    from get_data import warm_up
+
+    warm_up()
+    asyncio.run(run_pipelined(
+        store, cifs, args.output_dir, style,
+        llm_concurrency=args.llm_concurrency,
+        requests_per_minute=args.requests_per_minute,
+        render_workers=args.workers,
+        on_result=record,
+        use_cache=not args.no_llm_cache,
+        llm_batch_size=args.llm_batch_size,
+        encoder=encoder_from_args(args),
+        renditions=args.renditions,
+    ))
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    targets = parser.add_mutually_exclusive_group(required=True)
+    targets.add_argument("--cifs", help="File with one CIF per line")
+    targets.add_argument("--all", action="store_true", help="Render every CIF in the data file")
+    parser.add_argument("--data", default="./data/data.xlsx", help="Transaction Excel file")
+    parser.add_argument("--output-dir", default="./output")
+    parser.add_argument("--manifest", help="Result manifest (default: <output-dir>/manifest.jsonl)")
+    parser.add_argument("--metrics-report", help="Per-stage timing report (default: <output-dir>/metrics.json, "
+                                                  "plus metrics.prom in Prometheus text format)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--torch-threads", type=int, default=1, help="torch threads per worker")
+    parser.add_argument("--pipelined", action="store_true", help="Overlap LLM calls with rendering")
+    parser.add_argument("--llm-concurrency", type=int, default=8, help="LLM requests in flight (--pipelined)")
+    parser.add_argument("--requests-per-minute", type=int, default=30, help="LLM rate limit (--pipelined)")
+    parser.add_argument("--llm-batch-size", type=int, default=1, help="Customers per LLM request (--pipelined)")
+    parser.add_argument("--no-llm-cache", action="store_true", help="Always call the LLM, ignoring cached responses")
+    parser.add_argument("--renditions", type=parse_renditions,
+                        help=f"Comma-separated output formats rendered from one decode ({', '.join(RENDITIONS)})")
+    parser.add_argument("--preset", default=ENCODER_DEFAULTS["preset"], help="libx264 preset")
+    parser.add_argument("--crf", type=int, default=ENCODER_DEFAULTS["crf"], help="libx264 quality (lower is better)")
+    parser.add_argument("--encoder-threads", type=int, default=ENCODER_DEFAULTS["threads"],
+                        help="ffmpeg threads per render (0 = ffmpeg default)")
+    parser.add_argument("--font", help="TrueType font name (e.g. Arial) or .ttf path; default: OpenCV Hershey font")
+    parser.add_argument("--font-scale", type=float, default=DEFAULT_STYLE["font_scale"])
+    parser.add_argument("--font-thickness", type=int, default=DEFAULT_STYLE["font_thickness"])
+    parser.add_argument("--text-color", default="#FFFFFF")
+    parser.add_argument("--shadow-color", default="#000000")
+    parser.add_argument("--shadow-offset", type=int, nargs=2, default=DEFAULT_STYLE["shadow_offset"])
+    parser.add_argument("--logo", nargs="?", const=LOGO_PATH, help=f"Logo image on every frame (default: {LOGO_PATH})")
+    parser.add_argument("--logo-scale", type=float, default=DEFAULT_STYLE["logo_scale"])
+    parser.add_argument("--duration", type=int, default=DEFAULT_STYLE["duration"], help="Text duration in seconds")
+    return parser
+
+
+def style_from_args(args):
+    return {
+        "font_scale": args.font_scale,
+        "text_color": hex_to_bgr(args.text_color),
+        "font_thickness": args.font_thickness,
+        "shadow_color": hex_to_bgr(args.shadow_color),
+        "shadow_offset": tuple(args.shadow_offset),
+        "duration": args.duration,
+        "font": args.font,
+        "logo_path": args.logo,
+        "logo_scale": args.logo_scale,
+    }
+
+
+def encoder_from_args(args):
+    return {"preset": args.preset, "crf": args.crf, "threads": args.encoder_threads}
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    manifest_path = args.manifest or os.path.join(args.output_dir, "manifest.jsonl")
+    os.makedirs(os.path.dirname(os.path.abspath(manifest_path)), exist_ok=True)
+
+    # Ingest once here, before any pool worker starts, whichever CIF list is used
+    store = open_store(args.data)
+    cifs = store.cifs() if args.all else read_cifs(args.cifs)
+    todo = [parse_cif(cif) for cif in pending_cifs(cifs, read_manifest(manifest_path))]
+    print(f"{len(cifs)} CIFs, {len(cifs) - len(todo)} already done, {len(todo)} to render")
+    if not todo:
+        return 0
+
+    style = style_from_args(args)
+    counts = {"ok": 0, "skipped": 0, "error": 0}
+    run_metrics = metrics.Metrics()
+    start = time.time()
+    with open(manifest_path, "a") as manifest:
+        def record(result):
+            manifest.write(json.dumps(result) + "\n")
+            manifest.flush()
+            run_metrics.merge(result.get("timings"))
+            counts[result["status"]] += 1
+            print(f"[{sum(counts.values())}/{len(todo)}] CIF {result['cif']}: {result['status']}")
+
+        if args.pipelined:
+            run_pipelined_batch(args, store, todo, style, record)
+        else:
+            run_pool_batch(args, store, todo, style, record)
+
+    print(f"Done: {counts['ok']} ok, {counts['skipped']} skipped, {counts['error']} failed")
+    report_path = args.metrics_report or os.path.join(args.output_dir, "metrics.json")
+    snapshot = run_metrics.snapshot()
+    metrics.write_report(snapshot, report_path, {"wall_seconds": round(time.time() - start, 3), "cifs": len(todo), **counts})
+    for row in metrics.timing_rows(snapshot)[:8]:
+        print(f"  {row['stage']:<24} {row['seconds']:>10.3f}s  {row['calls']:>7} calls  {row['share']:>5}")
+    print(f"Metrics written to {report_path}")
+    return 1 if counts["error"] else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,51 @@
+"""
+Benchmark the location index: startup cost and stripping throughput.
+
+Compares parsing location_dict.json into a Python set (what loading the JSON
+at startup would cost) with opening the compiled, memory-mapped index, then
+reports how many synthetic SUBHEADERs per second are stripped and how many
+distinct strings are left for the merchant cache and NER.
+
+Usage:
+    python -m benchmarks.bench_location --sentences 20000
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from benchmarks.fixtures import synthetic_subheaders
+from location_index import LOCATION_DICT_PATH, LocationIndex, compile_location_index
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--source", default=LOCATION_DICT_PATH)
+    parser.add_argument("--sentences", type=int, default=20000)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    with open(args.source) as f:
+        names = {name for group in json.load(f).values() for name in group}
+    print(f"parse JSON          {time.perf_counter() - start:8.3f} s  ({len(names)} names)")
+
+    index_path = os.path.join(tempfile.mkdtemp(), "location_index.bin")
+    start = time.perf_counter()
+    compile_location_index(args.source, index_path)
+    print(f"compile index       {time.perf_counter() - start:8.3f} s  ({os.path.getsize(index_path) >> 10} KiB)")
+
+    start = time.perf_counter()
+    index = LocationIndex(index_path)
+    print(f"open mapped index   {time.perf_counter() - start:8.3f} s")
+
+    sentences = synthetic_subheaders(args.sentences)
+    start = time.perf_counter()
+    stripped = index.strip_all(sentences)
+    elapsed = time.perf_counter() - start
+    print(f"strip               {elapsed:8.3f} s  ({len(sentences) / elapsed:.0f} SUBHEADERs/s)")
+    print(f"distinct strings    {len(set(sentences))} -> {len(set(stripped))}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Benchmark logo compositing: the per-channel float loop versus the precomputed layer.
+
+The float loop is the previous overlay_logo, which converted the alpha channel
+to float64 and blended each channel separately on every frame. The layer path
+premultiplies the logo once (integer arithmetic) and blends each frame with
+composite_layer.
+
+Usage:
+    python -m benchmarks.bench_logo
+    python -m benchmarks.bench_logo --logo ./tamplate_video/wondr-color-3x.png --scales 0.5,1,2
+"""
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+from video_generated import composite_layer, make_logo_layer
+
+TEMPLATE = "./tamplate_video/video_template_mnm.mp4"
+LOGO = "./tamplate_video/wondr-color-3x.png"
+
+
+def overlay_logo_float(frame, logo, frame_width, frame_height, margin_left=10, margin_top=50):
+    """
+    The previous overlay_logo: float64 alpha and a Python loop over the channels.
+    """
+    logo_height, logo_width = logo.shape[:2]
+    x_start, y_start = margin_left, margin_top
+    x_end = min(x_start + logo_width, frame_width)
+    y_end = min(y_start + logo_height, frame_height)
+    roi_width = x_end - x_start
+    roi_height = y_end - y_start
+
+    resized_logo = logo[:roi_height, :roi_width]
+    roi = frame[y_start:y_end, x_start:x_end]
+
+    if resized_logo.shape[2] == 4:  # Logo with alpha channel
+        logo_bgr = resized_logo[:, :, :3]
+        alpha_mask = resized_logo[:, :, 3] / 255.0
+        for c in range(3):
+            roi[:, :, c] = (1 - alpha_mask) * roi[:, :, c] + alpha_mask * logo_bgr[:, :, c]
+    else:
+        roi[:, :, :] = resized_logo
+
+
+def read_frames(template, count):
+    cap = cv2.VideoCapture(template)
+    frames = []
+    while len(frames) < count:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(frame)
+    cap.release()
+    return frames
+
+
+def time_per_frame(draw, frames):
+    copies = [frame.copy() for frame in frames]
+    start = time.perf_counter()
+    for frame in copies:
+        draw(frame)
+    return (time.perf_counter() - start) / len(copies) * 1000, copies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--template", default=TEMPLATE)
+    parser.add_argument("--logo", default=LOGO)
+    parser.add_argument("--scales", default="0.5,1,2,4", help="Comma-separated logo scales")
+    parser.add_argument("--frames", type=int, default=120)
+    args = parser.parse_args()
+
+    frames = read_frames(args.template, args.frames)
+    height, width = frames[0].shape[:2]
+    source = cv2.imread(args.logo, cv2.IMREAD_UNCHANGED)
+
+    print(f"{'scale':>6} {'logo size':>10} {'float ms/frame':>15} {'layer ms/frame':>15} {'speedup':>8} {'max diff':>9}")
+    for scale in (float(s) for s in args.scales.split(",")):
+        logo = cv2.resize(source, (int(source.shape[1] * scale), int(source.shape[0] * scale)), interpolation=cv2.INTER_AREA)
+        float_ms, expected = time_per_frame(lambda frame: overlay_logo_float(frame, logo, width, height), frames)
+
+        start = time.perf_counter()
+        layer = make_logo_layer(logo, width, height)
+        setup_ms = (time.perf_counter() - start) * 1000
+        layer_ms, actual = time_per_frame(lambda frame: composite_layer(frame, layer), frames)
+
+        diff = max(int(np.abs(a.astype(np.int16) - e).max()) for a, e in zip(actual, expected))
+        print(f"{scale:>6} {f'{logo.shape[1]}x{logo.shape[0]}':>10} {float_ms:>15.3f} {layer_ms:>15.3f} "
+              f"{float_ms / layer_ms:>7.1f}x {diff:>9}   (layer setup once: {setup_ms:.2f} ms)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""
+Benchmark NER inference throughput across batch sizes on CPU.
+
+Usage:
+    python -m benchmarks.bench_ner --sentences 2000 --batch-sizes 1,8,32,128
+    python -m benchmarks.bench_ner --model ./model_NER/model/NER_merchant
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import torch
+
+from get_data import load_ner_model, predict_merchant_names
+from benchmarks.fixtures import build_tiny_ner_model, synthetic_subheaders
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", help="Model directory (default: a tiny random model)")
+    parser.add_argument("--sentences", type=int, default=2000)
+    parser.add_argument("--batch-sizes", default="1,8,32,128")
+    parser.add_argument("--threads", type=int, default=None, help="torch intra-op threads")
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    model_name = args.model or build_tiny_ner_model(os.path.join(tempfile.gettempdir(), "tiny_ner_model"))
+    load_ner_model(model_name)
+    sentences = synthetic_subheaders(args.sentences)
+
+    baseline = None
+    print(f"{'batch':>6} {'seconds':>9} {'sent/s':>9} {'speedup':>8}")
+    for batch_size in [int(b) for b in args.batch_sizes.split(",")]:
+        start = time.perf_counter()
+        names = predict_merchant_names(sentences, batch_size=batch_size, model_name=model_name)
+        elapsed = time.perf_counter() - start
+        if baseline is None:
+            baseline = (elapsed, names)
+        elif names != baseline[1]:
+            print(f"warning: batch size {batch_size} produced different merchant names")
+        print(f"{batch_size:>6} {elapsed:>9.3f} {len(sentences) / elapsed:>9.1f} {baseline[0] / elapsed:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
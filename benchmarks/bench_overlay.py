@@ -0,0 +1,149 @@
+"""
+Benchmark caption overlay: per-frame cv2.putText versus the precomputed sprite.
+
+For every bundled template it reports the overlay cost alone (on frames
+decoded up front) and the end-to-end add_text frame rate with a writer that
+discards frames (decode + overlay).
+
+Usage:
+    python -m benchmarks.bench_overlay
+    python -m benchmarks.bench_overlay --templates ./tamplate_video/video_template_mnm.mp4 --font-scale 1.5
+"""
+import argparse
+import glob
+import time
+
+import cv2
+
+from video_generated import (
+    add_text, calculate_text_position, composite_layer, make_overlay_layer, render_text_sprite, wrap_text,
+)
+
+CAPTION = (
+    "Haloo, kamu sering banget ngopi di Kopi Kenangan dan Starbucks, juga belanja kebutuhan harian "
+    "di Alfamart. Yuk terus nikmati promo spesial dari kami!"
+)
+
+
+class NullWriter:
+    """
+    VideoWriter stand-in that counts frames and drops them.
+    """
+
+    def __init__(self):
+        self.frames = 0
+
+    def write(self, frame):
+        self.frames += 1
+
+
+def draw_text_putText(frame, wrapped_text, y_start, frame_width, font_scale, text_color, font_thickness,
+                      shadow_color, shadow_offset):
+    """
+    The previous per-frame drawing: measure and draw every line with cv2.putText.
+    """
+    y = y_start
+    for line in wrapped_text:
+        text_size = cv2.getTextSize(line, cv2.FONT_HERSHEY_SIMPLEX, font_scale, font_thickness)[0]
+        x = (frame_width - text_size[0]) // 2
+        cv2.putText(frame, line, (x + shadow_offset[0], y + shadow_offset[1]), cv2.FONT_HERSHEY_SIMPLEX,
+                    font_scale, shadow_color, font_thickness, cv2.LINE_AA)
+        cv2.putText(frame, line, (x, y), cv2.FONT_HERSHEY_SIMPLEX, font_scale, text_color,
+                    font_thickness, cv2.LINE_AA)
+        y += text_size[1] + 9
+
+
+def add_text_putText(cap, out, text, fps, frame_width, frame_height, font_scale=1, text_color=(255, 255, 255),
+                     font_thickness=2, shadow_color=(0, 0, 0), shadow_offset=(2, 2), duration=10):
+    """
+    The previous add_text frame loop, drawing with cv2.putText on every frame.
+    """
+    wrapped_text = wrap_text(text, frame_width, font_scale, font_thickness)
+    y_start = calculate_text_position(wrapped_text, frame_height, font_scale, font_thickness)
+    text_frames = int(duration * fps)
+    frame_count = 0
+
+    while cap.isOpened():
+        ret, frame = cap.read()
+        if not ret:
+            break
+
+        frame_count += 1
+        if frame_count <= text_frames:
+            draw_text_putText(frame, wrapped_text, y_start, frame_width, font_scale, text_color, font_thickness,
+                              shadow_color, shadow_offset)
+
+        out.write(frame)
+
+
+def overlay_cost(template, font_scale, max_frames=120, style=None):
+    """
+    Time the per-frame overlay work alone on frames decoded up front.
+
+    :return: Dict of mode -> milliseconds per frame.
+    """
+    style = style or {"text_color": (255, 255, 255), "font_thickness": 2, "shadow_color": (0, 0, 0), "shadow_offset": (2, 2)}
+    cap = cv2.VideoCapture(template)
+    frames = []
+    while len(frames) < max_frames:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(frame)
+    cap.release()
+    height, width = frames[0].shape[:2]
+    wrapped_text = wrap_text(CAPTION, width, font_scale, style["font_thickness"])
+    y_start = calculate_text_position(wrapped_text, height, font_scale, style["font_thickness"])
+
+    def put_text(frame):
+        draw_text_putText(frame, wrapped_text, y_start, width, font_scale, **style)
+
+    sprite, x, y = render_text_sprite(wrapped_text, width, y_start, font_scale, style["text_color"],
+                                      style["font_thickness"], style["shadow_color"], style["shadow_offset"])
+    layer = make_overlay_layer(sprite, x, y, width, height)
+
+    costs = {}
+    for name, draw in (("putText", put_text), ("sprite", lambda frame: composite_layer(frame, layer))):
+        copies = [frame.copy() for frame in frames]
+        start = time.perf_counter()
+        for frame in copies:
+            draw(frame)
+        costs[name] = (time.perf_counter() - start) / len(copies) * 1000
+    return costs
+
+
+def run(render, template, font_scale, repeats):
+    best = None
+    for _ in range(repeats):
+        cap = cv2.VideoCapture(template)
+        fps = int(cap.get(cv2.CAP_PROP_FPS))
+        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        out = NullWriter()
+        start = time.perf_counter()
+        render(cap=cap, out=out, text=CAPTION, fps=fps, frame_width=width, frame_height=height,
+               font_scale=font_scale, duration=3600)
+        elapsed = time.perf_counter() - start
+        cap.release()
+        best = min(best or elapsed, elapsed)
+    return out.frames, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--templates", nargs="*", default=sorted(glob.glob("./tamplate_video/*.mp4")))
+    parser.add_argument("--font-scale", type=float, default=1.0)
+    parser.add_argument("--repeats", type=int, default=2)
+    args = parser.parse_args()
+
+    print(f"{'template':<32} {'mode':<10} {'overlay ms/frame':>17} {'overlay frames/s':>17} {'add_text frames/s':>18}")
+    for template in args.templates:
+        costs = overlay_cost(template, args.font_scale)
+        for name, render in (("putText", add_text_putText), ("sprite", add_text)):
+            frames, elapsed = run(render, template, args.font_scale, args.repeats)
+            print(f"{template.split('/')[-1]:<32} {name:<10} {costs[name]:>17.3f} {1000 / costs[name]:>17.0f} "
+                  f"{frames / elapsed:>18.1f}")
+
+
+if __name__ == "__main__":
+    main()
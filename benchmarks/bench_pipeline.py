@@ -0,0 +1,243 @@
+"""
+Offline benchmark of the whole pipeline, stage by stage and end to end.
+
+Everything runs on CPU without network access: a synthetic transaction
+spreadsheet, a tiny randomly initialized NER model, a stub Groq client with a
+fixed latency and the bundled templates. Caches, the transaction store and the
+outputs live under --workdir, which is wiped first, so every run starts cold
+and runs are comparable.
+
+Stages measured:
+    ingest         Excel -> Arrow store (cold), and reopening it (warm)
+    warm_up        merchant dictionary, location index and NER model load
+    extract        merchant extraction per CIF (cold caches, then warm)
+    classify       local category classifier per CIF
+    llm            stub LLM, one request per CIF and batched
+    render         caption render (cold frame/segment caches, then warm)
+    end_to_end     run_cif per CIF, and run_pipelined over the same CIFs
+
+Results are compared against benchmarks/thresholds.json; with --check the
+command exits with status 1 when a figure is past its limit.
+
+Usage:
+    python -m benchmarks.bench_pipeline
+    python -m benchmarks.bench_pipeline --cifs 200 --rows-per-cif 50 --renders 4 --check
+    python -m benchmarks.bench_pipeline --report ./bench_report.json --thresholds my_limits.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+THRESHOLDS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "thresholds.json")
+
+
+def percentile(values, q):
+    """
+    :return: The q-th percentile (0-100) of values, by nearest rank.
+    """
+    values = sorted(values)
+    if not values:
+        return 0.0
+    rank = max(int(round(q / 100 * len(values) + 0.5)) - 1, 0)
+    return values[min(rank, len(values) - 1)]
+
+
+def timed_each(fn, items):
+    """
+    Call fn on every item and time each call.
+
+    :return: A tuple (list of return values, dict of figures: count, seconds,
+             per_second, p50_ms, p95_ms).
+    """
+    values, latencies = [], []
+    start = time.perf_counter()
+    for item in items:
+        call_start = time.perf_counter()
+        values.append(fn(item))
+        latencies.append(time.perf_counter() - call_start)
+    elapsed = time.perf_counter() - start
+    return values, {
+        "count": len(items),
+        "seconds": round(elapsed, 4),
+        "per_second": round(len(items) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(statistics.median(latencies) * 1000, 2) if latencies else 0.0,
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+    }
+
+
+def timed_once(fn, *args, **kwargs):
+    """
+    :return: A tuple (fn's return value, dict with the elapsed seconds).
+    """
+    start = time.perf_counter()
+    value = fn(*args, **kwargs)
+    return value, {"seconds": round(time.perf_counter() - start, 4)}
+
+
+def flatten(results):
+    """
+    :return: Dict of "stage.figure" -> value, the keys used in thresholds.json.
+    """
+    return {f"{stage}.{name}": value for stage, figures in results.items() for name, value in figures.items()}
+
+
+def check_thresholds(results, thresholds):
+    """
+    Compare benchmark figures against their limits.
+
+    :param results: Dict of stage -> figures.
+    :param thresholds: Dict of "stage.figure" -> {"max": x} and/or {"min": x}.
+    :return: A list of messages, one per figure past its limit or missing.
+    """
+    figures = flatten(results)
+    failures = []
+    for key, limits in thresholds.items():
+        if key.startswith("_"):
+            continue
+        value = figures.get(key)
+        if value is None:
+            failures.append(f"{key}: not measured")
+            continue
+        if "max" in limits and value > limits["max"]:
+            failures.append(f"{key}: {value} > max {limits['max']}")
+        if "min" in limits and value < limits["min"]:
+            failures.append(f"{key}: {value} < min {limits['min']}")
+    return failures
+
+
+def prepare_workdir(workdir, keep):
+    """
+    Point the caches and the NER model at workdir. Must run before the pipeline
+    modules are imported, which read these paths at import time.
+
+    :return: A tuple (cache directory, model directory).
+    """
+    cache_dir = os.path.join(workdir, "cache")
+    if not keep:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+        shutil.rmtree(os.path.join(workdir, "output"), ignore_errors=True)
+    os.makedirs(cache_dir, exist_ok=True)
+    model_dir = os.path.join(workdir, "tiny_ner_model")
+    os.environ["PERSONALIZED_VIDEO_CACHE_DIR"] = cache_dir
+    os.environ["NER_MODEL_PATH"] = model_dir
+    return cache_dir, model_dir
+
+
+def run_benchmarks(args, model_dir):
+    import metrics
+    from async_pipeline import run_pipelined
+    from benchmarks.fixtures import StubGroqClient, build_tiny_ner_model, synthetic_transactions
+    from get_data import warm_up
+    from pipeline import (
+        DEFAULT_STYLE, classify_category, extract_merchants, generate_text, render_outputs, run_cif,
+        select_template,
+    )
+    from text_generated import get_response_texts_batched
+    from transaction_store import TransactionStore
+
+    results = {}
+    data_path = os.path.join(args.workdir, f"transactions_{args.cifs}x{args.rows_per_cif}_{args.seed}.xlsx")
+    if not os.path.exists(data_path):
+        synthetic_transactions(data_path, args.cifs, args.rows_per_cif, args.seed)
+    build_tiny_ner_model(model_dir, args.seed)
+    client = StubGroqClient(latency=args.llm_latency)
+    style = dict(DEFAULT_STYLE, duration=args.duration)
+    output_dir = os.path.join(args.workdir, "output")
+
+    store = TransactionStore(data_path)
+    _, results["ingest_cold"] = timed_once(store.refresh)
+    _, results["ingest_warm"] = timed_once(TransactionStore(data_path).refresh)
+    cifs = [int(cif) for cif in store.cifs()]
+
+    _, results["warm_up"] = timed_once(warm_up)
+
+    merchants, results["extract_cold"] = timed_each(lambda cif: extract_merchants(store, cif), cifs)
+    _, results["extract_warm"] = timed_each(lambda cif: extract_merchants(store, cif), cifs)
+    jobs = [(cif, found) for cif, found in zip(cifs, merchants) if found]
+
+    categories, results["classify"] = timed_each(lambda job: classify_category(job[1]), jobs)
+    texts, results["llm"] = timed_each(lambda job: generate_text(job[1], client, use_cache=False), jobs)
+    _, results["llm_batched"] = timed_once(
+        get_response_texts_batched, [found for _, found in jobs], client, args.llm_batch_size, False
+    )
+    results["llm_batched"].update(count=len(jobs), requests=client.calls - len(jobs))
+
+    renders = list(zip(jobs, categories, texts))[:args.renders]
+
+    def render(item):
+        (cif, _), category, (_, text) = item
+        return render_outputs(select_template(category), text, cif, output_dir, style)
+
+    for phase in ("render_cold", "render_warm"):
+        outputs, results[phase] = timed_each(render, renders)
+        results[phase]["failed"] = sum(output is None for output in outputs)
+
+    run_cifs = [cif for cif, _ in jobs[:args.renders]]
+    shutil.rmtree(output_dir, ignore_errors=True)
+    with metrics.collect() as run_metrics:
+        outcomes, results["end_to_end"] = timed_each(
+            lambda cif: run_cif(store, cif, output_dir, style, client, use_cache=False), run_cifs
+        )
+    results["end_to_end"]["failed"] = sum(outcome["status"] != "ok" for outcome in outcomes)
+
+    shutil.rmtree(output_dir, ignore_errors=True)
+    outcomes, results["pipelined"] = timed_once(
+        lambda: asyncio.run(run_pipelined(store, run_cifs, output_dir, style, client, use_cache=False,
+                                          requests_per_minute=6000))
+    )
+    results["pipelined"].update(
+        count=len(run_cifs),
+        per_second=round(len(run_cifs) / results["pipelined"]["seconds"], 2) if run_cifs else 0.0,
+        failed=sum(outcome["status"] != "ok" for outcome in outcomes),
+    )
+    return results, run_metrics.snapshot()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cifs", type=int, default=50, help="Customers in the synthetic spreadsheet")
+    parser.add_argument("--rows-per-cif", type=int, default=20, help="Transactions per customer")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--renders", type=int, default=2, help="CIFs rendered in the render and end-to-end stages")
+    parser.add_argument("--duration", type=float, default=3, help="Caption duration in seconds")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="Stub LLM seconds per request")
+    parser.add_argument("--llm-batch-size", type=int, default=8)
+    parser.add_argument("--workdir", default=os.path.join(tempfile.gettempdir(), "personalized_video_bench"))
+    parser.add_argument("--keep-cache", action="store_true", help="Do not wipe the caches in --workdir first")
+    parser.add_argument("--report", help="JSON report path (default: <workdir>/bench_report.json)")
+    parser.add_argument("--thresholds", default=THRESHOLDS_PATH)
+    parser.add_argument("--check", action="store_true", help="Exit with status 1 on a threshold regression")
+    args = parser.parse_args()
+
+    _, model_dir = prepare_workdir(args.workdir, args.keep_cache)
+    results, snapshot = run_benchmarks(args, model_dir)
+
+    print(f"{'stage':<14} {'count':>6} {'seconds':>9} {'per sec':>9} {'p50 ms':>9} {'p95 ms':>9}")
+    for stage, figures in results.items():
+        print(f"{stage:<14} {figures.get('count', ''):>6} {figures['seconds']:>9.3f} {figures.get('per_second', ''):>9} "
+              f"{figures.get('p50_ms', ''):>9} {figures.get('p95_ms', ''):>9}")
+
+    import metrics
+    report_path = args.report or os.path.join(args.workdir, "bench_report.json")
+    config = {name: value for name, value in vars(args).items() if name not in ("check", "report")}
+    metrics.write_report(snapshot, report_path, extra={"config": config, "benchmarks": results})
+    print(f"Report written to {report_path}")
+
+    with open(args.thresholds) as f:
+        failures = check_thresholds(results, json.load(f))
+    for failure in failures:
+        print(f"REGRESSION {failure}")
+    if not failures:
+        print("All figures within thresholds.")
+    if failures and args.check:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Benchmark app cold start and rerun times.
+
+Each measurement runs in a fresh Python process, so nothing is imported or
+loaded beforehand:
+    import      importing the modules the Streamlit app imports
+    warm_up     get_data.warm_up() after the imports (torch, transformers, model)
+    app         with streamlit installed: the first AppTest run of
+                video_personalized.py (cold start) and the following reruns
+
+Usage:
+    python -m benchmarks.bench_startup
+    python -m benchmarks.bench_startup --model ./model_NER/model/NER_merchant --reruns 10
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+IMPORT_SNIPPET = """
+import json, time
+start = time.perf_counter()
+import metrics, pipeline, get_data, text_generated, transaction_store, video_generated
+imported = time.perf_counter()
+ready = get_data.warm_up()
+print(json.dumps({"import": imported - start, "warm_up": time.perf_counter() - imported, "ready": ready}))
+"""
+
+APP_SNIPPET = """
+import json, sys, time
+from streamlit.testing.v1 import AppTest
+app = AppTest.from_file("video_personalized.py", default_timeout=600)
+start = time.perf_counter()
+app.run()
+cold = time.perf_counter() - start
+reruns = []
+for _ in range(int(sys.argv[1])):
+    start = time.perf_counter()
+    app.run()
+    reruns.append(time.perf_counter() - start)
+print(json.dumps({"cold_start": cold, "reruns": reruns}))
+"""
+
+
+def run_snippet(snippet, *args, env=None):
+    """
+    Run a Python snippet in a new process from the repository root.
+
+    :return: The JSON object printed on the snippet's last output line.
+    """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    completed = subprocess.run([sys.executable, "-c", snippet, *args], cwd=root, env=env,
+                               capture_output=True, text=True, check=True)
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", help="Model directory (default: a tiny random model)")
+    parser.add_argument("--repeats", type=int, default=3, help="Fresh processes for the import measurement")
+    parser.add_argument("--reruns", type=int, default=5)
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    if args.model:
+        env["NER_MODEL_PATH"] = args.model
+    else:
+        from benchmarks.fixtures import build_tiny_ner_model
+
+        env["NER_MODEL_PATH"] = build_tiny_ner_model(os.path.join(tempfile.gettempdir(), "tiny_ner_model"))
+
+    runs = [run_snippet(IMPORT_SNIPPET, env=env) for _ in range(args.repeats)]
+    print(f"import    {statistics.median(run['import'] for run in runs):8.3f} s  (median of {len(runs)} processes)")
+    print(f"warm_up   {statistics.median(run['warm_up'] for run in runs):8.3f} s  "
+          f"(model ready: {all(run['ready'] for run in runs)})")
+
+    try:
+        import streamlit  # noqa: F401
+    except ImportError:
+        print("app       skipped, streamlit is not installed")
+        return
+    app = run_snippet(APP_SNIPPET, str(args.reruns), env=env)
+    print(f"app cold  {app['cold_start']:8.3f} s")
+    if app["reruns"]:
+        print(f"app rerun {statistics.median(app['reruns']) * 1000:8.1f} ms  (median of {len(app['reruns'])})")
+
+
+if __name__ == "__main__":
+    main()
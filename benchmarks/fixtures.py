@@ -0,0 +1,151 @@
+import os
+import random
+import string
+
+# Merchant-like words used to synthesize SUBHEADER strings
+MERCHANT_WORDS = [
+    "ALFAMART", "INDOMARET", "STARBUCKS", "KFC", "MCDONALDS", "JCO", "GRAB",
+    "GOJEK", "TOKOPEDIA", "SHOPEE", "CGV", "XXI", "KOPI", "KENANGAN", "BAKMI",
+    "GM", "HOKBEN", "SOLARIA", "PERTAMINA", "GUARDIAN", "WATSONS", "ACE",
+]
+PREFIXES = ["QRIS", "PEMBAYARAN", "TRF", "DEBIT"]
+LOCATIONS = ["JAKARTA", "BANDUNG", "SURABAYA", "CIPUTAT", "BEKASI", "DEPOK"]
+
+
+def synthetic_subheaders(n, seed=0):
+    """
+    Generate SUBHEADER-like strings such as "QRIS ALFAMART 0123 BEKASI".
+
+    :param n: Number of strings to generate.
+    :param seed: Random seed for reproducible output.
+    :return: A list of strings.
+    """
+    rng = random.Random(seed)
+    subheaders = []
+    for _ in range(n):
+        words = [rng.choice(PREFIXES)]
+        words += rng.sample(MERCHANT_WORDS, rng.randint(1, 3))
+        words.append("".join(rng.choices(string.digits, k=rng.randint(2, 6))))
+        if rng.random() < 0.7:
+            words.append(rng.choice(LOCATIONS))
+        subheaders.append(" ".join(words))
+    return subheaders
+
+
+def synthetic_transactions(path, cifs=100, rows_per_cif=20, seed=0, payment_share=0.8):
+    """
+    Write a transaction spreadsheet with the columns the pipeline reads.
+
+    Every customer gets rows_per_cif rows; about payment_share of them are
+    payments ("Pembayaran" / "Pembayaran Qris") and the rest transfers, which
+    the merchant extraction filters out.
+
+    :param path: Path of the .xlsx file to write.
+    :param cifs: Number of customers.
+    :param rows_per_cif: Transactions per customer.
+    :param seed: Random seed for reproducible output.
+    :param payment_share: Fraction of rows that are payments.
+    :return: A list of the generated CIF values.
+    """
+    import pandas as pd
+
+    rng = random.Random(seed)
+    cif_values = [100000 + n for n in range(cifs)]
+    subheaders = synthetic_subheaders(cifs * rows_per_cif, seed)
+    rows = []
+    for n, cif in enumerate(cif_values):
+        for i in range(rows_per_cif):
+            trx_type = rng.choice(["Pembayaran", "Pembayaran Qris"]) if rng.random() < payment_share else "Transfer"
+            rows.append({
+                "CIF": cif,
+                "TRX_DATE": f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+                "TRX_TYPE": trx_type,
+                "SUBHEADER": subheaders[n * rows_per_cif + i],
+                "AMOUNT": rng.randint(10, 2000) * 1000,
+            })
+    rng.shuffle(rows)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    pd.DataFrame(rows).to_excel(path, index=False)
+    return cif_values
+
+
+def build_tiny_ner_model(path, seed=0):
+    """
+    Save a small randomly initialized BERT token-classification model and tokenizer.
+
+    The model has the same O/ORG label layout as NER_merchant, so it exercises
+    the whole inference path offline without the real weights.
+
+    :param path: Directory to write the model to.
+    :param seed: Random seed for the model weights.
+    :return: The model directory.
+    """
+    import torch
+    from transformers import BertConfig, BertForTokenClassification, BertTokenizerFast
+
+    if os.path.exists(os.path.join(path, "config.json")):
+        return path
+
+    os.makedirs(path, exist_ok=True)
+    chars = string.ascii_lowercase + string.digits
+    vocab = ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"]
+    vocab += list(chars) + ["##" + c for c in chars] + [w.lower() for w in MERCHANT_WORDS + PREFIXES + LOCATIONS]
+    vocab_file = os.path.join(path, "vocab.txt")
+    with open(vocab_file, "w") as f:
+        f.write("\n".join(vocab))
+
+    torch.manual_seed(seed)
+    config = BertConfig(
+        vocab_size=len(vocab),
+        hidden_size=64,
+        num_hidden_layers=2,
+        num_attention_heads=2,
+        intermediate_size=128,
+        num_labels=2,
+        id2label={0: "O", 1: "ORG"},
+        label2id={"O": 0, "ORG": 1},
+    )
+    BertForTokenClassification(config).save_pretrained(path)
+    BertTokenizerFast(vocab_file, do_lower_case=True).save_pretrained(path)
+    return path
+
+
+class StubGroqClient:
+    """
+    Offline stand-in for groq.Groq that answers chat completions after a fixed delay.
+
+    Only the attributes used by text_generated are implemented:
+    client.chat.completions.create(...).choices[0].message.content
+    """
+
+    def __init__(self, latency=0.0, category="makanan & minuman"):
+        """
+        :param latency: Seconds to sleep per request, to mimic network time.
+        :param category: Category returned in every response.
+        """
+        self.latency = latency
+        self.category = category
+        self.calls = 0
+        self.chat = self
+        self.completions = self
+
+    def create(self, messages, model, response_format=None, **kwargs):
+        import json
+        import time
+        from types import SimpleNamespace
+
+        self.calls += 1
+        time.sleep(self.latency)
+        caption = "Haloo, kamu sering bertransaksi di merchant favoritmu. Terus nikmati promonya ya!"
+        if response_format and response_format.get("type") == "json_object":
+            # Batched prompt: answer for every id listed after "Data input:"
+            payload = json.loads(messages[-1]["content"].rsplit("Data input:", 1)[1])
+            results = [{"id": entry["id"], "kategori": self.category, "ringkasan": caption} for entry in payload]
+            content = json.dumps({"hasil": results})
+        else:
+            content = f"{self.category} \n{caption}"
+        message = SimpleNamespace(content=content)
+        # Rough token counts (4 characters per token) so usage metrics are exercised
+        prompt_tokens = sum(len(m["content"]) for m in messages) // 4
+        usage = SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=len(content) // 4)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=usage)
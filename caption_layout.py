@@ -0,0 +1,261 @@
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+# Directories searched (recursively) for TrueType fonts, first match wins
+FONT_DIRS = [
+    "./fonts",
+    "/usr/share/fonts",
+    "/usr/local/share/fonts",
+    os.path.expanduser("~/.fonts"),
+    "/Library/Fonts",
+    "/System/Library/Fonts/Supplemental",
+    "C:/Windows/Fonts",
+]
+
+# Font names offered in the app -> candidate files, with metric-compatible fallbacks
+FONT_FILES = {
+    "Arial": ["arial.ttf", "Arial.ttf", "LiberationSans-Regular.ttf", "Arimo-Regular.ttf", "DejaVuSans.ttf"],
+    "Times New Roman": ["times.ttf", "Times New Roman.ttf", "LiberationSerif-Regular.ttf", "Tinos-Regular.ttf",
+                        "DejaVuSerif.ttf"],
+    "Courier New": ["cour.ttf", "Courier New.ttf", "LiberationMono-Regular.ttf", "Cousine-Regular.ttf",
+                    "DejaVuSansMono.ttf"],
+    "Verdana": ["verdana.ttf", "Verdana.ttf", "DejaVuSans.ttf"],
+    "Tahoma": ["tahoma.ttf", "Tahoma.ttf", "DejaVuSans.ttf"],
+}
+
+PIXELS_PER_SCALE = 32  # TrueType pixel size at font_scale 1.0, close to the Hershey caption height
+LINE_SPACING = 9
+SIDE_MARGIN = 24
+BOTTOM_MARGIN = 20
+LAYOUT_CACHE_SIZE = 1024  # wrapped captions kept per font; every customer has a different caption
+
+_lock = threading.Lock()
+_font_index = None
+_faces = {}
+
+
+def _index_fonts():
+    index = {}
+    for font_dir in FONT_DIRS:
+        if not os.path.isdir(font_dir):
+            continue
+        for root, _, files in os.walk(font_dir):
+            for name in files:
+                if name.lower().endswith((".ttf", ".otf")):
+                    index.setdefault(name.lower(), os.path.join(root, name))
+    return index
+
+
+def find_font_file(font):
+    """
+    Resolve a font name from the app (e.g. "Arial") or a path to a .ttf file.
+
+    :param font: Font name or file path.
+    :return: Path to the font file, or None if no candidate is installed.
+    """
+    global _font_index
+    if os.path.isfile(font):
+        return font
+    with _lock:
+        if _font_index is None:
+            _font_index = _index_fonts()
+        index = _font_index
+    for candidate in FONT_FILES.get(font, [font, f"{font}.ttf"]):
+        path = index.get(candidate.lower())
+        if path:
+            return path
+    return None
+
+
+class FontFace:
+    """
+    A TrueType font at one pixel size, with cached glyph advances, glyph
+    bitmaps and caption layouts.
+
+    Advances and bitmaps are computed once per character; wrapping measures
+    words by summing advances, and rasterizing a caption blits the cached
+    glyph bitmaps, so a new caption costs no FreeType calls for characters
+    seen before. Only the LAYOUT_CACHE_SIZE most recently wrapped captions are
+    kept.
+    """
+
+    def __init__(self, path, size, stroke_width=0):
+        """
+        :param path: Path to the TrueType/OpenType file.
+        :param size: Font size in pixels.
+        :param stroke_width: Extra stroke around the glyphs, in pixels (bolder text).
+        """
+        self.path = path
+        self.size = size
+        self.stroke_width = stroke_width
+        self.font = ImageFont.truetype(path, size)
+        ascent, descent = self.font.getmetrics()
+        self.ascent = ascent + stroke_width
+        self.line_height = ascent + descent + 2 * stroke_width
+        self._advances = {}
+        self._glyphs = {}
+        self._layouts = OrderedDict()
+        self._lock = threading.Lock()
+
+    def advance(self, char):
+        """
+        :return: Horizontal advance of a character in pixels.
+        """
+        width = self._advances.get(char)
+        if width is None:
+            width = self.font.getlength(char)
+            self._advances[char] = width
+        return width
+
+    def text_width(self, text):
+        return sum(self.advance(char) for char in text)
+
+    def glyph(self, char):
+        """
+        :return: Tuple (alpha bitmap, left, top) of a character relative to its baseline origin.
+        """
+        glyph = self._glyphs.get(char)
+        if glyph is None:
+            left, top, right, bottom = self.font.getbbox(char, anchor="ls", stroke_width=self.stroke_width)
+            image = Image.new("L", (max(right - left, 0), max(bottom - top, 0)))
+            if image.width and image.height:
+                ImageDraw.Draw(image).text((-left, -top), char, font=self.font, fill=255, anchor="ls",
+                                           stroke_width=self.stroke_width, stroke_fill=255)
+            glyph = (np.asarray(image), left, top)
+            self._glyphs[char] = glyph
+        return glyph
+
+    def wrap(self, text, max_width):
+        """
+        Greedy word wrap by measured pixel width; words wider than a line are split.
+
+        :param text: Caption text.
+        :param max_width: Maximum line width in pixels.
+        :return: A tuple of lines.
+        """
+        key = (text, max_width)
+        with self._lock:
+            lines = self._layouts.get(key)
+            if lines is not None:
+                self._layouts.move_to_end(key)
+                return lines
+
+            space = self.advance(" ")
+            lines = []
+            line, width = "", 0.0
+            for word in text.split():
+                word_width = self.text_width(word)
+                while word_width > max_width and len(word) > 1:
+                    # Flush the current line, then cut the word at the last character that fits
+                    if line:
+                        lines.append(line)
+                        line, width = "", 0.0
+                    cut, cut_width = 0, 0.0
+                    while cut < len(word) and cut_width + self.advance(word[cut]) <= max_width:
+                        cut_width += self.advance(word[cut])
+                        cut += 1
+                    cut = max(cut, 1)
+                    lines.append(word[:cut])
+                    word = word[cut:]
+                    word_width = self.text_width(word)
+                if line and width + space + word_width <= max_width:
+                    line, width = f"{line} {word}", width + space + word_width
+                else:
+                    if line:
+                        lines.append(line)
+                    line, width = word, word_width
+            if line:
+                lines.append(line)
+
+            lines = tuple(lines)
+            self._layouts[key] = lines
+            if len(self._layouts) > LAYOUT_CACHE_SIZE:
+                self._layouts.popitem(last=False)
+            return lines
+
+    def rasterize(self, line):
+        """
+        :return: Tuple (alpha mask, left, top) of one line; (left, top) is the offset of the
+                 mask from the line origin, whose baseline sits self.ascent below it.
+        """
+        positions = []
+        x = 0.0
+        for char in line:
+            bitmap, left, top = self.glyph(char)
+            positions.append((bitmap, int(round(x)) + left, self.ascent + top))
+            x += self.advance(char)
+        left = min([0] + [gx for _, gx, _ in positions])
+        top = min([0] + [gy for _, _, gy in positions])
+        right = max([int(np.ceil(x))] + [gx + b.shape[1] for b, gx, _ in positions])
+        bottom = max([self.line_height] + [gy + b.shape[0] for b, _, gy in positions])
+        mask = np.zeros((bottom - top, right - left), np.uint8)
+        for bitmap, gx, gy in positions:
+            if bitmap.size:
+                region = mask[gy - top:gy - top + bitmap.shape[0], gx - left:gx - left + bitmap.shape[1]]
+                np.maximum(region, bitmap, out=region)
+        return mask, left, top
+
+    def render_caption(self, text, frame_width, frame_height, text_color, shadow_color, shadow_offset):
+        """
+        Lay out a caption centered at the bottom of the frame and rasterize it with its shadow.
+
+        :return: Tuple (premultiplied BGRA sprite, x, y) ready for video_generated.make_overlay_layer.
+        """
+        lines = self.wrap(text, frame_width - 2 * SIDE_MARGIN)
+        if not lines:
+            return np.zeros((0, 0, 4), np.uint8), 0, 0
+
+        masks = [self.rasterize(line) for line in lines]
+        block_height = len(lines) * (self.line_height + LINE_SPACING) - LINE_SPACING
+        block_top = max(frame_height - block_height - BOTTOM_MARGIN, BOTTOM_MARGIN)
+
+        placed = []
+        for i, (mask, left, top) in enumerate(masks):
+            x = (frame_width - int(round(self.text_width(lines[i])))) // 2 + left
+            placed.append((mask, x, block_top + i * (self.line_height + LINE_SPACING) + top))
+
+        dx, dy = shadow_offset
+        left = min(x + min(0, dx) for _, x, _ in placed)
+        top = min(y + min(0, dy) for _, _, y in placed)
+        right = max(x + m.shape[1] + max(0, dx) for m, x, _ in placed)
+        bottom = max(y + m.shape[0] + max(0, dy) for m, _, y in placed)
+
+        text_alpha = np.zeros((bottom - top, right - left), np.uint8)
+        shadow_alpha = np.zeros_like(text_alpha)
+        for mask, x, y in placed:
+            h, w = mask.shape
+            for alpha, ox, oy in ((text_alpha, x, y), (shadow_alpha, x + dx, y + dy)):
+                region = alpha[oy - top:oy - top + h, ox - left:ox - left + w]
+                np.maximum(region, mask, out=region)
+
+        # Text over shadow, premultiplied
+        a_text = text_alpha[:, :, None].astype(np.float32) / 255
+        a_shadow = shadow_alpha[:, :, None].astype(np.float32) / 255
+        premult = (np.array(text_color, np.float32) * a_text
+                   + np.array(shadow_color, np.float32) * a_shadow * (1 - a_text))
+        alpha = a_text + a_shadow * (1 - a_text)
+        sprite = np.dstack([premult, alpha * 255])
+        return np.clip(np.rint(sprite), 0, 255).astype(np.uint8), left, top
+
+
+def get_font_face(font, font_scale=1.0, font_thickness=2):
+    """
+    Return the shared FontFace for a font name and the add_text size settings.
+
+    :param font: Font name from the app (e.g. "Arial") or a path to a font file.
+    :param font_scale: add_text font scale, converted with PIXELS_PER_SCALE.
+    :param font_thickness: add_text thickness; values above 2 add a stroke.
+    :return: A FontFace, or None if the font is not installed.
+    """
+    path = find_font_file(font)
+    if path is None:
+        return None
+    key = (path, max(int(round(PIXELS_PER_SCALE * font_scale)), 1), max((font_thickness - 1) // 2, 0))
+    with _lock:
+        if key not in _faces:
+            _faces[key] = FontFace(*key)
+        return _faces[key]
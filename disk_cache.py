@@ -0,0 +1,128 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# Root of every on-disk cache (responses, merchants, transaction store, frames, segments)
+CACHE_DIR = os.environ.get("PERSONALIZED_VIDEO_CACHE_DIR", "./.cache")
+
+
+class DiskCache:
+    """
+    Small persistent key/value cache backed by SQLite.
+
+    Entries live under a namespace (e.g. a model version); opening the cache
+    with a new namespace drops the rows of every other namespace, so a new
+    model or prompt invalidates old results automatically. Values are stored
+    as JSON. The least recently used entries are evicted once the cache holds
+    more than max_entries rows, and entries older than ttl seconds expire.
+    """
+
+    def __init__(self, path, namespace, max_entries=100000, ttl=None):
+        """
+        :param path: Path of the SQLite file, created if missing.
+        :param namespace: Version tag for the entries, e.g. a model hash.
+        :param max_entries: Maximum number of rows kept after eviction.
+        :param ttl: Lifetime of an entry in seconds, or None to keep entries until evicted.
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                "namespace TEXT, key TEXT, value TEXT, created REAL, last_used REAL, "
+                "PRIMARY KEY (namespace, key))"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS cache_last_used ON cache (last_used)")
+            self._conn.execute("DELETE FROM cache WHERE namespace != ?", (namespace,))
+
+    def get_many(self, keys):
+        """
+        Look up several keys at once and mark the found ones as recently used.
+
+        :param keys: Iterable of string keys.
+        :return: Dict of key -> value for the keys found in the cache.
+        """
+        keys = list(keys)
+        found = {}
+        now = time.time()
+        min_created = now - self.ttl if self.ttl else 0
+        with self._lock, self._conn:
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT key, value FROM cache WHERE namespace = ? AND created >= ? AND key IN ({placeholders})",
+                    [self.namespace, min_created] + chunk,
+                ).fetchall()
+                found.update((key, json.loads(value)) for key, value in rows)
+            self._conn.executemany(
+                "UPDATE cache SET last_used = ? WHERE namespace = ? AND key = ?",
+                [(now, self.namespace, key) for key in found],
+            )
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    def get(self, key, default=None):
+        """
+        :param key: String key.
+        :param default: Value returned on a miss.
+        :return: The cached value, or default.
+        """
+        return self.get_many([key]).get(key, default)
+
+    def set_many(self, items):
+        """
+        Store several key/value pairs and evict old entries if the cache is full.
+
+        :param items: Iterable of (key, value) pairs; values must be JSON serializable.
+        """
+        now = time.time()
+        rows = [(self.namespace, key, json.dumps(value), now, now) for key, value in items]
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?, ?)", rows)
+            self._evict(now)
+
+    def set(self, key, value):
+        """
+        :param key: String key.
+        :param value: JSON serializable value.
+        """
+        self.set_many([(key, value)])
+
+    def _evict(self, now):
+        if self.ttl:
+            self._conn.execute("DELETE FROM cache WHERE created < ?", (now - self.ttl,))
+        count = self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+        if count > self.max_entries:
+            self._conn.execute(
+                "DELETE FROM cache WHERE rowid IN (SELECT rowid FROM cache ORDER BY last_used LIMIT ?)",
+                (count - self.max_entries,),
+            )
+
+    def clear(self):
+        """
+        Remove every entry.
+        """
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM cache")
+
+    def stats(self):
+        """
+        :return: Dict with entry count, hits, misses and hit rate of this process.
+        """
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+        lookups = self.hits + self.misses
+        hit_rate = self.hits / lookups if lookups else 0.0
+        return {"entries": entries, "hits": self.hits, "misses": self.misses, "hit_rate": hit_rate}
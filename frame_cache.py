@@ -0,0 +1,235 @@
+import hashlib
+import os
+import tempfile
+import threading
+import time
+
+import cv2
+import numpy as np
+
+import metrics
+from disk_cache import CACHE_DIR
+
+FRAME_CACHE_DIR = os.path.join(CACHE_DIR, "frames")
+FRAME_CACHE_DISK_BYTES = 4 << 30  # disk space for decoded frame files; RAM use is up to the OS page cache
+
+# Fixed .npy header length, so the header can be rewritten with the real frame count after decoding
+_NPY_HEADER_SIZE = 128
+
+_lock = threading.Lock()
+_caches = {}
+
+
+def _npy_header(shape):
+    """
+    :return: A version 1.0 .npy header of _NPY_HEADER_SIZE bytes for a C-ordered uint8 array.
+    """
+    header = repr({"descr": "|u1", "fortran_order": False, "shape": tuple(shape)})
+    header = header.ljust(_NPY_HEADER_SIZE - 11) + "\n"
+    return b"\x93NUMPY\x01\x00" + len(header).to_bytes(2, "little") + header.encode("latin1")
+
+
+class FrameReader:
+    """
+    cv2.VideoCapture stand-in that serves frames from a decoded frame array.
+
+    read() returns read-only views into the array, so frames that are written
+    unchanged are never copied; callers that draw on a frame copy it first.
+    """
+
+    def __init__(self, frames):
+        self.frames = frames
+        self.position = 0
+
+    def isOpened(self):
+        return self.position < len(self.frames)
+
+    def read(self):
+        if self.position >= len(self.frames):
+            return False, None
+        frame = self.frames[self.position]
+        self.position += 1
+        return True, frame
+
+    def release(self):
+        self.position = len(self.frames)
+
+
+class TemplateFrameCache:
+    """
+    Decoded template frames stored as memory-mapped .npy files.
+
+    Each template is decoded once, completely, into a single uint8 array of
+    shape (frames, height, width, 3); renders that need only the first frames
+    get a slice of it. Every render (and every worker process, through the OS
+    page cache) maps the same file instead of decoding the video again. Files
+    are named after the template path, size and mtime, so an edited template is
+    decoded again and its old file dropped. The least recently used files are
+    deleted once their total size on disk goes over max_bytes; how much of them
+    stays in RAM is up to the OS page cache.
+    """
+
+    def __init__(self, cache_dir=FRAME_CACHE_DIR, max_bytes=FRAME_CACHE_DISK_BYTES):
+        """
+        :param cache_dir: Directory of the .npy frame files.
+        :param max_bytes: Disk space for all cached frame files, in bytes.
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._arrays = {}
+
+    def _prefix(self, video_path):
+        return hashlib.sha1(os.path.abspath(video_path).encode()).hexdigest()[:16]
+
+    def _entries(self):
+        """
+        :return: List of (path, size, last_used) for every cached file.
+        """
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".npy"):
+                path = os.path.join(self.cache_dir, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue  # Evicted by another process
+                entries.append((path, stat.st_size, stat.st_mtime))
+        return entries
+
+    def _path(self, video_path, stat):
+        """
+        Path of the frame file for the current version of a template; files of
+        older versions are removed.
+        """
+        template = self._prefix(video_path)
+        path = os.path.join(self.cache_dir, f"{template}-{stat.st_size}-{stat.st_mtime_ns}.npy")
+        for entry, _, _ in self._entries():
+            if entry != path and os.path.basename(entry).startswith(template):
+                self._remove(entry)
+        return path
+
+    def _remove(self, path):
+        self._arrays.pop(path, None)
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def _evict(self, needed):
+        entries = sorted(self._entries(), key=lambda entry: entry[2])
+        total = sum(size for _, size, _ in entries)
+        for path, size, _ in entries:
+            if total + needed <= self.max_bytes:
+                break
+            self._remove(path)
+            total -= size
+
+    def _decode(self, video_path, path):
+        cap = cv2.VideoCapture(video_path)
+        if not cap.isOpened():
+            raise IOError(f"Unable to open video file: {video_path}")
+        try:
+            # CAP_PROP_FRAME_COUNT is only an estimate for many mp4 files (even 0 or -1); it sizes
+            # the eviction, while the file holds exactly the frames that were decoded
+            estimate = max(int(cap.get(cv2.CAP_PROP_FRAME_COUNT)), 0)
+            frame_shape = (int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)), int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), 3)
+            frame_bytes = int(np.prod(frame_shape))
+            if estimate * frame_bytes > self.max_bytes:
+                return None
+            self._evict(estimate * frame_bytes)
+
+            fd, tmp_path = tempfile.mkstemp(suffix=".tmp", dir=self.cache_dir)
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(_npy_header((0,) + frame_shape))
+                    decoded = 0
+                    while True:
+                        ret, frame = cap.read()
+                        if not ret:
+                            break
+                        if frame.shape != frame_shape:
+                            raise IOError(f"Frame {decoded} of {video_path} has shape {frame.shape}, not {frame_shape}")
+                        if (decoded + 1) * frame_bytes > self.max_bytes:
+                            return None
+                        f.write(np.ascontiguousarray(frame, np.uint8).data)
+                        decoded += 1
+                    if not decoded:
+                        raise IOError(f"No frames decoded from {video_path}")
+                    f.seek(0)
+                    f.write(_npy_header((decoded,) + frame_shape))
+                # Concurrent builders write identical files; the last rename wins
+                os.replace(tmp_path, path)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+            return path
+        finally:
+            cap.release()
+
+    def get(self, video_path, max_frames=None):
+        """
+        Return the first max_frames decoded frames of a template, decoding it on first use.
+
+        :param video_path: Path to the template video.
+        :param max_frames: Number of frames needed from the start, None for all.
+        :return: Read-only uint8 array (memory-mapped) of shape (frames, height, width, 3),
+                 or None if the decoded frames would not fit in max_bytes.
+        """
+        stat = os.stat(video_path)
+        with self._lock:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            path = self._path(video_path, stat)
+            frames = None
+            for _ in range(2):
+                if os.path.exists(path):
+                    self.hits += 1
+                    metrics.increment("frame_cache.hits")
+                else:
+                    self.misses += 1
+                    metrics.increment("frame_cache.misses")
+                    with metrics.span("frame_cache.decode"):
+                        if self._decode(video_path, path) is None:
+                            return None
+                try:
+                    os.utime(path, (time.time(), time.time()))
+                    frames = self._arrays.get(path)
+                    if frames is None:
+                        frames = np.load(path, mmap_mode="r")
+                        self._arrays[path] = frames
+                    break
+                except FileNotFoundError:
+                    # Evicted by another process in between; decode again
+                    self._arrays.pop(path, None)
+            if frames is None:
+                raise IOError(f"Frame cache file for {video_path} keeps disappearing: {path}")
+        return frames if max_frames is None else frames[:max_frames]
+
+    def stats(self):
+        """
+        :return: Dict with hits, misses and the bytes and number of cached files.
+        """
+        with self._lock:
+            entries = self._entries() if os.path.isdir(self.cache_dir) else []
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "files": len(entries),
+            "bytes": sum(size for _, size, _ in entries),
+        }
+
+
+def get_frame_cache(cache_dir=FRAME_CACHE_DIR, max_bytes=FRAME_CACHE_DISK_BYTES):
+    """
+    Return the process-wide frame cache for cache_dir, creating it on first use.
+
+    :param cache_dir: Directory of the .npy frame files.
+    :param max_bytes: Disk space for the frame files in bytes, used when the cache is created.
+    :return: A TemplateFrameCache instance.
+    """
+    with _lock:
+        if cache_dir not in _caches:
+            _caches[cache_dir] = TemplateFrameCache(cache_dir, max_bytes)
+        return _caches[cache_dir]
@@ -1,7 +1,24 @@
-import torch
-import pandas as pd
-from transformers import AutoTokenizer, AutoModelForTokenClassification
-from torch.utils.data import DataLoader
+import os
+import hashlib
+import threading
+import time
+import numpy as np
+import metrics
+from disk_cache import CACHE_DIR, DiskCache
+from location_index import get_location_index
+from merchant_matcher import get_merchant_matcher
+
+MODEL_NAME = os.environ.get("NER_MODEL_PATH", "./model_NER/model/NER_merchant")
+NER_BATCH_SIZE = 32
+MERCHANT_CACHE_PATH = os.path.join(CACHE_DIR, "merchant_cache.sqlite")
+MERCHANT_CACHE_SIZE = 200000
+
+# Process-wide NER model registry, filled lazily by load_ner_model().
+# torch and transformers take seconds to import, so they are imported on first use.
+_ner_lock = threading.Lock()
+_ner_registry = {}
+_ner_versions = {}
+_merchant_caches = {}
 
 def load_data(file_path):
     """
@@ -10,12 +27,232 @@ def load_data(file_path):
     :param file_path: Path to the Excel file containing the data.
     :return: A pandas DataFrame with the loaded data.
     """
+    import pandas as pd
+
     try:
-        return pd.read_excel(file_path)
+        with metrics.span("data.load_excel"):
+            return pd.read_excel(file_path)
     except Exception as e:
         print(f"An error occurred while loading the file: {e}")
         return None
 
+def model_version(model_name=MODEL_NAME):
+    """
+    Fingerprint the model files on disk, so replacing NER_merchant changes the version.
+
+    :param model_name: Path or hub name of the token-classification model.
+    :return: A short hex digest, or the model name itself when it is not a local directory.
+    """
+    if not os.path.isdir(model_name):
+        return model_name
+    digest = hashlib.sha1()
+    for root, _, files in sorted(os.walk(model_name)):
+        for name in sorted(files):
+            stat = os.stat(os.path.join(root, name))
+            digest.update(f"{os.path.relpath(os.path.join(root, name), model_name)}:{stat.st_size}:{stat.st_mtime_ns};".encode())
+    return digest.hexdigest()[:16]
+
+def load_ner_model(model_name=MODEL_NAME, reload=False):
+    """
+    Return the cached (tokenizer, model) pair, loading it from disk on first use.
+
+    :param model_name: Path or hub name of the token-classification model.
+    :param reload: Force loading the model again, e.g. after NER_merchant was replaced.
+    :return: A tuple (tokenizer, model) with the model in eval mode.
+    """
+    with _ner_lock:
+        if reload or model_name not in _ner_registry:
+            from transformers import AutoTokenizer, AutoModelForTokenClassification
+
+            with metrics.span("ner.load_model"):
+                tokenizer = AutoTokenizer.from_pretrained(model_name)
+                model = AutoModelForTokenClassification.from_pretrained(model_name)
+                model.eval()
+            _ner_registry[model_name] = (tokenizer, model)
+            _ner_versions[model_name] = model_version(model_name)
+        return _ner_registry[model_name]
+
+def reload_ner_model(model_name=MODEL_NAME):
+    """
+    Drop the cached model and load it again from disk.
+
+    :param model_name: Path or hub name of the token-classification model.
+    :return: The freshly loaded (tokenizer, model) pair.
+    """
+    return load_ner_model(model_name, reload=True)
+
+def get_merchant_cache(model_name=MODEL_NAME):
+    """
+    Return the persistent SUBHEADER -> merchant cache for the current model version.
+
+    :param model_name: Path or hub name of the token-classification model.
+    :return: A DiskCache whose entries are dropped when the model or location index changes.
+    """
+    version = f"{_ner_versions.get(model_name) or model_version(model_name)}-{get_location_index().version}"
+    with _ner_lock:
+        if version not in _merchant_caches:
+            _merchant_caches.clear()
+            _merchant_caches[version] = DiskCache(MERCHANT_CACHE_PATH, version, max_entries=MERCHANT_CACHE_SIZE)
+        return _merchant_caches[version]
+
+def warm_up(model_name=MODEL_NAME):
+    """
+    Load the merchant dictionary, location index and NER model ahead of the first request.
+    Safe to call at app startup.
+
+    :param model_name: Path or hub name of the token-classification model.
+    :return: True if the model is ready, False if loading failed.
+    """
+    try:
+        get_merchant_matcher()
+        get_location_index()
+        load_ner_model(model_name)
+        return True
+    except Exception as e:
+        print(f"An error occurred while loading the NER model: {e}")
+        return False
+
+def _pad_batch(sequences, pad_id, padding_side="right"):
+    """
+    Pad a list of token id lists to the longest one in the batch.
+
+    :param sequences: Token id lists of one batch.
+    :param pad_id: Id used for padding positions.
+    :param padding_side: "right" or "left", following the tokenizer.
+    :return: A tuple (padded ids, attention mask) as int64 arrays.
+    """
+    width = max(len(seq) for seq in sequences)
+    ids = np.full((len(sequences), width), pad_id, dtype=np.int64)
+    mask = np.zeros((len(sequences), width), dtype=np.int64)
+    for row, seq in enumerate(sequences):
+        if padding_side == "left":
+            ids[row, width - len(seq):] = seq
+            mask[row, width - len(seq):] = 1
+        else:
+            ids[row, :len(seq)] = seq
+            mask[row, :len(seq)] = 1
+    return ids, mask
+
+def _merge_org_tokens(tokens):
+    """
+    Join ORG-labelled tokens into a merchant name, merging WordPiece subwords.
+
+    :param tokens: Tokens predicted as ORG, in sentence order.
+    :return: The merchant name as a string.
+    """
+    merchant_words = []
+    for token in tokens:
+        if token in ["[CLS]", "[SEP]", "[PAD]"]:
+            continue
+        token = token.replace("▁", "")  # Remove BPE markers
+
+        # Handle subword merging safely
+        if token.startswith("##") and merchant_words:
+            merchant_words[-1] += token[2:]  # Merge subwords
+        else:
+            merchant_words.append(token)
+    return " ".join(merchant_words).strip()  # Clean up spaces
+
+def predict_merchant_names(sentences, batch_size=NER_BATCH_SIZE, model_name=MODEL_NAME):
+    """
+    Extract a merchant name from every sentence with the NER model.
+
+    Sentences are sorted by token length and run in batches padded only to the
+    longest sentence of each batch, so short SUBHEADERs never pay for long ones.
+
+    :param sentences: A list of SUBHEADER strings.
+    :param batch_size: Number of sentences per forward pass.
+    :param model_name: Path or hub name of the token-classification model.
+    :return: A list of merchant names aligned with the input sentences.
+    """
+    if not sentences:
+        return []
+
+    import torch
+
+    tokenizer, model = load_ner_model(model_name)
+    start = time.perf_counter()
+    encodings = tokenizer(sentences, truncation=True)
+    input_ids = encodings["input_ids"]
+    lengths = np.array([len(ids) for ids in input_ids])
+    order = np.argsort(lengths, kind="stable")
+    pad_id = tokenizer.pad_token_id if tokenizer.pad_token_id is not None else 0
+
+    # Raw label ids of the real (non-padding) tokens, per sentence
+    token_labels = [None] * len(sentences)
+    with torch.no_grad():
+        for offset in range(0, len(order), batch_size):
+            batch_idx = order[offset:offset + batch_size]
+            ids, mask = _pad_batch([input_ids[i] for i in batch_idx], pad_id, tokenizer.padding_side)
+            inputs = {
+                "input_ids": torch.from_numpy(ids).to(model.device),
+                "attention_mask": torch.from_numpy(mask).to(model.device),
+            }
+            if "token_type_ids" in encodings:
+                inputs["token_type_ids"] = torch.zeros_like(inputs["input_ids"])
+            predictions = torch.argmax(model(**inputs).logits, dim=-1).cpu().numpy()
+            for row, i in enumerate(batch_idx):
+                token_labels[i] = predictions[row][mask[row].astype(bool)]
+
+    # Map every label of every batch to an ORG flag in one step
+    num_labels = len(model.config.id2label)
+    is_org_label = np.array([model.config.id2label[i] == "ORG" for i in range(num_labels)])
+    is_org = np.split(is_org_label[np.concatenate(token_labels)], np.cumsum(lengths)[:-1])
+
+    merchant_names = []
+    for ids, org_mask in zip(input_ids, is_org):
+        org_ids = np.asarray(ids)[org_mask].tolist()
+        merchant_names.append(_merge_org_tokens(tokenizer.convert_ids_to_tokens(org_ids)))
+
+    metrics.record("ner.inference", time.perf_counter() - start)
+    metrics.increment("ner.sentences", len(sentences))
+    metrics.increment("ner.tokens", int(lengths.sum()))
+    return merchant_names
+
+def extract_merchant_names(sentences, use_cache=True):
+    """
+    Resolve merchant names for a list of SUBHEADERs with as few model calls as possible.
+
+    Each distinct string is resolved once: master_merchant.json first, then the
+    persistent merchant cache, and only the remaining misses go through NER.
+    District names at the end of a SUBHEADER are stripped before the cache and
+    NER steps, so "QRIS KFC 01 BEKASI" and "QRIS KFC 01 DEPOK" share one entry.
+
+    :param sentences: A list of SUBHEADER strings.
+    :param use_cache: Read and write the on-disk merchant cache.
+    :return: A list of merchant names aligned with the input sentences.
+    """
+    unique_sentences = list(dict.fromkeys(sentences))
+    with metrics.span("merchant.match"):
+        names = dict(zip(unique_sentences, get_merchant_matcher().match_all(unique_sentences)))
+    misses = [sentence for sentence, name in names.items() if name is None]
+    metrics.increment("merchant_matcher.hits", len(unique_sentences) - len(misses))
+    metrics.increment("merchant_matcher.misses", len(misses))
+    if not misses:
+        return [names[sentence] for sentence in sentences]
+
+    with metrics.span("location.strip"):
+        stripped = dict(zip(misses, get_location_index().strip_all(misses)))
+    metrics.increment("location.stripped", sum(key != sentence for sentence, key in stripped.items()))
+    keys = list(dict.fromkeys(stripped.values()))
+    resolved = dict.fromkeys(keys)
+
+    if use_cache:
+        resolved.update(get_merchant_cache().get_many(keys))
+        looked_up = len(keys)
+        keys = [key for key in keys if resolved[key] is None]
+        metrics.increment("merchant_cache.hits", looked_up - len(keys))
+        metrics.increment("merchant_cache.misses", len(keys))
+
+    if keys:
+        predicted = predict_merchant_names(keys)
+        resolved.update(zip(keys, predicted))
+        if use_cache:
+            get_merchant_cache().set_many(zip(keys, predicted))
+
+    names.update((sentence, resolved[key]) for sentence, key in stripped.items())
+    return [names[sentence] for sentence in sentences]
+
 def get_unique_subheaders(data, cif):
     """
     Retrieve unique SUBHEADER values based on the given CIF and specific TRX_TYPE conditions.
@@ -31,57 +268,8 @@ def get_unique_subheaders(data, cif):
             ((data['TRX_TYPE'] == 'Pembayaran') | (data['TRX_TYPE'] == 'Pembayaran Qris'))
         ]
 
-        # Load Model & Tokenizer (Replace with your model)
-        model_name = "./model_NER/model/NER_merchant"
-        tokenizer = AutoTokenizer.from_pretrained(model_name)
-        model = AutoModelForTokenClassification.from_pretrained(model_name)
-        model.eval()
-
-        class PredictionDataset(torch.utils.data.Dataset):
-            def __init__(self, sentences):
-                self.inputs = tokenizer(
-                    sentences, 
-                    padding=True,
-                    truncation=True,
-                    return_tensors="pt"
-                )
-
-            def __len__(self):
-                return len(self.inputs["input_ids"])
-
-            def __getitem__(self, idx):
-                return {key: val[idx] for key, val in self.inputs.items()}
-
-
         sentences = filtered_data['SUBHEADER'].tolist()
-        dataset = PredictionDataset(sentences)
-        dataloader = DataLoader(dataset, batch_size=1)
-
-        merchant_names = []
-
-        with torch.no_grad():
-            for batch in dataloader:
-                inputs = {k: v.to(model.device) for k, v in batch.items()}
-                outputs = model(**inputs)
-                logits = outputs.logits
-                predictions = torch.argmax(logits, dim=-1).cpu().numpy()[0]
-
-                tokens = tokenizer.convert_ids_to_tokens(batch["input_ids"][0])
-                merchant_words = []
-
-                for token, label in zip(tokens, predictions):
-                    entity = model.config.id2label[label]  # Convert label ID to entity name
-
-                    if entity == "ORG" and token not in ["[CLS]", "[SEP]", "[PAD]"]:
-                        token = token.replace("▁", "")  # Remove BPE markers
-                        
-                        # Handle subword merging safely
-                        if token.startswith("##") and merchant_words:
-                            merchant_words[-1] += token[2:]  # Merge subwords
-                        else:
-                            merchant_words.append(token)
-
-                merchant_names.append(" ".join(merchant_words).strip())  # Clean up spaces
+        merchant_names = extract_merchant_names(sentences)
 
         filtered_data["merchant_name"] = merchant_names
 
@@ -0,0 +1,308 @@
+"""
+Strip Indonesian district names from the end of SUBHEADERs.
+
+location_dict.json (about 2 MB, district names grouped by first letter) is
+compiled once into a compact binary index next to the other caches; later
+processes memory-map that file instead of parsing the JSON.
+
+Usage:
+    python location_index.py            # compile the index ahead of deployment
+    python location_index.py "QRIS ALFAMART 0123 BEKASI"
+"""
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import threading
+
+import numpy as np
+
+from disk_cache import CACHE_DIR
+from merchant_matcher import MASTER_MERCHANT_PATH, TRANSACTION_PREFIXES, normalize
+
+LOCATION_DICT_PATH = "./model_NER/location_dict.json"
+LOCATION_INDEX_DIR = os.path.join(CACHE_DIR, "locations")
+MIN_LOCATION_LENGTH = 4  # shorter names ("IDI", "BOB") are too likely to be part of a merchant name
+MIN_TOKENS = 2  # never strip a SUBHEADER below this many tokens, not counting transaction prefixes
+
+_MAGIC = b"LOCIDX2\n"
+_ARRAYS = ("vocab", "node_edges", "edge_tokens", "edge_targets", "terminal")
+
+_index_lock = threading.Lock()
+_indexes = {}
+
+
+def _fingerprint(*paths):
+    digest = hashlib.sha1(_MAGIC)
+    for path in paths:
+        stat = os.stat(path)
+        digest.update(f"{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns};".encode())
+    return digest.hexdigest()[:16]
+
+
+def _tokens(text):
+    return [normalize(token) for token in str(text).split()]
+
+
+def _merchant_phrases(exclude_path):
+    """
+    :return: A tuple (set of normalized master_merchant.json keys and names, set of
+             token n-grams of the merchant names), e.g. ("kopi",) and ("kopi", "kenangan").
+    """
+    with open(exclude_path) as f:
+        groups = json.load(f)
+    keys, ngrams = set(), set()
+    for group in groups.values():
+        for key, name in group.items():
+            keys.update((normalize(key), normalize(name)))
+            tokens = [token for token in _tokens(name) if token]
+            for start in range(len(tokens)):
+                for stop in range(start + 1, len(tokens) + 1):
+                    ngrams.add(tuple(tokens[start:stop]))
+    return keys, ngrams
+
+
+def compile_location_index(source_path, index_path, exclude_path=MASTER_MERCHANT_PATH):
+    """
+    Compile location_dict.json into the binary index read by LocationIndex.
+
+    The index is a trie over the names' tokens in reverse order, so it is
+    walked from the last token of a SUBHEADER backwards. Tokens are stored once
+    in a sorted fixed-width vocabulary; nodes, edges and terminal flags are flat
+    uint32/uint8 arrays. Names shorter than MIN_LOCATION_LENGTH are left out,
+    and so are names that are a master_merchant.json key or a word or phrase of
+    a merchant name (e.g. "MALANG" from "BAKSO MALANG"), which must not be cut
+    from a merchant.
+
+    :param source_path: Path to location_dict.json.
+    :param index_path: Path of the binary index to write.
+    :param exclude_path: Path to master_merchant.json, whose keys and name words are never stripped.
+    :return: Number of location names in the index.
+    """
+    with open(source_path) as f:
+        groups = json.load(f)
+    excluded, merchant_ngrams = set(), set()
+    if exclude_path and os.path.exists(exclude_path):
+        excluded, merchant_ngrams = _merchant_phrases(exclude_path)
+
+    phrases = set()
+    for names in groups.values():
+        for name in names:
+            tokens = tuple(token for token in _tokens(name) if token)
+            joined = "".join(tokens)
+            if len(joined) >= MIN_LOCATION_LENGTH and joined not in excluded and tokens not in merchant_ngrams:
+                phrases.add(tokens)
+
+    vocab = sorted({token for tokens in phrases for token in tokens})
+    token_ids = {token: i for i, token in enumerate(vocab)}
+    trie = [{}]
+    terminal = [0]
+    for tokens in phrases:
+        node = 0
+        for token in reversed(tokens):
+            child = trie[node].get(token_ids[token])
+            if child is None:
+                child = len(trie)
+                trie[node][token_ids[token]] = child
+                trie.append({})
+                terminal.append(0)
+            node = child
+        terminal[node] = 1
+
+    node_edges, edge_tokens, edge_targets = [0], [], []
+    for children in trie:
+        for token_id in sorted(children):
+            edge_tokens.append(token_id)
+            edge_targets.append(children[token_id])
+        node_edges.append(len(edge_tokens))
+
+    arrays = {
+        "vocab": np.array([token.encode() for token in vocab], dtype=bytes),
+        "node_edges": np.array(node_edges, np.uint32),
+        "edge_tokens": np.array(edge_tokens, np.uint32),
+        "edge_targets": np.array(edge_targets, np.uint32),
+        "terminal": np.array(terminal, np.uint8),
+    }
+
+    header = {"names": len(phrases), "arrays": {}}
+    offset = 0
+    for name in _ARRAYS:
+        array = arrays[name]
+        offset = -(-offset // 8) * 8  # 8-byte alignment
+        header["arrays"][name] = [array.dtype.str, offset, len(array)]
+        offset += array.nbytes
+    header_bytes = json.dumps(header).encode()
+
+    os.makedirs(os.path.dirname(os.path.abspath(index_path)), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(suffix=".tmp", dir=os.path.dirname(os.path.abspath(index_path)))
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(_MAGIC + struct.pack("<I", len(header_bytes)) + header_bytes)
+            base = f.tell()
+            for name in _ARRAYS:
+                f.seek(base + header["arrays"][name][1])
+                f.write(arrays[name].tobytes())
+        os.replace(tmp_path, index_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return len(phrases)
+
+
+class LocationIndex:
+    """
+    Memory-mapped reverse token trie of district names.
+
+    strip() walks the trie from the last token of a SUBHEADER backwards and
+    cuts the district names that follow the terminal or branch number, so
+    "QRIS ALFAMART 0123 BEKASI" becomes "QRIS ALFAMART 0123". Without such a
+    number nothing is cut, since the last word of "QRIS TOKO SINAR MAJU" is a
+    district name too. A cut is only made when every token after the number
+    is part of a district name and at least MIN_TOKENS tokens that are not
+    transaction prefixes (QRIS, PEMBAYARAN, ...) remain.
+    Opening the index only maps the file; pages are read as the trie is walked.
+    """
+
+    def __init__(self, index_path, version=None):
+        """
+        :param index_path: Path of a file written by compile_location_index.
+        :param version: Version tag of the index, e.g. the source fingerprint.
+        """
+        self.path = index_path
+        self.version = version or os.path.basename(index_path)
+        with open(index_path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._map[:len(_MAGIC)] != _MAGIC:
+            raise ValueError(f"Not a location index: {index_path}")
+        (header_length,) = struct.unpack_from("<I", self._map, len(_MAGIC))
+        base = len(_MAGIC) + 4
+        header = json.loads(self._map[base:base + header_length])
+        base += header_length
+        for name, (dtype, offset, count) in header["arrays"].items():
+            setattr(self, name, np.frombuffer(self._map, np.dtype(dtype), count, base + offset))
+        self.size = header["names"]
+        self._token_ids = {}
+        self.lookups = 0
+        self.stripped = 0
+
+    def token_id(self, token):
+        """
+        :return: Vocabulary id of a normalized token, or None if no district name uses it.
+        """
+        token_id = self._token_ids.get(token)
+        if token_id is not None:
+            return token_id
+        encoded = token.encode()
+        if len(encoded) > self.vocab.dtype.itemsize:
+            return None
+        position = int(np.searchsorted(self.vocab, encoded))
+        if position < len(self.vocab) and self.vocab[position] == encoded:
+            # Only known tokens are remembered; misses are mostly unbounded terminal ids and numbers
+            self._token_ids[token] = position
+            return position
+        return None
+
+    def _child(self, node, token_id):
+        start, stop = int(self.node_edges[node]), int(self.node_edges[node + 1])
+        position = start + int(np.searchsorted(self.edge_tokens[start:stop], token_id))
+        if position < stop and self.edge_tokens[position] == token_id:
+            return int(self.edge_targets[position])
+        return None
+
+    def strip(self, text, min_tokens=MIN_TOKENS):
+        """
+        Remove the district names that follow the last number of a SUBHEADER.
+
+        :param text: Raw SUBHEADER string, e.g. "QRIS ALFAMART 0123 BEKASI".
+        :param min_tokens: Number of tokens, not counting transaction prefixes, that are always kept.
+        :return: The SUBHEADER without trailing locations, e.g. "QRIS ALFAMART 0123".
+        """
+        raw = str(text).split()
+        tokens = [normalize(token) for token in raw]
+        # Districts are only cut after a terminal or branch number; a last word without one
+        # (MAJU in "TOKO SINAR MAJU") is as likely to belong to the merchant
+        numbers = [i for i, token in enumerate(tokens) if any(char.isdigit() for char in token)]
+        start = numbers[-1] + 1 if numbers else len(tokens)
+        kept = sum(1 for token in tokens[:start] if token and token not in TRANSACTION_PREFIXES)
+        end = len(tokens)
+        if start < end and kept >= min_tokens:
+            # covered[i]: tokens[i:] splits into district names
+            covered = [False] * (end + 1)
+            covered[end] = True
+            for stop in range(end, start, -1):
+                if not covered[stop]:
+                    continue
+                node = 0
+                for position in range(stop - 1, start - 1, -1):
+                    token_id = self.token_id(tokens[position]) if tokens[position] else None
+                    node = None if token_id is None else self._child(node, token_id)
+                    if node is None:
+                        break
+                    if self.terminal[node]:
+                        covered[position] = True
+            if covered[start]:
+                end = start
+
+        self.lookups += 1
+        if end < len(raw):
+            self.stripped += 1
+            return " ".join(raw[:end])
+        return str(text)
+
+    def strip_all(self, texts, min_tokens=MIN_TOKENS):
+        """
+        :param texts: Raw SUBHEADER strings.
+        :return: A list aligned with texts of the strings without trailing locations.
+        """
+        return [self.strip(text, min_tokens) for text in texts]
+
+    def stats(self):
+        """
+        :return: Dict with the number of names, lookups and stripped strings since creation.
+        """
+        return {"names": self.size, "lookups": self.lookups, "stripped": self.stripped}
+
+
+def get_location_index(source_path=LOCATION_DICT_PATH, index_dir=LOCATION_INDEX_DIR):
+    """
+    Return the process-wide location index, compiling it on first use.
+
+    The binary file is named after the size and mtime of location_dict.json
+    and master_merchant.json, so editing either one compiles a new index;
+    older files are removed.
+
+    :param source_path: Path to location_dict.json.
+    :param index_dir: Directory of the compiled index.
+    :return: A LocationIndex instance.
+    """
+    with _index_lock:
+        version = _fingerprint(source_path, MASTER_MERCHANT_PATH)
+        key = (source_path, version)
+        if key not in _indexes:
+            index_path = os.path.join(index_dir, f"location_index-{version}.bin")
+            if not os.path.exists(index_path):
+                compile_location_index(source_path, index_path)
+                for name in os.listdir(index_dir):
+                    if name.startswith("location_index-") and name != os.path.basename(index_path):
+                        os.remove(os.path.join(index_dir, name))
+            _indexes.clear()
+            _indexes[key] = LocationIndex(index_path, version)
+        return _indexes[key]
+
+
+def strip_locations(texts):
+    """
+    :param texts: Raw SUBHEADER strings.
+    :return: A list aligned with texts of the strings without trailing district names.
+    """
+    return get_location_index().strip_all(texts)
+
+
+if __name__ == "__main__":
+    index = get_location_index()
+    print(f"Location index {index.path}: {index.size} names")
+    for text in sys.argv[1:]:
+        print(f"{text!r} -> {index.strip(text)!r}")
@@ -0,0 +1,129 @@
+import json
+import re
+import threading
+from collections import Counter
+
+MERCHANT_CATEGORY_PATH = "./model_NER/merchant_category.json"
+CATEGORIES = ["belanja", "makanan & minuman", "hiburan", "lainnya"]
+FALLBACK_CATEGORY = "lainnya"
+
+# Words in a merchant name that point to a category, checked when the name is not in the lookup table
+KEYWORD_RULES = {
+    "makanan & minuman": [
+        "COFFEE", "KOPI", "KOFFIE", "CAFE", "KAFE", "RESTO", "RESTAURANT", "RM", "RUMAH MAKAN", "WARUNG",
+        "WAROENG", "WARTEG", "WARKOP", "WARMINDO", "BURJO", "KEDAI", "KANTIN", "ANGKRINGAN", "LESEHAN", "PADANG",
+        "BAKSO", "BASO", "MIE", "BAKMI", "BAKMIE", "NOODLE", "RAMEN", "NASI", "NASGOR", "AYAM", "BEBEK", "SATE",
+        "SOTO", "RAWON", "PECEL", "PENYET", "PENYETAN", "SEBLAK", "MARTABAK", "PEMPEK", "SIOMAY", "DIMSUM",
+        "BAKERY", "CAKE", "CAKES", "DONUTS", "DONAT", "ROTI", "PIZZA", "BURGER", "CHICKEN", "FRIED", "STEAK",
+        "SUSHI", "KEBAB", "SEAFOOD", "IKAN", "OSENG", "HOTPLATE", "HOT POT", "SUKI", "BBQ", "GRILL", "TAKOYAKI",
+        "CREPES", "PANCONG", "DESSERT", "GELATO", "ICE CREAM", "ES", "TEH", "TEA", "JUICE", "SUSU", "MILK",
+        "FOOD", "KITCHEN", "BISTRO", "EATERY", "SNACK", "CATERING", "KOPITIAM",
+    ],
+    "belanja": [
+        "MART", "MARET", "SWALAYAN", "SUPERMARKET", "HYPERMARKET", "TOSERBA", "TOKO", "STORE", "SHOP",
+        "DEPT", "DEPARTMENT", "DEPARTEMENT", "FASHION", "FASHIONS", "COLLECTION", "BUTIK", "CLOTHING", "BATIK",
+        "COSMETIC", "COSMETICS", "KOSMETIK", "BEAUTY", "SKINCARE", "PERFUME", "PARFUME", "APOTEK", "APOTIK",
+        "FARMA", "GADGET", "PONSEL", "CELL", "CELLULAR", "SELULAR", "PHONE", "COMPUTER", "ELECTRIC",
+        "HARDWARE", "SPORT", "SPORTS", "OUTLET", "PETSHOP", "VAPE", "VAPOR", "SEMBAKO", "OPTIK", "SHOES",
+        "ACCESSORIES", "ACCESORIES", "AQUARIUM", "STATIONERY",
+    ],
+    "hiburan": [
+        "XXI", "CGV", "CINEMA", "CINEPLEX", "BIOSKOP", "KARAOKE", "KARAOK", "BILLIARD", "BILLIARDS", "GAME",
+        "GAMES", "GAMER", "ESPORTS", "PLAYSTATION", "TIMEZONE", "VOUCHER", "TOPUP", "TOP UP", "HOTEL", "HTL",
+        "POOL", "FITNESS", "FITNES", "GYM", "PLAY", "ENTERTAIN", "NETFLIX", "SPOTIFY", "TRAVEL", "PUB",
+        "TATTOO", "RECORDS", "BOOKS",
+    ],
+}
+
+_lock = threading.Lock()
+_classifiers = {}
+
+
+def _tokens(name):
+    return re.findall(r"[A-Z0-9]+", str(name).upper())
+
+
+class MerchantCategoryClassifier:
+    """
+    Rules-plus-lookup classifier from merchant name to customer category.
+
+    Canonical names listed in merchant_category.json use their table entry;
+    other names are scored by KEYWORD_RULES (whole-word matches, multi-word
+    keywords allowed). Names without any match get no category.
+    """
+
+    def __init__(self, lookup, rules=KEYWORD_RULES):
+        """
+        :param lookup: Dict of canonical merchant name -> category.
+        :param rules: Dict of category -> keywords.
+        """
+        self.lookup = {" ".join(_tokens(name)): category for name, category in lookup.items()}
+        self.rules = {}
+        for category, keywords in rules.items():
+            for keyword in keywords:
+                self.rules[tuple(_tokens(keyword))] = category
+        self.max_keyword_words = max((len(keyword) for keyword in self.rules), default=1)
+
+    @classmethod
+    def from_json(cls, path=MERCHANT_CATEGORY_PATH):
+        """
+        :param path: Path to the merchant -> category JSON table.
+        :return: A MerchantCategoryClassifier instance.
+        """
+        with open(path) as f:
+            return cls(json.load(f))
+
+    def classify(self, merchant):
+        """
+        :param merchant: A merchant name, canonical or as extracted by NER.
+        :return: One of CATEGORIES, or None if nothing matched.
+        """
+        tokens = _tokens(merchant)
+        category = self.lookup.get(" ".join(tokens))
+        if category is not None:
+            return category
+
+        votes = Counter()
+        for size in range(1, self.max_keyword_words + 1):
+            for start in range(len(tokens) - size + 1):
+                category = self.rules.get(tuple(tokens[start:start + size]))
+                if category is not None:
+                    votes[category] += size
+        if not votes:
+            return None
+        return max(votes, key=lambda c: (votes[c], -CATEGORIES.index(c)))
+
+    def classify_customer(self, merchants):
+        """
+        Aggregate the categories of a customer's merchants by majority vote.
+
+        :param merchants: A list of merchant names.
+        :return: The most frequent category, FALLBACK_CATEGORY if no merchant matched.
+        """
+        votes = Counter(c for c in map(self.classify, merchants) if c is not None)
+        if not votes:
+            return FALLBACK_CATEGORY
+        return max(votes, key=lambda c: (votes[c], -CATEGORIES.index(c)))
+
+
+def get_category_classifier(path=MERCHANT_CATEGORY_PATH):
+    """
+    Return the process-wide classifier for path, building it on first use.
+
+    :param path: Path to the merchant -> category JSON table.
+    :return: A MerchantCategoryClassifier instance.
+    """
+    with _lock:
+        if path not in _classifiers:
+            _classifiers[path] = MerchantCategoryClassifier.from_json(path)
+        return _classifiers[path]
+
+
+def classify_customer(merchants):
+    """
+    Pick the category of a customer from their merchant names, without calling the LLM.
+
+    :param merchants: A list of merchant names.
+    :return: One of CATEGORIES.
+    """
+    return get_category_classifier().classify_customer(merchants)
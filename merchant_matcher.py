@@ -0,0 +1,144 @@
+import json
+import re
+import threading
+
+MASTER_MERCHANT_PATH = "./model_NER/master_merchant.json"
+
+# Marks the end of a key inside the trie
+_END = "$"
+
+# Transaction-type words that precede the merchant in a SUBHEADER (normalized)
+TRANSACTION_PREFIXES = {"qris", "pembayaran", "pembelian", "bayar", "trf", "transfer", "debit", "kredit", "pos", "edc"}
+
+# Keys this short ("rm", "hm") or abbreviations this short ("alfa" for ALFAMART) are
+# common words in SUBHEADERs, so they must make up the whole merchant part to match
+SHORT_KEY_LENGTH = 3
+ABBREVIATION_LENGTH = 4
+
+_matcher_lock = threading.Lock()
+_matchers = {}
+
+
+def normalize(text):
+    """
+    Normalize a string the way master_merchant.json keys are written.
+
+    :param text: Raw text, e.g. "A&W Kemang".
+    :return: Lowercase alphanumeric string without spaces, e.g. "awkemang".
+    """
+    return re.sub(r"[^0-9a-z]", "", str(text).lower())
+
+
+class MerchantMatcher:
+    """
+    Trie over the normalized master_merchant.json keys.
+
+    A SUBHEADER is split into tokens and the trie is walked from every token
+    start; a key only matches when it also ends on a token boundary, so "afm"
+    matches "QRIS AFM 0123" but not "QRIS CAFMOR". The longest match wins.
+
+    Short keys and short abbreviations only match when they cover every token
+    that is not a transaction prefix or a number, so "hm" matches "QRIS HM 01"
+    but not "QRIS CAFE HM", and "alfa" does not match "TOKO ALFA JAYA".
+    """
+
+    def __init__(self, mapping):
+        """
+        :param mapping: Dict of normalized key -> canonical merchant name.
+        """
+        self.trie = {}
+        for key, name in mapping.items():
+            key = normalize(key)
+            if not key:
+                continue
+            node = self.trie
+            for char in key:
+                node = node.setdefault(char, {})
+            restricted = len(key) <= SHORT_KEY_LENGTH or (len(key) <= ABBREVIATION_LENGTH and key != normalize(name))
+            node[_END] = (name, restricted)
+        self.size = len(mapping)
+        self.lookups = 0
+        self.hits = 0
+
+    @classmethod
+    def from_json(cls, path=MASTER_MERCHANT_PATH):
+        """
+        Build a matcher from master_merchant.json, which groups keys by first character.
+
+        :param path: Path to the JSON file.
+        :return: A MerchantMatcher instance.
+        """
+        with open(path) as f:
+            groups = json.load(f)
+        mapping = {}
+        for group in groups.values():
+            mapping.update(group)
+        return cls(mapping)
+
+    def match(self, text):
+        """
+        Find the canonical merchant name in a SUBHEADER.
+
+        :param text: Raw SUBHEADER string.
+        :return: The canonical merchant name, or None when no key matches.
+        """
+        tokens = [normalize(token) for token in str(text).split()]
+        tokens = [token for token in tokens if token]
+        joined = "".join(tokens)
+
+        # Token index of every start and end position in joined
+        starts, ends, position = {}, {}, 0
+        for i, token in enumerate(tokens):
+            starts[position] = i
+            position += len(token)
+            ends[position] = i + 1
+        content = [i for i, token in enumerate(tokens) if token not in TRANSACTION_PREFIXES and not token.isdigit()]
+
+        best, best_length = None, 0
+        for start, first in starts.items():
+            node = self.trie
+            for position in range(start, len(joined)):
+                node = node.get(joined[position])
+                if node is None:
+                    break
+                length = position + 1 - start
+                if _END not in node or position + 1 not in ends or length <= best_length:
+                    continue
+                name, restricted = node[_END]
+                if restricted and not all(first <= i < ends[position + 1] for i in content):
+                    continue
+                best, best_length = name, length
+
+        self.lookups += 1
+        if best is not None:
+            self.hits += 1
+        return best
+
+    def match_all(self, texts):
+        """
+        Match a list of SUBHEADERs.
+
+        :param texts: Raw SUBHEADER strings.
+        :return: A list aligned with texts, holding merchant names or None for misses.
+        """
+        return [self.match(text) for text in texts]
+
+    def stats(self):
+        """
+        :return: Dict with lookup count, hit count and hit rate since creation.
+        """
+        hit_rate = self.hits / self.lookups if self.lookups else 0.0
+        return {"lookups": self.lookups, "hits": self.hits, "hit_rate": hit_rate}
+
+
+def get_merchant_matcher(path=MASTER_MERCHANT_PATH):
+    """
+    Return the process-wide matcher for path, building it on first use.
+
+    :param path: Path to master_merchant.json.
+    :return: A MerchantMatcher instance.
+    """
+    with _matcher_lock:
+        if path not in _matchers:
+            _matchers[path] = MerchantMatcher.from_json(path)
+        return _matchers[path]
@@ -0,0 +1,217 @@
+import contextvars
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+PROMETHEUS_PREFIX = "personalized_video"
+
+_collectors = contextvars.ContextVar("metrics_collectors", default=())
+
+
+class Metrics:
+    """
+    Thread-safe accumulator of timed spans and counters.
+
+    A span keeps its call count, total and maximum seconds; a counter is a
+    plain running sum (frames, tokens, cache hits, ...).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.spans = {}
+        self.counters = {}
+
+    def record(self, name, seconds, count=1):
+        """
+        :param name: Span name, e.g. "ner.inference".
+        :param seconds: Time spent.
+        :param count: Number of calls the time covers.
+        """
+        with self._lock:
+            span = self.spans.setdefault(name, {"count": 0, "seconds": 0.0, "max": 0.0})
+            span["count"] += count
+            span["seconds"] += seconds
+            span["max"] = max(span["max"], seconds / max(count, 1))
+
+    def increment(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def merge(self, snapshot):
+        """
+        Add the spans and counters of a snapshot (e.g. from a worker process).
+        """
+        if not snapshot:
+            return
+        with self._lock:
+            for name, other in snapshot.get("spans", {}).items():
+                span = self.spans.setdefault(name, {"count": 0, "seconds": 0.0, "max": 0.0})
+                span["count"] += other["count"]
+                span["seconds"] += other["seconds"]
+                span["max"] = max(span["max"], other["max"])
+            for name, value in snapshot.get("counters", {}).items():
+                self.counters[name] = self.counters.get(name, 0) + value
+
+    def snapshot(self):
+        """
+        :return: JSON-serializable dict {"spans": {...}, "counters": {...}}.
+        """
+        with self._lock:
+            return {
+                "spans": {name: dict(span) for name, span in self.spans.items()},
+                "counters": dict(self.counters),
+            }
+
+    def reset(self):
+        with self._lock:
+            self.spans.clear()
+            self.counters.clear()
+
+
+_registry = Metrics()
+
+
+def get_registry():
+    """
+    :return: The process-wide Metrics that every span and counter is recorded into.
+    """
+    return _registry
+
+
+def record(name, seconds, count=1):
+    """
+    Record a measured duration in the process registry and every active collector.
+    """
+    _registry.record(name, seconds, count)
+    for metrics in _collectors.get():
+        metrics.record(name, seconds, count)
+
+
+def increment(name, value=1):
+    """
+    Add to a counter in the process registry and every active collector.
+    """
+    _registry.increment(name, value)
+    for metrics in _collectors.get():
+        metrics.increment(name, value)
+
+
+@contextmanager
+def span(name):
+    """
+    Time the enclosed block as span `name`.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - start)
+
+
+@contextmanager
+def collect():
+    """
+    Collect the spans and counters recorded in this context (one CIF, one app
+    run) into a separate Metrics, in addition to the process registry.
+
+    The collector follows the context into asyncio.to_thread and
+    contextvars.copy_context().run, but not into other processes; those
+    return their own snapshot to merge.
+    """
+    metrics = Metrics()
+    token = _collectors.set(_collectors.get() + (metrics,))
+    try:
+        yield metrics
+    finally:
+        _collectors.reset(token)
+
+
+def summarize(snapshot):
+    """
+    Add derived figures to a snapshot: hit rates for every "<name>.hits" /
+    "<name>.misses" counter pair and frames per second of the render loop.
+
+    :return: A new dict with "spans", "counters" and "derived".
+    """
+    counters = snapshot.get("counters", {})
+    derived = {}
+    for name, hits in counters.items():
+        if name.endswith(".hits"):
+            base = name[:-len(".hits")]
+            lookups = hits + counters.get(f"{base}.misses", 0)
+            if lookups:
+                derived[f"{base}.hit_rate"] = round(hits / lookups, 4)
+    frames = counters.get("video.frames", 0)
+    loop = snapshot.get("spans", {}).get("video.frame_loop")
+    if frames and loop and loop["seconds"]:
+        derived["video.frames_per_second"] = round(frames / loop["seconds"], 2)
+    return {"spans": snapshot.get("spans", {}), "counters": counters, "derived": derived}
+
+
+def timing_rows(snapshot):
+    """
+    :return: List of dicts (stage, calls, seconds, share) sorted by total time, for display.
+    """
+    spans = snapshot.get("spans", {})
+    total = sum(span["seconds"] for name, span in spans.items() if name.startswith("stage.")) or \
+        sum(span["seconds"] for span in spans.values())
+    rows = [
+        {
+            "stage": name,
+            "calls": span["count"],
+            "seconds": round(span["seconds"], 4),
+            "share": f"{span['seconds'] / total:.0%}" if total else "",
+        }
+        for name, span in spans.items()
+    ]
+    return sorted(rows, key=lambda row: row["seconds"], reverse=True)
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"')
+
+
+def to_prometheus(snapshot, prefix=PROMETHEUS_PREFIX):
+    """
+    Render a snapshot in the Prometheus text exposition format.
+    """
+    summary = summarize(snapshot)
+    lines = [
+        f"# TYPE {prefix}_span_seconds_total counter",
+        *[f'{prefix}_span_seconds_total{{span="{_label(name)}"}} {span["seconds"]:.6f}'
+          for name, span in sorted(summary["spans"].items())],
+        f"# TYPE {prefix}_span_calls_total counter",
+        *[f'{prefix}_span_calls_total{{span="{_label(name)}"}} {span["count"]}'
+          for name, span in sorted(summary["spans"].items())],
+        f"# TYPE {prefix}_span_max_seconds gauge",
+        *[f'{prefix}_span_max_seconds{{span="{_label(name)}"}} {span["max"]:.6f}'
+          for name, span in sorted(summary["spans"].items())],
+        f"# TYPE {prefix}_events_total counter",
+        *[f'{prefix}_events_total{{name="{_label(name)}"}} {value}'
+          for name, value in sorted(summary["counters"].items())],
+        f"# TYPE {prefix}_derived gauge",
+        *[f'{prefix}_derived{{name="{_label(name)}"}} {value}'
+          for name, value in sorted(summary["derived"].items())],
+    ]
+    return "\n".join(lines) + "\n"
+
+
+def write_report(snapshot, path, extra=None):
+    """
+    Write a run report as JSON to path and in Prometheus text format next to it (.prom).
+
+    :param snapshot: Metrics snapshot.
+    :param path: Path of the JSON report.
+    :param extra: Dict of run information added to the JSON report (e.g. wall time).
+    :return: Tuple (json_path, prom_path).
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    report = dict(extra or {}, **summarize(snapshot))
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+    prom_path = os.path.splitext(path)[0] + ".prom"
+    with open(prom_path, "w") as f:
+        f.write(to_prometheus(snapshot))
+    return path, prom_path
@@ -0,0 +1,365 @@
+import os
+import time
+
+import cv2
+
+from frame_cache import FrameReader, get_frame_cache
+import metrics
+from get_data import get_unique_subheaders
+from merchant_category import classify_customer
+from text_generated import get_response_text
+from transaction_store import load_store
+from video_generated import (
+    ENCODER_DEFAULTS, RENDITIONS, FFmpegWriter, add_text, add_text_renditions, concat_segments, convert_video_to_mp4,
+    get_template_tail, initialize_video, load_logo, probe_video, release_resources, segment_boundary,
+)
+
+TEMPLATE_DIR = "./tamplate_video"
+TEMPLATES = {
+    "makanan & minuman": os.path.join(TEMPLATE_DIR, "video_template_mnm.mp4"),
+    "belanja": os.path.join(TEMPLATE_DIR, "video_template_belanja.mp4"),
+    "hiburan": os.path.join(TEMPLATE_DIR, "video_template_hiburan.mp4"),
+}
+DEFAULT_TEMPLATE = os.path.join(TEMPLATE_DIR, "video_template_hiburan.mp4")
+LOGO_PATH = os.path.join(TEMPLATE_DIR, "wondr-color-3x.png")
+
+DEFAULT_STYLE = {
+    "font_scale": 1.0,
+    "text_color": (255, 255, 255),
+    "font_thickness": 2,
+    "shadow_color": (0, 0, 0),
+    "shadow_offset": (2, 2),
+    "duration": 10,
+    "font": None,  # TrueType font name or path; None draws with the OpenCV Hershey font
+    "logo_path": None,  # e.g. LOGO_PATH; shown on every frame when set
+    "logo_scale": 1.0,
+    "logo_position": (10, 50),
+}
+
+
+def hex_to_bgr(hex_color):
+    """
+    Convert a hex color code (e.g., #FFFFFF) to a BGR tuple for OpenCV.
+    :param hex_color: Hex color code as a string.
+    :return: Tuple (B, G, R)
+    """
+    hex_color = hex_color.lstrip('#')
+    return tuple(int(hex_color[i:i+2], 16) for i in (4, 2, 0))  # Convert RGB to BGR
+
+
+def select_template(category):
+    """
+    Pick the template video for a customer category.
+
+    :param category: Category from classify_category (or the text generator).
+    :return: Path to the template video, DEFAULT_TEMPLATE if the category has none on disk.
+    """
+    template = TEMPLATES.get(category, DEFAULT_TEMPLATE)
+    return template if os.path.exists(template) else DEFAULT_TEMPLATE
+
+
+def classify_category(merchants):
+    """
+    Pick the customer category locally from the merchant names, so the template
+    is known without waiting for the LLM.
+
+    :param merchants: A list of merchant names.
+    :return: One of merchant_category.CATEGORIES.
+    """
+    return classify_customer(merchants)
+
+
+def extract_merchants(store, cif):
+    """
+    Load one customer's transactions and extract their unique merchant names.
+
+    :param store: A TransactionStore.
+    :param cif: The CIF value of the customer.
+    :return: A list of unique merchant names (empty if the customer has none).
+    """
+    return get_unique_subheaders(store.get_cif(cif), cif)
+
+
+def generate_text(merchants, client=None, use_cache=True, before_request=None):
+    """
+    Ask the LLM for the customer's category and caption.
+
+    :param merchants: A list of merchant names.
+    :param client: Groq-compatible client, defaults to the shared Groq client.
+    :param use_cache: Reuse cached responses for the same merchant set.
+    :param before_request: Function called before a model request, not on a cache hit (e.g. a rate limiter).
+    :return: A tuple (category, caption).
+    """
+    return get_response_text(merchants, client=client, use_cache=use_cache, before_request=before_request)
+
+
+def cached_frames(video_path, max_frames=None):
+    """
+    Read template frames from the shared frame cache. The cache only saves
+    decoding time, so when it fails the render decodes the template itself.
+
+    :param video_path: Path to the template video.
+    :param max_frames: Number of frames needed from the start, None for all.
+    :return: The frame array, or None to decode with cv2.VideoCapture instead.
+    """
+    try:
+        return get_frame_cache().get(video_path, max_frames)
+    except Exception as e:
+        print(f"An error occurred while reading the frame cache, decoding the template instead: {e}")
+        return None
+
+
+def render_video(video_path, text, output_path, style=None, keep_intermediate=False, backend="ffmpeg", encoder=None,
+                 segmented=True, frame_cache=True):
+    """
+    Draw the caption onto the template and encode the result as browser-friendly H.264.
+
+    The default "ffmpeg" backend pipes the frames straight into libx264, so the
+    final file is written in one pass. The "opencv" backend writes an mp4v file
+    first and re-encodes it with convert_video_to_mp4.
+
+    With segmented (ffmpeg backend only), only the head of the template that
+    carries the caption is decoded and encoded; it is joined with a cached,
+    pre-encoded tail of the template by stream copy.
+
+    With frame_cache (ffmpeg backend only), the frames are read from the shared
+    decoded-template cache instead of being decoded for every render.
+
+    :param video_path: Path to the template video.
+    :param text: Caption to overlay.
+    :param output_path: Path of the final mp4 file.
+    :param style: Dict of add_text style arguments, see DEFAULT_STYLE.
+    :param keep_intermediate: Keep the mp4v file written by OpenCV next to the output ("opencv" backend only).
+    :param backend: "ffmpeg" or "opencv".
+    :param encoder: Dict of libx264 options (preset, crf, threads), see video_generated.ENCODER_DEFAULTS.
+    :param segmented: Re-encode only the captioned head and stream-copy the rest.
+    :param frame_cache: Read template frames from frame_cache.get_frame_cache().
+    :return: output_path on success, None if encoding failed.
+    """
+    style = dict(DEFAULT_STYLE, **(style or {}))
+    root, ext = os.path.splitext(output_path)
+    if backend != "ffmpeg":
+        return _render_opencv(video_path, text, output_path, style, keep_intermediate)
+
+    try:
+        metadata = probe_video(video_path)
+        boundary = segment_boundary(int(style["duration"] * int(metadata["fps"])), metadata["frame_count"])
+        if not segmented or boundary >= metadata["frame_count"]:
+            frames = cached_frames(video_path) if frame_cache else None
+            _render_frames(video_path, text, output_path, style, encoder=encoder, frames=frames)
+            return output_path
+
+        head_path = f"{root}.head{ext}"
+        try:
+            frames = cached_frames(video_path, boundary) if frame_cache else None
+            logo = _render_frames(video_path, text, head_path, style, encoder=encoder, audio=False,
+                                  max_frames=boundary, frames=frames)
+            tail_path = get_template_tail(video_path, boundary, encoder, logo=logo,
+                                          logo_position=style["logo_position"])
+            joined = concat_segments([head_path, tail_path], output_path, audio_source=video_path)
+        finally:
+            if os.path.exists(head_path):
+                os.remove(head_path)
+        return output_path if joined else None
+    except IOError as e:
+        print(f"An error occurred while rendering the video: {e}")
+        return None
+
+
+def _render_frames(video_path, text, output_path, style, backend="ffmpeg", encoder=None, audio=True, max_frames=None,
+                   frames=None):
+    """
+    :return: The logo image drawn on the frames, or None.
+    """
+    style = dict(style)
+    logo_path, logo_scale = style.pop("logo_path", None), style.pop("logo_scale", 1.0)
+    cap, out, logo, fps, frame_width, frame_height = initialize_video(
+        video_path, output_path, logo_path=logo_path, logo_scale=logo_scale, backend=backend, encoder=encoder,
+        audio=audio, frames=frames,
+    )
+    try:
+        add_text(cap=cap, out=out, text=text, fps=fps, frame_width=frame_width, frame_height=frame_height,
+                 max_frames=max_frames, logo=logo, **style)
+    finally:
+        release_resources(cap, out)
+    return logo
+
+
+def _render_opencv(video_path, text, output_path, style, keep_intermediate):
+    root, ext = os.path.splitext(output_path)
+    raw_path = f"{root}.raw{ext}"
+    try:
+        _render_frames(video_path, text, raw_path, style, backend="opencv")
+    except IOError as e:
+        print(f"An error occurred while rendering the video: {e}")
+        return None
+
+    converted = convert_video_to_mp4(raw_path, output_path)
+    if not keep_intermediate and os.path.exists(raw_path):
+        os.remove(raw_path)
+    return output_path if converted else None
+
+
+def render_renditions(video_path, text, output_paths, style=None, encoder=None, frame_cache=True):
+    """
+    Render several output formats of one video from a single decode of the template.
+
+    Every frame is fanned out to one ffmpeg writer per rendition, each with its
+    own geometry and caption layout (see video_generated.RENDITIONS).
+
+    :param video_path: Path to the template video.
+    :param text: Caption to overlay.
+    :param output_paths: Dict of rendition name (a RENDITIONS key) -> output mp4 path.
+    :param style: Dict of add_text style arguments, see DEFAULT_STYLE.
+    :param encoder: Dict of libx264 options shared by all renditions; a rendition's
+                    own "encoder" entry in RENDITIONS overrides it.
+    :param frame_cache: Read template frames from frame_cache.get_frame_cache().
+    :return: output_paths on success, None if any rendition failed.
+    """
+    style = dict(DEFAULT_STYLE, **(style or {}))
+    logo_path, logo_scale = style.pop("logo_path"), style.pop("logo_scale")
+    writers = []
+    cap = None
+    try:
+        metadata = probe_video(video_path)
+        frame_size = (metadata["width"], metadata["height"])
+        renditions = []
+        for name, path in output_paths.items():
+            spec = RENDITIONS[name]
+            options = dict(ENCODER_DEFAULTS, **(encoder or {}), **spec.get("encoder", {}))
+            out = FFmpegWriter(path, metadata["fps"], spec["size"] or frame_size, audio_source=video_path, **options)
+            writers.append(out)
+            renditions.append((out, spec["size"], spec["fit"]))
+
+        frames = cached_frames(video_path) if frame_cache else None
+        cap = FrameReader(frames) if frames is not None else cv2.VideoCapture(video_path)
+        add_text_renditions(cap, renditions, text, int(metadata["fps"]), *frame_size,
+                            logo=load_logo(logo_path, logo_scale), **style)
+        cap.release()
+        for out in writers:
+            out.release()
+        return output_paths
+    except (IOError, ValueError, KeyError) as e:
+        print(f"An error occurred while rendering the video renditions: {e}")
+        if cap is not None:
+            cap.release()
+        for out in writers:
+            try:
+                out.release()
+            except IOError as release_error:
+                print(f"An error occurred while rendering the video renditions: {release_error}")
+        for path in output_paths.values():
+            if os.path.exists(path):
+                os.remove(path)
+        return None
+
+
+def render_outputs(video_path, text, cif, output_dir="./output", style=None, encoder=None, renditions=None):
+    """
+    Render a customer's video, or several formats of it from one decode.
+
+    :param renditions: List of RENDITIONS names; None renders the template format only.
+    :return: Dict of rendition name -> output path, or None if rendering failed.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    if not renditions:
+        output_path = output_path_for(cif, output_dir)
+        if render_video(video_path, text, output_path, style, encoder=encoder) is None:
+            return None
+        return {"original": output_path}
+    return render_renditions(
+        video_path, text, {name: output_path_for(cif, output_dir, name) for name in renditions}, style, encoder
+    )
+
+
+def new_result(cif):
+    """
+    :param cif: The CIF value of the customer.
+    :return: An empty result dict for the batch manifest.
+    """
+    return {
+        "cif": cif, "status": "error", "merchants": None, "category": None, "llm_category": None,
+        "text": None, "output": None, "outputs": None, "error": None, "timings": None,
+    }
+
+
+def output_path_for(cif, output_dir="./output", rendition=None):
+    """
+    :param cif: The CIF value of the customer.
+    :param output_dir: Directory for the rendered videos.
+    :param rendition: RENDITIONS name; other than "original" it is added to the file name (e.g. _1x1).
+    :return: Path of the rendered video for a customer.
+    """
+    suffix = "" if rendition in (None, "original") else "_" + rendition.replace(":", "x")
+    return os.path.join(output_dir, f"converted_video_{cif}{suffix}.mp4")
+
+
+def run_cif(store, cif, output_dir="./output", style=None, client=None, use_cache=True, encoder=None,
+            renditions=None):
+    """
+    Run every stage for one customer: load, extract merchants, generate text,
+    pick the template, render and encode.
+
+    :param store: A TransactionStore.
+    :param cif: The CIF value of the customer.
+    :param output_dir: Directory for the rendered video.
+    :param style: Dict of add_text style arguments, see DEFAULT_STYLE.
+    :param client: Groq-compatible client, defaults to the shared Groq client.
+    :param use_cache: Reuse cached LLM responses for the same merchant set.
+    :param encoder: Dict of libx264 options, see video_generated.ENCODER_DEFAULTS.
+    :param renditions: List of video_generated.RENDITIONS names to render from one decode.
+    :return: A result dict with status "ok", "skipped" (no merchants) or "error", with the
+             per-stage metrics of this customer under "timings".
+    """
+    start = time.time()
+    result = new_result(cif)
+    with metrics.collect() as run_metrics:
+        try:
+            return _run_cif_stages(result, store, cif, output_dir, style, client, use_cache, encoder, renditions)
+        except Exception as e:
+            result["error"] = str(e)
+            return result
+        finally:
+            result["seconds"] = round(time.time() - start, 3)
+            result["timings"] = run_metrics.snapshot()
+
+
+def _run_cif_stages(result, store, cif, output_dir, style, client, use_cache, encoder, renditions):
+    with metrics.span("stage.extract"):
+        merchants = extract_merchants(store, cif)
+    result["merchants"] = merchants
+    if not merchants:
+        result["status"] = "skipped"
+        result["error"] = "No matching data found for the given CIF."
+        return result
+
+    with metrics.span("stage.classify"):
+        category = classify_category(merchants)
+    result["category"] = category
+
+    with metrics.span("stage.llm"):
+        llm_category, text = generate_text(merchants, client, use_cache)
+    result.update(llm_category=llm_category, text=text)
+
+    os.makedirs(output_dir, exist_ok=True)
+    with metrics.span("stage.render"):
+        outputs = render_outputs(select_template(category), text, cif, output_dir, style, encoder, renditions)
+    if outputs is None:
+        result["error"] = "Failed to convert video to a compatible format."
+        return result
+
+    result.update(status="ok", output=next(iter(outputs.values())), outputs=outputs)
+    return result
+
+
+def open_store(data_path):
+    """
+    Open the transaction store, raising if the file cannot be ingested.
+
+    :param data_path: Path to the Excel file containing the data.
+    :return: A TransactionStore.
+    """
+    store = load_store(data_path)
+    if store is None:
+        raise IOError(f"Unable to load transaction data: {data_path}")
+    return store
@@ -0,0 +1,404 @@
+"""
+Local render job queue: SQLite-backed jobs, worker processes and content-addressed outputs.
+
+Usage:
+    python render_queue.py worker --workers 2     # run render workers in the foreground
+    python render_queue.py status <job id>
+    python render_queue.py gc --max-gb 5 --max-days 7
+"""
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import socket
+import sqlite3
+import threading
+import time
+
+import metrics
+from disk_cache import CACHE_DIR
+from pipeline import DEFAULT_STYLE, render_renditions, render_video
+
+QUEUE_PATH = os.path.join(CACHE_DIR, "render_jobs.sqlite")
+RENDER_DIR = "./output/renders"
+RENDER_WORKERS = 1
+POLL_INTERVAL = 0.5  # seconds between queue checks of an idle worker
+JOB_TIMEOUT = 30 * 60  # running jobs older than this are assumed dead and queued again
+OUTPUT_MAX_BYTES = 5 << 30
+OUTPUT_MAX_AGE = 7 * 24 * 3600
+JOB_RETENTION = 30 * 24 * 3600  # finished job rows are kept this long
+
+_queue_lock = threading.Lock()
+_queues = {}
+
+
+def _file_identity(path):
+    stat = os.stat(path)
+    return [os.path.abspath(path), stat.st_size, stat.st_mtime_ns]
+
+
+def render_key(video_path, text, style=None, renditions=None, encoder=None):
+    """
+    Hash everything that determines the rendered pixels: the template (path,
+    size, mtime), the caption, the style (including the logo file) and the
+    output formats and encoder settings.
+
+    :return: A hex digest used as job id and output file name.
+    """
+    style = dict(DEFAULT_STYLE, **(style or {}))
+    request = {
+        "template": _file_identity(video_path),
+        "text": text,
+        "style": {name: list(value) if isinstance(value, tuple) else value for name, value in sorted(style.items())},
+        "logo": _file_identity(style["logo_path"]) if style.get("logo_path") else None,
+        "renditions": sorted(renditions) if renditions else None,
+        "encoder": dict(sorted((encoder or {}).items())),
+    }
+    return hashlib.sha256(json.dumps(request, sort_keys=True).encode()).hexdigest()[:32]
+
+
+def content_output_path(key, output_dir=RENDER_DIR, rendition=None):
+    """
+    :param key: render_key of the job.
+    :param output_dir: Directory of the rendered videos.
+    :param rendition: RENDITIONS name; other than "original" it is added to the file name (e.g. _1x1).
+    :return: Path of a rendered video.
+    """
+    suffix = "" if rendition in (None, "original") else "_" + rendition.replace(":", "x")
+    return os.path.join(output_dir, f"{key}{suffix}.mp4")
+
+
+class RenderQueue:
+    """
+    Render jobs in a SQLite table, shared by every process that opens the same file.
+
+    A job's id is the render_key of its request, so submitting the same
+    template, caption and style twice returns the same job; when its files
+    are still on disk the job is done immediately. Workers claim queued jobs
+    in submission order inside an IMMEDIATE transaction, so each job runs
+    once. Outputs are written under a temporary name and renamed into place,
+    so a file under its final name is always complete.
+    """
+
+    def __init__(self, path=QUEUE_PATH, output_dir=RENDER_DIR, max_bytes=OUTPUT_MAX_BYTES, max_age=OUTPUT_MAX_AGE):
+        """
+        :param path: Path of the SQLite file, created if missing.
+        :param output_dir: Directory of the rendered videos.
+        :param max_bytes: Size budget of output_dir, enforced by gc().
+        :param max_age: Seconds an unused output is kept, enforced by gc().
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        os.makedirs(output_dir, exist_ok=True)
+        self.path = path
+        self.output_dir = output_dir
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.workers = []
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id TEXT PRIMARY KEY, status TEXT, request TEXT, outputs TEXT, error TEXT, timings TEXT, "
+                "worker TEXT, created REAL, started REAL, finished REAL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created)")
+
+    def _row(self, job_id):
+        cursor = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,))
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        job = dict(zip([column[0] for column in cursor.description], row))
+        for name in ("request", "outputs", "timings"):
+            job[name] = json.loads(job[name]) if job[name] else None
+        return job
+
+    def submit(self, video_path, text, style=None, renditions=None, encoder=None):
+        """
+        Queue a render, or reuse the job (and files) of an identical earlier request.
+
+        :param video_path: Path to the template video.
+        :param text: Caption to overlay.
+        :param style: Dict of add_text style arguments, see pipeline.DEFAULT_STYLE.
+        :param renditions: List of video_generated.RENDITIONS names; None renders the template format only.
+        :param encoder: Dict of libx264 options, see video_generated.ENCODER_DEFAULTS.
+        :return: The job id.
+        """
+        job_id = render_key(video_path, text, style, renditions, encoder)
+        request = {"video_path": video_path, "text": text, "style": style, "renditions": renditions,
+                   "encoder": encoder}
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                job = self._row(job_id)
+                if job and job["status"] == "done" and all(os.path.exists(p) for p in job["outputs"].values()):
+                    for path in job["outputs"].values():
+                        os.utime(path)  # Recently used, kept longer by gc()
+                    metrics.increment("render_queue.hits")
+                elif job and job["status"] in ("queued", "running"):
+                    metrics.increment("render_queue.joined")
+                else:
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO jobs (id, status, request, created) VALUES (?, 'queued', ?, ?)",
+                        (job_id, json.dumps(request), now),
+                    )
+                    metrics.increment("render_queue.misses")
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return job_id
+
+    def status(self, job_id):
+        """
+        :param job_id: Id returned by submit().
+        :return: Dict with id, status ("queued", "running", "done" or "error"), outputs
+                 (rendition name -> path), error, timings and timestamps; None for an unknown id.
+        """
+        with self._lock:
+            return self._row(job_id)
+
+    def wait(self, job_id, timeout=None, interval=POLL_INTERVAL):
+        """
+        Poll until a job is done or failed.
+
+        :return: The final status dict, or the current one when timeout seconds passed.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            job = self.status(job_id)
+            if job is None or job["status"] in ("done", "error"):
+                return job
+            if deadline is not None and time.monotonic() > deadline:
+                return job
+            time.sleep(interval)
+
+    def claim(self, worker):
+        """
+        Take the oldest queued job, first re-queueing jobs whose worker stopped
+        more than JOB_TIMEOUT seconds ago.
+
+        :param worker: Name of the claiming worker.
+        :return: The job dict, or None if the queue is empty.
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    "UPDATE jobs SET status = 'queued', worker = NULL WHERE status = 'running' AND started < ?",
+                    (now - JOB_TIMEOUT,),
+                )
+                row = self._conn.execute(
+                    "SELECT id FROM jobs WHERE status = 'queued' ORDER BY created LIMIT 1"
+                ).fetchone()
+                if row is not None:
+                    self._conn.execute(
+                        "UPDATE jobs SET status = 'running', worker = ?, started = ? WHERE id = ?",
+                        (worker, now, row[0]),
+                    )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            return self._row(row[0]) if row is not None else None
+
+    def finish(self, job_id, outputs, error=None, timings=None):
+        """
+        Record the result of a claimed job.
+
+        :param outputs: Dict of rendition name -> path, or None if the render failed.
+        :param error: Error message of a failed render.
+        :param timings: Metrics snapshot of the render.
+        """
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, outputs = ?, error = ?, timings = ?, finished = ? WHERE id = ?",
+                ("done" if outputs else "error", json.dumps(outputs) if outputs else None, error,
+                 json.dumps(timings) if timings else None, time.time(), job_id),
+            )
+
+    def run_job(self, job):
+        """
+        Render a claimed job into its content-addressed files.
+
+        :return: Dict of rendition name -> path, or None if rendering failed.
+        """
+        request = job["request"]
+        # JSON turned the style's tuples (colors, offsets) into lists
+        style = {name: tuple(value) if isinstance(value, list) else value
+                 for name, value in (request["style"] or {}).items()}
+        names = request["renditions"] or ["original"]
+        final = {name: content_output_path(job["id"], self.output_dir, name) for name in names}
+        partial = {name: f"{os.path.splitext(path)[0]}.partial-{os.getpid()}.mp4" for name, path in final.items()}
+        try:
+            if request["renditions"]:
+                rendered = render_renditions(request["video_path"], request["text"], partial, style,
+                                             request["encoder"])
+            else:
+                rendered = render_video(request["video_path"], request["text"], partial["original"], style,
+                                        encoder=request["encoder"])
+            if not rendered:
+                return None
+            for name in names:
+                os.replace(partial[name], final[name])
+            return final
+        finally:
+            for path in partial.values():
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def work(self, worker=None, stop=None, poll_interval=POLL_INTERVAL):
+        """
+        Claim and render jobs until stop is set (forever by default).
+
+        :param worker: Name recorded on claimed jobs (default: host and pid).
+        :param stop: threading/multiprocessing Event that ends the loop.
+        :param poll_interval: Seconds to sleep while the queue is empty.
+        """
+        worker = worker or f"{socket.gethostname()}:{os.getpid()}"
+        while stop is None or not stop.is_set():
+            job = self.claim(worker)
+            if job is None:
+                time.sleep(poll_interval)
+                continue
+            outputs, error = None, None
+            with metrics.collect() as job_metrics:
+                try:
+                    with metrics.span("render_queue.job"):
+                        outputs = self.run_job(job)
+                    if outputs is None:
+                        error = "Failed to convert video to a compatible format."
+                except Exception as e:
+                    error = str(e)
+            self.finish(job["id"], outputs, error, job_metrics.snapshot())
+            self.gc()
+
+    def start_workers(self, count=RENDER_WORKERS):
+        """
+        Start worker processes for this queue. They are daemons, so they stop with this process.
+
+        :param count: Number of worker processes.
+        :return: The list of started processes.
+        """
+        # spawn, not fork: the parent may hold torch threads and open SQLite handles
+        context = multiprocessing.get_context("spawn")
+        for _ in range(count):
+            process = context.Process(
+                target=run_worker, args=(self.path, self.output_dir, self.max_bytes, self.max_age), daemon=True
+            )
+            process.start()
+            self.workers.append(process)
+        return self.workers
+
+    def workers_alive(self):
+        """
+        :return: False if this process started workers and all of them exited, True otherwise.
+        """
+        return not self.workers or any(process.is_alive() for process in self.workers)
+
+    def gc(self, max_bytes=None, max_age=None):
+        """
+        Delete rendered videos that were not used for max_age seconds, then the
+        least recently used ones until the directory fits in max_bytes. Files of
+        queued or running jobs are never deleted; jobs whose files are gone are
+        dropped, so the next identical request renders again.
+
+        :return: Dict with the number of deleted files and bytes freed.
+        """
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        max_age = self.max_age if max_age is None else max_age
+        now = time.time()
+        with self._lock:
+            active = {row[0] for row in self._conn.execute("SELECT id FROM jobs WHERE status IN ('queued', 'running')")}
+
+        entries = []
+        for name in os.listdir(self.output_dir):
+            path = os.path.join(self.output_dir, name)
+            if not name.endswith(".mp4") or ".partial-" in name or name[:32] in active:
+                continue
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+
+        total = sum(size for _, size, _ in entries)
+        deleted, freed = 0, 0
+        for last_used, size, path in entries:
+            if last_used >= now - max_age and total <= max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            deleted += 1
+            freed += size
+
+        with self._lock:
+            if deleted:
+                for job_id, outputs in self._conn.execute(
+                        "SELECT id, outputs FROM jobs WHERE status = 'done'").fetchall():
+                    if not all(os.path.exists(path) for path in json.loads(outputs).values()):
+                        self._conn.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+            self._conn.execute(
+                "DELETE FROM jobs WHERE status IN ('done', 'error') AND finished < ?", (now - JOB_RETENTION,)
+            )
+        metrics.increment("render_queue.gc_deleted", deleted)
+        return {"deleted": deleted, "bytes": freed}
+
+
+def run_worker(path=QUEUE_PATH, output_dir=RENDER_DIR, max_bytes=OUTPUT_MAX_BYTES, max_age=OUTPUT_MAX_AGE):
+    """
+    Entry point of a worker process: render jobs from the queue at path forever.
+    """
+    RenderQueue(path, output_dir, max_bytes, max_age).work()
+
+
+def get_render_queue(path=QUEUE_PATH, output_dir=RENDER_DIR):
+    """
+    Return the process-wide queue for path, creating it on first use.
+
+    :param path: Path of the SQLite job table.
+    :param output_dir: Directory of the rendered videos.
+    :return: A RenderQueue instance.
+    """
+    with _queue_lock:
+        if (path, output_dir) not in _queues:
+            _queues[(path, output_dir)] = RenderQueue(path, output_dir)
+        return _queues[(path, output_dir)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queue", default=QUEUE_PATH, help="Path of the SQLite job table")
+    parser.add_argument("--output-dir", default=RENDER_DIR)
+    commands = parser.add_subparsers(dest="command", required=True)
+    worker = commands.add_parser("worker", help="Render queued jobs")
+    worker.add_argument("--workers", type=int, default=RENDER_WORKERS)
+    status = commands.add_parser("status", help="Show a job")
+    status.add_argument("job_id")
+    gc = commands.add_parser("gc", help="Delete old rendered videos")
+    gc.add_argument("--max-gb", type=float, default=OUTPUT_MAX_BYTES / (1 << 30))
+    gc.add_argument("--max-days", type=float, default=OUTPUT_MAX_AGE / (24 * 3600))
+    args = parser.parse_args()
+
+    queue = RenderQueue(args.queue, args.output_dir)
+    if args.command == "worker":
+        print(f"Rendering jobs from {args.queue} with {args.workers} worker(s); Ctrl+C to stop")
+        for process in queue.start_workers(args.workers):
+            process.join()
+    elif args.command == "status":
+        print(json.dumps(queue.status(args.job_id), indent=2))
+    else:
+        print(queue.gc(int(args.max_gb * (1 << 30)), args.max_days * 24 * 3600))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,17 @@
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+# The modules read the cache directory at import time; keep test runs out of ./.cache
+os.environ.setdefault("PERSONALIZED_VIDEO_CACHE_DIR", tempfile.mkdtemp(prefix="personalized_video_tests_"))
+
+import pytest  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def repo_root(monkeypatch):
+    """The data files are referenced relative to the repository root."""
+    monkeypatch.chdir(ROOT)
+    return ROOT
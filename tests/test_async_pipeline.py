@@ -0,0 +1,87 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from async_pipeline import _DONE, RateLimiter, _llm_stage
+from benchmarks.fixtures import StubGroqClient
+from text_generated import get_response_texts_batched
+
+
+def test_rate_limiter_spaces_acquisitions():
+    async def run():
+        limiter = RateLimiter(2, period=0.2)
+        start = time.monotonic()
+        await asyncio.gather(*(limiter.acquire() for _ in range(4)))
+        return time.monotonic() - start
+
+    # Two tokens are available at once, the other two are due 0.1 s apart
+    assert 0.15 <= asyncio.run(run()) < 1.0
+
+
+def test_rate_limiter_does_not_block_on_sleeping_callers():
+    async def run():
+        limiter = RateLimiter(1, period=10)
+        await limiter.acquire()
+        waiting = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0.01)
+        # The lock is free while the second caller sleeps
+        assert not limiter._lock.locked()
+        waiting.cancel()
+
+    asyncio.run(run())
+
+
+class BrokenBatchClient(StubGroqClient):
+    """Answers batched requests with text that is not JSON, forcing the per-customer fallback."""
+
+    def create(self, messages, model, response_format=None, **kwargs):
+        response = super().create(messages, model, **kwargs)
+        if response_format:
+            response.choices[0].message.content = "not json"
+        return response
+
+
+def test_batched_fallback_requests_call_before_request():
+    client = BrokenBatchClient()
+    calls = []
+    results = get_response_texts_batched([["KFC"], ["ALFAMART"], ["H&M"]], client, batch_size=3, use_cache=False,
+                                         before_request=lambda: calls.append(1))
+    assert all(result is not None for result in results)
+    assert client.calls == 4
+    assert len(calls) == client.calls
+
+
+class CountingLimiter(RateLimiter):
+    def __init__(self):
+        super().__init__(6000)
+        self.acquired = 0
+
+    async def acquire(self):
+        self.acquired += 1
+        await super().acquire()
+
+
+def _run_llm_stage(merchant_lists, client, limiter, batch_size):
+    async def run():
+        llm_queue, render_queue, results = asyncio.Queue(), asyncio.Queue(), asyncio.Queue()
+        for merchants in merchant_lists:
+            await llm_queue.put({"merchants": merchants, "timings": {}, "error": None})
+        await llm_queue.put(_DONE)
+        with ThreadPoolExecutor(2) as executor:
+            await _llm_stage(llm_queue, render_queue, results, limiter, executor, client, True, batch_size)
+        return render_queue.qsize(), results.qsize()
+
+    return asyncio.run(run())
+
+
+def test_cached_responses_do_not_wait_for_the_limiter():
+    for batch_size in (1, 3):
+        merchant_lists = [[f"LIMITER TEST {batch_size} {n}"] for n in range(3)]
+        client, limiter = StubGroqClient(), CountingLimiter()
+        assert _run_llm_stage(merchant_lists, client, limiter, batch_size) == (3, 0)
+        assert limiter.acquired == client.calls > 0
+
+        client, limiter = StubGroqClient(), CountingLimiter()
+        assert _run_llm_stage(merchant_lists, client, limiter, batch_size) == (3, 0)
+        assert client.calls == 0
+        assert limiter.acquired == 0
@@ -0,0 +1,25 @@
+import pytest
+
+import caption_layout
+from caption_layout import FontFace, find_font_file
+
+FONT_PATH = find_font_file("DejaVuSans") or find_font_file("Arial")
+pytestmark = pytest.mark.skipif(FONT_PATH is None, reason="no TrueType font installed")
+
+
+def test_wrap():
+    face = FontFace(FONT_PATH, 20)
+    lines = face.wrap("Haloo, kamu sering belanja di minimarket dekat rumah", 200)
+    assert len(lines) > 1
+    assert all(face.text_width(line) <= 200 for line in lines)
+    assert " ".join(lines) == "Haloo, kamu sering belanja di minimarket dekat rumah"
+
+
+def test_layout_cache_is_bounded(monkeypatch):
+    monkeypatch.setattr(caption_layout, "LAYOUT_CACHE_SIZE", 3)
+    face = FontFace(FONT_PATH, 20)
+    for n in range(3):
+        face.wrap(f"caption {n}", 200)
+    face.wrap("caption 0", 200)  # Recently used again, so "caption 1" is evicted next
+    face.wrap("caption 3", 200)
+    assert [text for text, _ in face._layouts] == ["caption 2", "caption 0", "caption 3"]
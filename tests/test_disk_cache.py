@@ -0,0 +1,46 @@
+import disk_cache
+from disk_cache import DiskCache
+
+
+def test_get_set(tmp_path):
+    cache = DiskCache(str(tmp_path / "cache.sqlite"), "v1")
+    cache.set("a", [1, "x"])
+    assert cache.get("a") == [1, "x"]
+    assert cache.get("missing", "default") == "default"
+    assert cache.get_many(["a", "missing"]) == {"a": [1, "x"]}
+    assert cache.stats()["hits"] == 2
+
+
+def test_new_namespace_drops_old_entries(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    DiskCache(path, "v1").set("a", 1)
+    assert DiskCache(path, "v1").get("a") == 1
+    assert DiskCache(path, "v2").get("a") is None
+    assert DiskCache(path, "v1").get("a") is None
+
+
+def test_ttl(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(disk_cache.time, "time", lambda: now[0])
+    cache = DiskCache(str(tmp_path / "cache.sqlite"), "v1", ttl=60)
+    cache.set("a", 1)
+    now[0] += 59
+    assert cache.get("a") == 1
+    now[0] += 2
+    assert cache.get("a") is None
+    cache.set("b", 2)  # Writing evicts expired rows
+    assert cache.stats()["entries"] == 1
+
+
+def test_lru_eviction(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(disk_cache.time, "time", lambda: now[0])
+    cache = DiskCache(str(tmp_path / "cache.sqlite"), "v1", max_entries=2)
+    for key in ("a", "b"):
+        now[0] += 1
+        cache.set(key, key)
+    now[0] += 1
+    cache.get("a")  # "b" is now the least recently used
+    now[0] += 1
+    cache.set("c", "c")
+    assert cache.get_many(["a", "b", "c"]) == {"a": "a", "c": "c"}
@@ -0,0 +1,98 @@
+import os
+
+import cv2
+import numpy as np
+import pytest
+
+import frame_cache
+from frame_cache import TemplateFrameCache
+
+
+@pytest.fixture
+def video(tmp_path):
+    path = str(tmp_path / "template.avi")
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), 10, (32, 24))
+    for n in range(12):
+        writer.write(np.full((24, 32, 3), n * 20, np.uint8))
+    writer.release()
+    return path
+
+
+def _files(cache):
+    return sorted(name for name in os.listdir(cache.cache_dir) if name.endswith(".npy"))
+
+
+def test_partial_requests_share_one_file(video, tmp_path):
+    cache = TemplateFrameCache(str(tmp_path / "frames"))
+    head = cache.get(video, 5)
+    assert head.shape == (5, 24, 32, 3)
+    assert cache.get(video).shape == (12, 24, 32, 3)
+    assert cache.get(video, 8).shape[0] == 8
+    assert len(_files(cache)) == 1
+    assert (cache.hits, cache.misses) == (2, 1)
+
+
+def test_decodes_again_after_eviction(video, tmp_path):
+    cache = TemplateFrameCache(str(tmp_path / "frames"))
+    cache.get(video)
+    # Another process evicts the file
+    os.remove(os.path.join(cache.cache_dir, _files(cache)[0]))
+    assert cache.get(video, 3).shape[0] == 3
+    assert cache.misses == 2 and len(_files(cache)) == 1
+
+
+def test_edited_template_replaces_old_file(video, tmp_path):
+    cache = TemplateFrameCache(str(tmp_path / "frames"))
+    cache.get(video)
+    old = _files(cache)
+    os.utime(video, ns=(os.stat(video).st_atime_ns, os.stat(video).st_mtime_ns + 10 ** 9))
+    cache.get(video)
+    assert len(_files(cache)) == 1 and _files(cache) != old
+
+
+def test_disk_limit(video, tmp_path):
+    cache = TemplateFrameCache(str(tmp_path / "frames"), max_bytes=100)
+    assert cache.get(video) is None
+    assert _files(cache) == []
+
+
+class MiscountedCapture:
+    """cv2.VideoCapture stand-in whose CAP_PROP_FRAME_COUNT is wrong, as it often is for mp4 files."""
+
+    def __init__(self, video_path, frame_count, frames=7):
+        self.frame_count = frame_count
+        self.frames = [np.full((24, 32, 3), n, np.uint8) for n in range(frames)]
+
+    def isOpened(self):
+        return True
+
+    def get(self, prop):
+        return {cv2.CAP_PROP_FRAME_COUNT: self.frame_count, cv2.CAP_PROP_FRAME_HEIGHT: 24,
+                cv2.CAP_PROP_FRAME_WIDTH: 32}[prop]
+
+    def read(self):
+        if not self.frames:
+            return False, None
+        return True, self.frames.pop(0)
+
+    def release(self):
+        pass
+
+
+@pytest.mark.parametrize("frame_count", [20, 3, 0, -1])
+def test_frame_count_estimate_is_not_trusted(video, tmp_path, monkeypatch, frame_count):
+    monkeypatch.setattr(frame_cache.cv2, "VideoCapture", lambda path: MiscountedCapture(path, frame_count))
+    frames = TemplateFrameCache(str(tmp_path / "frames")).get(video)
+    assert frames.shape == (7, 24, 32, 3)
+    assert [int(frame[0, 0, 0]) for frame in frames] == list(range(7))
+
+
+def test_render_falls_back_when_the_cache_fails(video, monkeypatch):
+    import pipeline
+
+    class BrokenCache:
+        def get(self, video_path, max_frames=None):
+            raise OSError("disk full")
+
+    monkeypatch.setattr(pipeline, "get_frame_cache", lambda: BrokenCache())
+    assert pipeline.cached_frames(video) is None
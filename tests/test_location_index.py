@@ -0,0 +1,82 @@
+import json
+
+import pytest
+
+from location_index import LOCATION_DICT_PATH, LocationIndex, compile_location_index
+from merchant_matcher import MASTER_MERCHANT_PATH
+
+
+@pytest.fixture(scope="module")
+def index(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("locations") / "location_index.bin")
+    compile_location_index(LOCATION_DICT_PATH, path)
+    return LocationIndex(path)
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("QRIS ALFAMART 0123 BEKASI", "QRIS ALFAMART 0123"),
+    ("QRIS ALFAMART 0123", "QRIS ALFAMART 0123"),
+    ("QRIS KOPI KENANGAN", "QRIS KOPI KENANGAN"),
+    ("QRIS KOPI KENANGAN 01 BEKASI", "QRIS KOPI KENANGAN 01"),
+    ("QRIS INDOMARET 0123 CIPUTAT TANGERANG SELATAN", "QRIS INDOMARET 0123"),
+    ("PEMBAYARAN QRIS INDOMARET 0123 TANGERANG SELATAN", "PEMBAYARAN QRIS INDOMARET 0123"),
+    # Words of merchant names are not locations
+    ("QRIS KEDAI KOPI", "QRIS KEDAI KOPI"),
+    ("QRIS BAKSO MALANG", "QRIS BAKSO MALANG"),
+    ("QRIS SATE PADANG", "QRIS SATE PADANG"),
+    ("QRIS HOKA-HOKA BENTO", "QRIS HOKA-HOKA BENTO"),
+    ("BPJS KESEHATAN", "BPJS KESEHATAN"),
+    ("QRIS ES TEH SOLO", "QRIS ES TEH SOLO"),
+    ("QRIS TOKO SUMBER JAYA", "QRIS TOKO SUMBER JAYA"),
+    # Transaction prefixes do not count toward the tokens that are kept
+    ("QRIS 0123 BEKASI", "QRIS 0123 BEKASI"),
+    ("PEMBAYARAN QRIS 0123 BEKASI", "PEMBAYARAN QRIS 0123 BEKASI"),
+    # Without a terminal or branch number the last word may belong to the merchant
+    ("QRIS ALFAMART BEKASI", "QRIS ALFAMART BEKASI"),
+    ("QRIS TOKO SINAR MAJU", "QRIS TOKO SINAR MAJU"),
+    ("QRIS TOKO SINAR MEKAR", "QRIS TOKO SINAR MEKAR"),
+    ("QRIS TOKO SINAR UTAMA", "QRIS TOKO SINAR UTAMA"),
+    ("QRIS TOKO SINAR KENCANA", "QRIS TOKO SINAR KENCANA"),
+    ("QRIS TOKO SINAR MUDA", "QRIS TOKO SINAR MUDA"),
+    ("QRIS SATE KAMBING MUDA", "QRIS SATE KAMBING MUDA"),
+    ("QRIS TOKO SINAR MAJU 01 BEKASI", "QRIS TOKO SINAR MAJU 01"),
+    # Every token after the number must be part of a district name
+    ("QRIS KFC 01 MALL BEKASI", "QRIS KFC 01 MALL BEKASI"),
+])
+def test_strip(index, text, expected):
+    assert index.strip(text) == expected
+
+
+def test_master_merchant_names_are_kept(index):
+    with open(MASTER_MERCHANT_PATH) as f:
+        names = {name for group in json.load(f).values() for name in group.values()}
+    cut = [name for name in sorted(names) if index.strip(f"QRIS {name}") != f"QRIS {name}"]
+    assert cut == []
+    cut = [name for name in sorted(names)
+           if index.strip(f"QRIS {name} 0123 BEKASI") != f"QRIS {name} 0123"]
+    assert cut == []
+
+
+def test_different_merchants_keep_different_keys(index):
+    texts = [f"QRIS TOKO SINAR {word}" for word in ("MAJU", "MEKAR", "UTAMA", "KENCANA", "MUDA")]
+    assert len(set(index.strip_all(texts))) == len(texts)
+
+
+def test_min_tokens(index):
+    assert index.strip("QRIS 0123 BEKASI", min_tokens=1) == "QRIS 0123"
+    assert index.strip("QRIS ALFAMART 0123 BEKASI", min_tokens=3) == "QRIS ALFAMART 0123 BEKASI"
+
+
+def test_strip_counts(index):
+    before = index.stats()
+    index.strip_all(["QRIS ALFAMART 0123 BEKASI", "QRIS KOPI KENANGAN"])
+    after = index.stats()
+    assert after["lookups"] - before["lookups"] == 2
+    assert after["stripped"] - before["stripped"] == 1
+
+
+def test_rejects_other_files(tmp_path):
+    path = tmp_path / "not_an_index.bin"
+    path.write_bytes(b"something else entirely")
+    with pytest.raises(ValueError):
+        LocationIndex(str(path))
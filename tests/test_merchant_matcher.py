@@ -0,0 +1,45 @@
+import pytest
+
+from merchant_matcher import MerchantMatcher, get_merchant_matcher, normalize
+
+
+@pytest.fixture(scope="module")
+def matcher():
+    return get_merchant_matcher()
+
+
+def test_normalize():
+    assert normalize("H&M") == "hm"
+    assert normalize("Kopi-Kenangan!") == "kopikenangan"
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("QRIS KOPI KENANGAN", "KOPI KENANGAN"),
+    ("QRIS ALFAMART 0123 BEKASI", "ALFAMART"),
+    ("QRIS AFM 0123", "ALFAMART"),
+    ("QRIS HOKBEN 01 BINJAI", "HOKA-HOKA BENTO"),
+    ("QRIS KFC 01", "KFC"),
+    ("QRIS HM", "H&M"),
+    ("QRIS ALFA 123", "ALFAMART"),
+])
+def test_match(matcher, text, expected):
+    assert matcher.match(text) == expected
+
+
+@pytest.mark.parametrize("text", [
+    "QRIS CAFMOR",
+    "QRIS RM PADANG SEDERHANA",
+    "PEMBAYARAN QRIS SS JAYA",
+    "QRIS DD CELL",
+    "QRIS CAFE HM",
+    "TOKO ALFA JAYA",
+])
+def test_no_match(matcher, text):
+    assert matcher.match(text) is None
+
+
+def test_short_key_must_cover_merchant_span():
+    matcher = MerchantMatcher({"hm": "H&M", "rm": "RICHARD MILLE", "kopi kenangan": "KOPI KENANGAN"})
+    assert matcher.match("QRIS HM 0123") == "H&M"
+    assert matcher.match("QRIS RM KOPI") is None
+    assert matcher.match("QRIS KOPI KENANGAN RM") == "KOPI KENANGAN"
@@ -0,0 +1,80 @@
+import os
+import time
+
+import pytest
+
+from render_queue import RenderQueue, content_output_path, render_key
+
+TEMPLATE = "./tamplate_video/video_template_mnm.mp4"
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return RenderQueue(str(tmp_path / "jobs.sqlite"), str(tmp_path / "renders"))
+
+
+def _finish_with_file(queue, job_id, size=10):
+    path = content_output_path(job_id, queue.output_dir)
+    with open(path, "wb") as f:
+        f.write(b"\0" * size)
+    queue.finish(job_id, {"original": path})
+    return path
+
+
+def test_render_key_depends_on_request():
+    key = render_key(TEMPLATE, "Haloo")
+    assert key == render_key(TEMPLATE, "Haloo")
+    assert key != render_key(TEMPLATE, "Haloo, kamu")
+    assert key != render_key(TEMPLATE, "Haloo", {"font_scale": 2.0})
+    assert key != render_key(TEMPLATE, "Haloo", renditions=["1:1"])
+
+
+def test_submit_deduplicates(queue):
+    job_id = queue.submit(TEMPLATE, "Haloo")
+    assert queue.submit(TEMPLATE, "Haloo") == job_id
+    assert queue.status(job_id)["status"] == "queued"
+
+    job = queue.claim("test")
+    assert job["id"] == job_id and job["status"] == "running"
+    assert queue.claim("test") is None
+    # Joining a running job does not queue it again
+    assert queue.submit(TEMPLATE, "Haloo") == job_id
+    assert queue.claim("test") is None
+
+    _finish_with_file(queue, job_id)
+    assert queue.submit(TEMPLATE, "Haloo") == job_id
+    assert queue.status(job_id)["status"] == "done"
+    assert queue.claim("test") is None
+
+
+def test_missing_output_is_rendered_again(queue):
+    job_id = queue.submit(TEMPLATE, "Haloo")
+    queue.claim("test")
+    os.remove(_finish_with_file(queue, job_id))
+    queue.submit(TEMPLATE, "Haloo")
+    assert queue.status(job_id)["status"] == "queued"
+
+
+def test_gc(queue):
+    jobs = []
+    for n, text in enumerate(["a", "b", "c"]):
+        job_id = queue.submit(TEMPLATE, text)
+        queue.claim("test")
+        path = _finish_with_file(queue, job_id, size=100)
+        os.utime(path, (time.time() - 100 + n, time.time() - 100 + n))
+        jobs.append((job_id, path))
+    active = queue.submit(TEMPLATE, "still queued")
+    active_path = content_output_path(active, queue.output_dir)
+    with open(active_path, "wb") as f:
+        f.write(b"\0" * 100)
+
+    # Over the byte budget: the least recently used file goes first, the queued job's file stays
+    assert queue.gc(max_bytes=250, max_age=3600) == {"deleted": 1, "bytes": 100}
+    assert not os.path.exists(jobs[0][1])
+    assert queue.status(jobs[0][0]) is None
+    assert os.path.exists(jobs[1][1]) and os.path.exists(active_path)
+
+    # Past max_age: every finished output is removed
+    assert queue.gc(max_bytes=1 << 30, max_age=10)["deleted"] == 2
+    assert os.path.exists(active_path)
+    assert queue.status(jobs[2][0]) is None
@@ -0,0 +1,63 @@
+import pytest
+
+from benchmarks.fixtures import StubGroqClient
+from text_generated import (
+    get_response_cache, get_response_text, normalize_category, parse_batch_response, parse_response,
+    response_cache_key,
+)
+
+
+def test_uncached_call_still_stores_the_response():
+    merchants = ["KOPI KENANGAN", "TEST UNCACHED"]
+    client = StubGroqClient()
+    category, text = get_response_text(merchants, client, use_cache=False)
+    assert get_response_cache().get(response_cache_key(merchants)) == [category, text]
+
+    assert get_response_text(merchants, client, use_cache=True) == (category, text)
+    assert client.calls == 1
+
+
+@pytest.mark.parametrize("content, expected", [
+    ("belanja \nHaloo, kamu suka belanja!", ("belanja", "Haloo, kamu suka belanja!")),
+    ("Makanan & Minuman.\nHaloo, kamu suka kopi!", ("makanan & minuman", "Haloo, kamu suka kopi!")),
+    ("makanan dan minuman\nHaloo, kamu suka kopi!", ("makanan & minuman", "Haloo, kamu suka kopi!")),
+    ("hiburan Haloo, kamu suka nonton!", ("hiburan", "Haloo, kamu suka nonton!")),
+])
+def test_parse_response(content, expected):
+    assert parse_response(content) == expected
+
+
+@pytest.mark.parametrize("content", ["olahraga\nHaloo, kamu suka lari!", "lainnya:\n", ""])
+def test_parse_response_rejects_unknown_or_empty(content):
+    with pytest.raises(ValueError):
+        parse_response(content)
+
+
+def test_normalize_category():
+    assert normalize_category("- Belanja") == "belanja"
+    assert normalize_category("olahraga") is None
+
+
+def test_parse_batch_response():
+    content = '{"hasil": [{"id": "0", "kategori": "belanja", "ringkasan": "Haloo, a"}, ' \
+              '{"id": "1", "kategori": "Hiburan", "ringkasan": "Haloo, b"}]}'
+    assert parse_batch_response(content, ["0", "1"]) == {"0": ("belanja", "Haloo, a"), "1": ("hiburan", "Haloo, b")}
+
+
+def test_parse_batch_response_code_fence():
+    content = 'Berikut hasilnya:\n```json\n{"hasil": [{"id": "0", "kategori": "belanja", "ringkasan": "Haloo"}]}\n```'
+    assert parse_batch_response(content, ["0"]) == {"0": ("belanja", "Haloo")}
+
+
+def test_parse_batch_response_drops_bad_entries():
+    content = ('{"hasil": [{"id": "0", "kategori": "olahraga", "ringkasan": "Haloo"}, '
+               '{"id": "7", "kategori": "belanja", "ringkasan": "Haloo"}, '
+               '{"id": "1", "kategori": "belanja", "ringkasan": ""}, '
+               '{"kategori": "belanja", "ringkasan": "Haloo"}, "noise", '
+               '{"id": 2, "kategori": "hiburan", "ringkasan": "Haloo, c"}]}')
+    assert parse_batch_response(content, ["0", "1", "2"]) == {"2": ("hiburan", "Haloo, c")}
+
+
+@pytest.mark.parametrize("content", ["not json", "{broken", "[]", '{"hasil": "none"}'])
+def test_parse_batch_response_unparseable(content):
+    assert parse_batch_response(content, ["0"]) == {}
@@ -0,0 +1,74 @@
+import multiprocessing
+import os
+
+import pandas as pd
+import pytest
+
+from benchmarks.fixtures import synthetic_transactions
+from transaction_store import TransactionStore, _cif_key
+
+
+@pytest.fixture(scope="module")
+def spreadsheet(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("data") / "transactions.xlsx")
+    cifs = synthetic_transactions(path, cifs=5, rows_per_cif=4)
+    return path, cifs
+
+
+def _ingest(args):
+    source_path, store_dir = args
+    store = TransactionStore(source_path, store_dir)
+    store.refresh()
+    return store._meta["sha256"]
+
+
+def test_same_basename_gets_separate_stores(tmp_path):
+    first = TransactionStore(str(tmp_path / "a" / "data.xlsx"), str(tmp_path / "store"))
+    second = TransactionStore(str(tmp_path / "b" / "data.xlsx"), str(tmp_path / "store"))
+    assert first.arrow_path != second.arrow_path
+    assert first.meta_path != second.meta_path
+
+
+def test_concurrent_ingest(spreadsheet, tmp_path):
+    source_path, cifs = spreadsheet
+    store_dir = str(tmp_path / "store")
+    with multiprocessing.get_context("spawn").Pool(3) as pool:
+        hashes = pool.map(_ingest, [(source_path, store_dir)] * 3)
+    assert len(set(hashes)) == 1
+    assert not [name for name in os.listdir(store_dir) if name.endswith(".tmp")]
+    store = TransactionStore(source_path, store_dir)
+    assert sorted(store.cifs()) == sorted(str(cif) for cif in cifs)
+
+
+def test_cif_key():
+    assert _cif_key(188902) == _cif_key(188902.0) == _cif_key("188902 ") == "188902"
+
+
+def test_cif_index(tmp_path):
+    path = str(tmp_path / "mixed.xlsx")
+    pd.DataFrame({
+        "CIF": [3, 1, 7, 3, 1, 3],
+        "SUBHEADER": ["c1", "a1", "x", "c2", "a2", "c3"],
+    }).to_excel(path, index=False)
+    store = TransactionStore(path, str(tmp_path / "store"))
+    assert sorted(store.cifs()) == ["1", "3", "7"]
+
+    rows = store.get_cif(3)
+    assert rows["SUBHEADER"].tolist() == ["c1", "c2", "c3"]  # Sorted by CIF, file order kept within a CIF
+    assert set(rows["CIF"]) == {3}
+    assert store.get_cif("1")["SUBHEADER"].tolist() == ["a1", "a2"]
+    assert store.get_cif(1.0)["SUBHEADER"].tolist() == ["a1", "a2"]
+    assert store.get_cif("7")["SUBHEADER"].tolist() == ["x"]
+    assert store.get_cif(999).empty
+
+
+def test_refresh_reingests_changed_source(tmp_path):
+    path = str(tmp_path / "data.xlsx")
+    pd.DataFrame({"CIF": [1], "SUBHEADER": ["old"]}).to_excel(path, index=False)
+    store = TransactionStore(path, str(tmp_path / "store"))
+    assert store.get_cif(1)["SUBHEADER"].tolist() == ["old"]
+
+    pd.DataFrame({"CIF": [1, 2], "SUBHEADER": ["new", "other"]}).to_excel(path, index=False)
+    os.utime(path, ns=(os.stat(path).st_atime_ns, os.stat(path).st_mtime_ns + 10 ** 9))
+    assert store.get_cif(1)["SUBHEADER"].tolist() == ["new"]
+    assert sorted(store.cifs()) == ["1", "2"]
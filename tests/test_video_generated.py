@@ -0,0 +1,15 @@
+import pytest
+
+from video_generated import SEGMENT_MIN_TAIL, segment_boundary
+
+
+@pytest.mark.parametrize("text_frames, total_frames, expected", [
+    (150, 450, 150),
+    (151, 450, 180),
+    (300, 316, 316),  # A 16-frame tail is not worth a segment
+    (300, 300 + SEGMENT_MIN_TAIL, 300),
+    (300, 300 + SEGMENT_MIN_TAIL - 1, 300 + SEGMENT_MIN_TAIL - 1),
+    (500, 450, 450),
+])
+def test_segment_boundary(text_frames, total_frames, expected):
+    assert segment_boundary(text_frames, total_frames) == expected
@@ -1,13 +1,41 @@
+import os
+import re
 import json
-from groq import Groq
+import hashlib
+import threading
+import metrics
+from disk_cache import CACHE_DIR, DiskCache
 
-# Load config.json
-with open("config.json") as config_file:
-    config = json.load(config_file)
+CONFIG_PATH = "config.json"
+MODEL_NAME = "llama-3.3-70b-versatile"
+SYSTEM_PROMPT = "You are a helpful assistant."
+RESPONSE_CACHE_PATH = os.path.join(CACHE_DIR, "llm_cache.sqlite")
+RESPONSE_CACHE_SIZE = 50000
+RESPONSE_CACHE_TTL = 7 * 24 * 3600
 
-# Access the API key
-api_key = config["api_key"]
-client = Groq(api_key=api_key)
+CATEGORIES = ["belanja", "makanan & minuman", "hiburan", "lainnya"]
+BATCH_SIZE = 10
+
+_client = None
+_client_lock = threading.Lock()
+_response_caches = {}
+
+def get_client():
+    """
+    Return the shared Groq client, reading the API key from config.json on first use.
+    The groq package is imported here too, so importing this module stays cheap.
+
+    :return: A Groq client.
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            from groq import Groq
+
+            with open(CONFIG_PATH) as config_file:
+                config = json.load(config_file)
+            _client = Groq(api_key=config["api_key"])
+        return _client
 
 # Define the prompt template
 prompt_text = """
@@ -27,6 +55,26 @@ Data input: {user_query}
 contoh output: belanja \nHaloo, (lanjutkan dengan deskripsinya)
 """
 
+# Prompt for several customers in one request, answered as JSON
+batch_prompt_text = """
+Kamu adalah pakar pemasaran yang membantu klien di industri keuangan. 
+Kamu akan diberikan daftar nasabah, masing-masing dengan "id" dan daftar "merchant" tempat dia bertransaksi.
+Untuk setiap nasabah, kategorikan nasabah tersebut ke salah satu kategori-kategori berikut.
+- belanja
+- makanan & minuman
+- hiburan
+- lainnya
+
+Lalu buatlah ringkasan yang ramah dan menarik tentang tempat-tempat seperti apa transaksi yang sering dia lakukan 
+yang ditujukan langsung kepada pelanggan. Mulailah ringkasan dengan "Haloo," dan jelaskan kebiasaan transaksi mereka 
+dengan nada percakapan yang relevan pakai sapaan 'kamu'. Tulis hingga 2 kalimat pendek agar menarik dan mudah dipahami.
+
+Jawab hanya dengan JSON dengan format berikut, satu objek untuk setiap nasabah:
+{{"hasil": [{{"id": "<id nasabah>", "kategori": "<kategori>", "ringkasan": "Haloo, ..."}}]}}
+
+Data input: {user_query}
+"""
+
 # prompt_category = """
 # Kamu adalah pakar pemasaran yang membantu klien di industri keuangan. 
 # Kamu akan diberikan beberapa kalimat berisi deskripsi singkat nasabah mengenai dirinya dan transaksi yang sering dilakukan.
@@ -41,27 +89,226 @@ contoh output: belanja \nHaloo, (lanjutkan dengan deskripsinya)
 # Data input: {user_query}
 # """
 
-def get_response_text(user_input):
+def get_response_cache():
+    """
+    Return the on-disk response cache for the current model and prompt template.
+
+    Changing MODEL_NAME, SYSTEM_PROMPT or a prompt template changes the namespace,
+    which drops every response cached under the old one.
+
+    :return: A DiskCache instance.
+    """
+    template_hash = hashlib.sha256((SYSTEM_PROMPT + prompt_text + batch_prompt_text).encode()).hexdigest()[:16]
+    namespace = f"{MODEL_NAME}:{template_hash}"
+    with _client_lock:
+        if namespace not in _response_caches:
+            _response_caches.clear()
+            _response_caches[namespace] = DiskCache(
+                RESPONSE_CACHE_PATH, namespace, max_entries=RESPONSE_CACHE_SIZE, ttl=RESPONSE_CACHE_TTL
+            )
+        return _response_caches[namespace]
+
+def response_cache_key(user_input):
+    """
+    Build the cache key for a merchant list: order, case and duplicates do not matter.
+
+    :param user_input: A list of merchant names (or a plain query string)
+    :return: A hex digest
+    """
+    if isinstance(user_input, (list, tuple, set)):
+        merchants = sorted({" ".join(str(m).upper().split()) for m in user_input} - {""})
+        user_input = json.dumps(merchants, ensure_ascii=False)
+    return hashlib.sha256(str(user_input).encode()).hexdigest()
+
+def normalize_category(category):
+    """
+    Map a category written by the model to one of CATEGORIES.
+
+    :param category: Raw category text, e.g. "Makanan & Minuman." or "- belanja"
+    :return: The matching category, or None if it is not one of CATEGORIES
+    """
+    category = " ".join(re.sub(r"[^a-z& ]", " ", str(category).lower()).split())
+    category = category.replace("makanan dan minuman", "makanan & minuman")
+    return category if category in CATEGORIES else None
+
+def parse_response(content):
+    """
+    Split a single-customer response into category and caption.
+
+    Accepts the expected "kategori \nHaloo, ..." layout as well as a missing
+    space, a bare category line, or the category and caption on one line.
+
+    :param content: Raw message content from the model
+    :return: Tuple (category, text)
+    :raises ValueError: If no known category starts the response
+    """
+    content = content.strip()
+    head, _, tail = content.partition("\n")
+    category = normalize_category(head)
+    if category is not None and tail.strip():
+        return category, tail.strip()
+
+    # Category and caption on the same line, e.g. "belanja Haloo, ..."
+    lowered = content.lower()
+    for name in sorted(CATEGORIES, key=len, reverse=True):
+        if lowered.startswith(name):
+            text = content[len(name):].strip(" \n:-")
+            if text:
+                return name, text
+    raise ValueError(f"Unable to parse model response: {content[:80]!r}")
+
+def create_completion(client, **kwargs):
+    """
+    Call client.chat.completions.create and record its latency and token usage.
+
+    :return: The chat completion response.
+    """
+    with metrics.span("llm.request"):
+        response = client.chat.completions.create(**kwargs)
+    metrics.increment("llm.requests")
+    usage = getattr(response, "usage", None)
+    if usage is not None:
+        metrics.increment("llm.prompt_tokens", getattr(usage, "prompt_tokens", 0) or 0)
+        metrics.increment("llm.completion_tokens", getattr(usage, "completion_tokens", 0) or 0)
+    return response
+
+def get_response_text(user_input, client=None, use_cache=True, before_request=None):
     """
     Generate a response from the Groq model based on the user input.
 
     :param user_input: The user's query to process
-    :return: Generated response as a string
+    :param client: Groq-compatible client to use instead of the shared one (e.g. a local stub)
+    :param use_cache: Reuse responses from the on-disk response cache; False always calls the model.
+                      Fresh responses are stored either way.
+    :param before_request: Function called before the model request, not on a cache hit (e.g. a rate limiter)
+    :return: Tuple (category, text)
     """
+    key = response_cache_key(user_input)
+    if use_cache:
+        cached = get_response_cache().get(key)
+        metrics.increment("llm_cache.hits" if cached is not None else "llm_cache.misses")
+        if cached is not None:
+            return tuple(cached)
+
     final_prompt = prompt_text.format(user_query=user_input)
+    client = client or get_client()
+    if before_request:
+        before_request()
 
     # Generate response from the model
-    response = client.chat.completions.create(
+    response = create_completion(
+        client,
         messages=[
-            {"role": "system", "content": "You are a helpful assistant."},
+            {"role": "system", "content": SYSTEM_PROMPT},
             {"role": "user", "content": final_prompt},
         ],
-        model="llama-3.3-70b-versatile",
+        model=MODEL_NAME,
     )
 
-    category, text = response.choices[0].message.content.split(" \n", 1)
+    category, text = parse_response(response.choices[0].message.content)
 
+    get_response_cache().set(key, [category, text])
     return category, text
 
+def parse_batch_response(content, ids):
+    """
+    Read the per-customer results of a batched request.
+
+    Entries with an unknown id, an unknown category or an empty caption are
+    left out, so the caller can retry them one by one.
+
+    :param content: Raw message content from the model, expected to be JSON
+    :param ids: The customer ids sent in the request
+    :return: Dict of id -> (category, text)
+    """
+    try:
+        data = json.loads(content)
+    except ValueError:
+        # Tolerate text or code fences around the JSON object
+        match = re.search(r"\{.*\}", content, re.DOTALL)
+        if not match:
+            return {}
+        try:
+            data = json.loads(match.group(0))
+        except ValueError:
+            return {}
+
+    entries = data.get("hasil", []) if isinstance(data, dict) else data
+    parsed = {}
+    for entry in entries if isinstance(entries, list) else []:
+        if not isinstance(entry, dict):
+            continue
+        entry_id = str(entry.get("id", ""))
+        category = normalize_category(entry.get("kategori", ""))
+        text = str(entry.get("ringkasan") or "").strip()
+        if entry_id in ids and category and text:
+            parsed[entry_id] = (category, text)
+    return parsed
+
+def get_response_texts_batched(user_inputs, client=None, batch_size=BATCH_SIZE, use_cache=True, before_request=None):
+    """
+    Generate category and caption for many customers with one request per batch.
+
+    Up to batch_size merchant lists are packed into a single chat completion
+    that answers in JSON. Customers missing from a batch answer, or with an
+    answer that does not parse, fall back to get_response_text.
+
+    :param user_inputs: A list of merchant lists, one per customer
+    :param client: Groq-compatible client to use instead of the shared one (e.g. a local stub)
+    :param batch_size: Number of customers per request
+    :param use_cache: Reuse responses from the on-disk response cache; fresh responses are stored either way
+    :param before_request: Function called before every model request, batched or fallback (e.g. a rate limiter)
+    :return: A list aligned with user_inputs of (category, text), or None where every attempt failed
+    """
+    results = [None] * len(user_inputs)
+    keys = [response_cache_key(user_input) for user_input in user_inputs]
+    todo = list(range(len(user_inputs)))
+
+    if use_cache:
+        cached = get_response_cache().get_many(set(keys))
+        for i, key in enumerate(keys):
+            if key in cached:
+                results[i] = tuple(cached[key])
+        todo = [i for i in todo if results[i] is None]
+        metrics.increment("llm_cache.hits", len(user_inputs) - len(todo))
+        metrics.increment("llm_cache.misses", len(todo))
+
+    if todo and client is None:
+        client = get_client()
+    for start in range(0, len(todo), batch_size):
+        batch = todo[start:start + batch_size]
+        ids = [str(n) for n in range(len(batch))]
+        payload = [{"id": n, "merchant": list(user_inputs[i])} for n, i in zip(ids, batch)]
+        parsed = {}
+        try:
+            if before_request:
+                before_request()
+            response = create_completion(
+                client,
+                messages=[
+                    {"role": "system", "content": SYSTEM_PROMPT},
+                    {"role": "user", "content": batch_prompt_text.format(user_query=json.dumps(payload, ensure_ascii=False))},
+                ],
+                model=MODEL_NAME,
+                response_format={"type": "json_object"},
+            )
+            parsed = parse_batch_response(response.choices[0].message.content, ids)
+        except Exception as e:
+            print(f"Batched request failed, retrying customers one by one: {e}")
+
+        for n, i in zip(ids, batch):
+            if n in parsed:
+                results[i] = parsed[n]
+                continue
+            # get_response_text stores its own result in the cache
+            try:
+                results[i] = get_response_text(user_inputs[i], client=client, use_cache=False,
+                                               before_request=before_request)
+            except Exception as e:
+                print(f"An error occurred while generating text: {e}")
+
+        get_response_cache().set_many((keys[i], list(parsed[n])) for n, i in zip(ids, batch) if n in parsed)
+    return results
+
 
 
@@ -0,0 +1,233 @@
+import contextlib
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+import pyarrow as pa
+
+import metrics
+from disk_cache import CACHE_DIR
+
+STORE_DIR = os.path.join(CACHE_DIR, "transactions")
+
+
+def _file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+@contextlib.contextmanager
+def _file_lock(path):
+    """
+    Hold an exclusive lock on path (created if missing) across processes.
+    """
+    with open(path, "a+b") as f:
+        if os.name == "nt":
+            import msvcrt
+
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def _replace_atomically(path, write):
+    """
+    Write a file through a unique temporary file in the same directory, then
+    move it into place, so concurrent writers never share a temporary path.
+
+    :param path: Final path of the file.
+    :param write: Function called with the temporary path.
+    """
+    fd, tmp_path = tempfile.mkstemp(suffix=".tmp", dir=os.path.dirname(os.path.abspath(path)))
+    os.close(fd)
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def _cif_key(value):
+    """
+    Normalize a CIF value for the index, so 188902, 188902.0 and "188902" share a key.
+    """
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+class TransactionStore:
+    """
+    Columnar copy of the transaction spreadsheet with a CIF -> row range index.
+
+    The Excel file is parsed once and written as an uncompressed Arrow IPC file,
+    sorted by CIF. Reads memory-map that file, so looking up one customer only
+    materializes that customer's rows. The ingest re-runs when the source file
+    changes (mtime/size first, then content hash). Ingests hold a lock file, so
+    processes opening the same spreadsheet at once convert it only once.
+    """
+
+    def __init__(self, source_path, store_dir=STORE_DIR):
+        """
+        :param source_path: Path to the Excel file containing the data.
+        :param store_dir: Directory for the Arrow file and its index.
+        """
+        self.source_path = source_path
+        # Spreadsheets with the same file name in different folders get separate stores
+        source_id = hashlib.sha1(os.path.abspath(source_path).encode()).hexdigest()[:12]
+        name = f"{os.path.splitext(os.path.basename(source_path))[0]}-{source_id}"
+        self.arrow_path = os.path.join(store_dir, f"{name}.arrow")
+        self.meta_path = os.path.join(store_dir, f"{name}.json")
+        self.lock_path = os.path.join(store_dir, f"{name}.lock")
+        self._lock = threading.Lock()
+        self._table = None
+        self._meta = None
+
+    def _load_meta(self):
+        if not (os.path.exists(self.meta_path) and os.path.exists(self.arrow_path)):
+            return None
+        with open(self.meta_path) as f:
+            return json.load(f)
+
+    def _is_fresh(self, meta):
+        if meta is None:
+            return False
+        stat = os.stat(self.source_path)
+        if meta["mtime_ns"] == stat.st_mtime_ns and meta["size"] == stat.st_size:
+            return True
+        if meta["sha256"] != _file_hash(self.source_path):
+            return False
+        # Touched but unchanged: remember the new mtime and keep the store
+        meta.update(mtime_ns=stat.st_mtime_ns, size=stat.st_size)
+        self._write_meta(meta)
+        return True
+
+    def _write_meta(self, meta):
+        def write(tmp_path):
+            with open(tmp_path, "w") as f:
+                json.dump(meta, f)
+
+        _replace_atomically(self.meta_path, write)
+
+    def ingest(self):
+        """
+        Convert the Excel file into the Arrow store and rebuild the CIF index.
+        Callers hold the store's lock file; see refresh().
+
+        :return: The metadata dict of the new store.
+        """
+        import pandas as pd  # Only needed to parse the spreadsheet; lookups go through Arrow
+
+        stat = os.stat(self.source_path)
+        with metrics.span("data.load_excel"):
+            data = pd.read_excel(self.source_path)
+        data = data.sort_values("CIF", kind="stable").reset_index(drop=True)
+
+        # Arrow needs one type per column; spreadsheets often mix numbers and text
+        for column in data.columns[data.dtypes == object]:
+            data[column] = data[column].map(lambda v: v if v is None or isinstance(v, str) or pd.isna(v) else str(v))
+        table = pa.Table.from_pandas(data, preserve_index=False)
+
+        index = {}
+        keys = [_cif_key(v) for v in data["CIF"].tolist()]
+        start = 0
+        for row in range(1, len(keys) + 1):
+            if row == len(keys) or keys[row] != keys[start]:
+                index[keys[start]] = [start, row]
+                start = row
+
+        def write(tmp_path):
+            with pa.OSFile(tmp_path, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+
+        os.makedirs(os.path.dirname(self.arrow_path), exist_ok=True)
+        with metrics.span("data.write_store"):
+            _replace_atomically(self.arrow_path, write)
+
+        meta = {
+            "source": os.path.abspath(self.source_path),
+            "mtime_ns": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "sha256": _file_hash(self.source_path),
+            "rows": len(data),
+            "index": index,
+        }
+        self._write_meta(meta)
+        return meta
+
+    def refresh(self):
+        """
+        Make sure the store matches the source file, re-ingesting only if it changed.
+        Cheap when nothing changed: a single stat of the source file.
+        """
+        with self._lock:
+            meta = self._meta or self._load_meta()
+            if not self._is_fresh(meta):
+                os.makedirs(os.path.dirname(self.lock_path), exist_ok=True)
+                with _file_lock(self.lock_path):
+                    # Another process may have finished the ingest while we waited
+                    meta = self._load_meta()
+                    if not self._is_fresh(meta):
+                        meta = self.ingest()
+                self._table = None
+            if self._table is None:
+                source = pa.memory_map(self.arrow_path, "r")
+                self._table = pa.ipc.open_file(source).read_all()
+            self._meta = meta
+
+    def cifs(self):
+        """
+        :return: A list of all CIF keys in the store, as strings.
+        """
+        self.refresh()
+        return list(self._meta["index"])
+
+    def get_cif(self, cif):
+        """
+        Return the transactions of one customer.
+
+        :param cif: The CIF value to look up.
+        :return: A pandas DataFrame with only that customer's rows (empty if unknown).
+        """
+        self.refresh()
+        start, stop = self._meta["index"].get(_cif_key(cif), (0, 0))
+        with metrics.span("data.get_cif"):
+            data = self._table.slice(start, stop - start).to_pandas()
+        if len(data):
+            # Match the CIF type callers compare against (e.g. the int from the UI)
+            data["CIF"] = cif
+        return data
+
+
+def load_store(file_path):
+    """
+    Open the columnar store for an Excel file, ingesting it if needed.
+
+    :param file_path: Path to the Excel file containing the data.
+    :return: A TransactionStore, or None if the file could not be ingested.
+    """
+    try:
+        store = TransactionStore(file_path)
+        store.refresh()
+        return store
+    except Exception as e:
+        print(f"An error occurred while loading the file: {e}")
+        return None
@@ -1,24 +1,143 @@
+import os
 import cv2
+import hashlib
+import json
+import numpy as np
+import subprocess
+import tempfile
 import textwrap
+import threading
+import time
+from functools import lru_cache
 
+import metrics
+from caption_layout import get_font_face
+from disk_cache import CACHE_DIR
+from frame_cache import FrameReader
 
-def initialize_video(video_path, output_path, logo_path=None, logo_scale=1.0):
+# libx264 settings for the ffmpeg writer backend
+ENCODER_DEFAULTS = {"preset": "veryfast", "crf": 23, "threads": 0}
+
+# Pre-encoded template tails for segmented rendering
+SEGMENT_DIR = os.path.join(CACHE_DIR, "segments")
+SEGMENT_GOP = 30
+SEGMENT_MIN_TAIL = 60  # shorter tails are not worth a separate segment; the render is single-pass
+
+_tail_lock = threading.Lock()
+
+# Output formats for multi-rendition renders: frame size (None keeps the template's) and fit mode
+RENDITIONS = {
+    "original": {"size": None, "fit": None},
+    "9:16": {"size": (720, 1280), "fit": "crop"},
+    "1:1": {"size": (720, 720), "fit": "crop"},
+    "16:9": {"size": (1280, 720), "fit": "pad"},
+}
+
+
+@lru_cache(maxsize=64)
+def _probe_video(video_path, mtime_ns):
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise IOError(f"Unable to open video file: {video_path}")
+    try:
+        return {
+            "fps": cap.get(cv2.CAP_PROP_FPS),
+            "width": int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+            "height": int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+            "frame_count": int(cap.get(cv2.CAP_PROP_FRAME_COUNT)),
+        }
+    finally:
+        cap.release()
+
+
+def probe_video(video_path):
+    """
+    Read fps, width, height and frame count of a video, cached until the file changes.
+    """
+    return dict(_probe_video(video_path, os.stat(video_path).st_mtime_ns))
+
+
+class FFmpegWriter:
+    """
+    cv2.VideoWriter replacement that pipes raw BGR frames into a single ffmpeg
+    libx264 process, producing the final browser-friendly mp4 in one encode.
+    The audio track of audio_source (the template) is copied without re-encoding.
+    """
+
+    def __init__(self, output_path, fps, frame_size, audio_source=None, preset="veryfast", crf=23, threads=0):
+        width, height = frame_size
+        command = [
+            "ffmpeg", "-y", "-loglevel", "error",
+            "-f", "rawvideo", "-pix_fmt", "bgr24", "-s", f"{width}x{height}", "-r", str(fps), "-i", "-",
+        ]
+        if audio_source:
+            command += ["-i", audio_source, "-map", "0:v:0", "-map", "1:a:0?", "-c:a", "copy", "-shortest"]
+        command += ["-c:v", "libx264", "-preset", preset, "-crf", str(crf), "-pix_fmt", "yuv420p", "-movflags", "+faststart"]
+        if threads:
+            command += ["-threads", str(threads)]
+        command.append(output_path)
+
+        self.output_path = output_path
+        self.frame_size = (width, height)
+        self.proc = subprocess.Popen(command, stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    def isOpened(self):
+        return self.proc.poll() is None
+
+    def write(self, frame):
+        self.proc.stdin.write(memoryview(np.ascontiguousarray(frame)).cast("B"))
+
+    def release(self):
+        if self.proc.stdin.closed:
+            return
+        with metrics.span("video.encode_flush"):
+            self.proc.stdin.close()
+            error = self.proc.stderr.read().decode(errors="replace").strip()
+            returncode = self.proc.wait()
+        if returncode != 0:
+            if os.path.exists(self.output_path):
+                os.remove(self.output_path)
+            raise IOError(f"ffmpeg failed to encode {self.output_path}: {error}")
+
+
+def initialize_video(video_path, output_path, logo_path=None, logo_scale=1.0, backend="ffmpeg", encoder=None,
+                     audio=True, frames=None):
     """
     Initialize video capture and writer, and optionally load a logo.
+
+    backend "ffmpeg" encodes H.264 directly into output_path through an
+    FFmpegWriter (encoder overrides ENCODER_DEFAULTS, audio copies the
+    template's audio track); "opencv" writes mp4v with cv2.VideoWriter,
+    which needs convert_video_to_mp4 afterwards.
+
+    frames (from frame_cache.TemplateFrameCache) replaces the decoder with a
+    FrameReader over already decoded frames.
     """
-    cap = cv2.VideoCapture(video_path)
+    cap = cv2.VideoCapture(video_path) if frames is None else FrameReader(frames)
     if not cap.isOpened():
         raise IOError(f"Unable to open video file: {video_path}")
 
     # Get video properties
-    fps = int(cap.get(cv2.CAP_PROP_FPS))
-    frame_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-    frame_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    metadata = probe_video(video_path)
+    fps = int(metadata["fps"])
+    frame_width = metadata["width"]
+    frame_height = metadata["height"]
+
+    # Create the writer
+    if backend == "ffmpeg":
+        options = dict(ENCODER_DEFAULTS, **(encoder or {}))
+        out = FFmpegWriter(output_path, metadata["fps"], (frame_width, frame_height), audio_source=video_path if audio else None, **options)
+    else:
+        out = cv2.VideoWriter(output_path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (frame_width, frame_height))
+
+    logo = load_logo(logo_path, logo_scale)
+    return cap, out, logo, fps, frame_width, frame_height
 
-    # Create a VideoWriter object
-    out = cv2.VideoWriter(output_path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (frame_width, frame_height))
 
-    # Load and scale the logo image
+def load_logo(logo_path, logo_scale=1.0):
+    """
+    Load and scale the logo image, keeping its alpha channel. Returns None without a path.
+    """
     logo = None
     if logo_path:
         logo = cv2.imread(logo_path, cv2.IMREAD_UNCHANGED)
@@ -27,8 +146,7 @@ def initialize_video(video_path, output_path, logo_path=None, logo_scale=1.0):
         new_width = int(logo.shape[1] * logo_scale)
         new_height = int(logo.shape[0] * logo_scale)
         logo = cv2.resize(logo, (new_width, new_height), interpolation=cv2.INTER_AREA)
-
-    return cap, out, logo, fps, frame_width, frame_height
+    return logo
 
 
 def release_resources(cap, out):
@@ -37,7 +155,10 @@ def release_resources(cap, out):
     """
     cap.release()
     out.release()
-    cv2.destroyAllWindows()
+    try:
+        cv2.destroyAllWindows()
+    except cv2.error:
+        pass  # Headless OpenCV builds (batch workers) have no window support
 
 
 def wrap_text(text, frame_width, font_scale, font_thickness):
@@ -62,53 +183,411 @@ def calculate_text_position(wrapped_text, frame_height, font_scale, font_thickne
 def overlay_logo(frame, logo, frame_width, frame_height, margin_left=10, margin_top=50):
     """
     Overlay the logo on the frame.
+
+    For repeated overlays, build the layer once with make_logo_layer and call
+    composite_layer per frame instead.
     """
     if logo is not None:
-        logo_height, logo_width = logo.shape[:2]
-        x_start, y_start = margin_left, margin_top
-        x_end = min(x_start + logo_width, frame_width)
-        y_end = min(y_start + logo_height, frame_height)
-        roi_width = x_end - x_start
-        roi_height = y_end - y_start
+        composite_layer(frame, make_logo_layer(logo, frame_width, frame_height, margin_left, margin_top))
+
+
+def premultiply(image):
+    """
+    Convert a BGR or BGRA image to premultiplied BGRA with integer arithmetic.
+    """
+    if image.ndim == 2:
+        image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+    if image.shape[2] == 3:
+        return np.dstack([image, np.full(image.shape[:2], 255, np.uint8)])
+    alpha = image[:, :, 3:4].astype(np.uint16)
+    premult = (image[:, :, :3].astype(np.uint16) * alpha + 127) // 255
+    return np.dstack([premult.astype(np.uint8), image[:, :, 3]])
+
+
+def make_logo_layer(logo, frame_width, frame_height, margin_left=10, margin_top=50):
+    """
+    Prepare the logo (BGR or BGRA, as loaded by initialize_video) as an overlay
+    layer at (margin_left, margin_top), so each frame only needs composite_layer.
+    """
+    if logo is None:
+        return None
+    return make_overlay_layer(premultiply(logo), margin_left, margin_top, frame_width, frame_height)
+
+
+def make_overlay_layer(bgra, x, y, frame_width, frame_height):
+    """
+    Prepare a premultiplied BGRA image for repeated compositing at (x, y).
+
+    The image is clipped to the frame once, and its inverse alpha is expanded
+    to three channels, so per-frame blending is two vectorized cv2 calls.
+    Returns None when the image lies completely outside the frame.
+    """
+    x_start, y_start = max(x, 0), max(y, 0)
+    x_end = min(x + bgra.shape[1], frame_width)
+    y_end = min(y + bgra.shape[0], frame_height)
+    if x_end <= x_start or y_end <= y_start:
+        return None
+
+    clipped = bgra[y_start - y:y_end - y, x_start - x:x_end - x]
+    inv_alpha = 255 - clipped[:, :, 3]
+    return {
+        "x": x_start,
+        "y": y_start,
+        "premult": np.ascontiguousarray(clipped[:, :, :3]),
+        "inv_alpha": cv2.merge([inv_alpha, inv_alpha, inv_alpha]),
+    }
 
-        resized_logo = logo[:roi_height, :roi_width]
-        roi = frame[y_start:y_end, x_start:x_end]
 
-        if resized_logo.shape[2] == 4:  # Logo with alpha channel
-            logo_bgr = resized_logo[:, :, :3]
-            alpha_mask = resized_logo[:, :, 3] / 255.0
-            for c in range(3):
-                roi[:, :, c] = (1 - alpha_mask) * roi[:, :, c] + alpha_mask * logo_bgr[:, :, c]
-        else:
-            roi[:, :, :] = resized_logo
+def composite_layer(frame, layer):
+    """
+    Blend a prepared overlay layer onto the frame in place (premultiplied "over").
+    """
+    if layer is None:
+        return
+    height, width = layer["premult"].shape[:2]
+    roi = frame[layer["y"]:layer["y"] + height, layer["x"]:layer["x"] + width]
+    roi[:] = cv2.add(cv2.multiply(roi, layer["inv_alpha"], scale=1 / 255), layer["premult"])
+
+
+def render_text_sprite(wrapped_text, frame_width, y_start, font_scale, text_color, font_thickness, shadow_color, shadow_offset):
+    """
+    Rasterize the wrapped caption and its shadow once into a premultiplied BGRA sprite.
+
+    Lines are centered and spaced exactly like the per-frame cv2.putText drawing.
+    Returns the sprite and the frame position (x, y) of its top-left corner.
+    """
+    lines = []
+    y = y_start
+    for line in wrapped_text:
+        (text_width, text_height), baseline = cv2.getTextSize(line, cv2.FONT_HERSHEY_SIMPLEX, font_scale, font_thickness)
+        lines.append((line, (frame_width - text_width) // 2, y, text_width, text_height, baseline))
+        y += text_height + 9
+    if not lines:
+        return np.zeros((0, 0, 4), np.uint8), 0, 0
+
+    # Bounding box of all glyphs, their shadow, and the stroke thickness
+    margin = font_thickness + 2
+    left = min(x + min(0, shadow_offset[0]) for _, x, _, _, _, _ in lines) - margin
+    top = min(y - h + min(0, shadow_offset[1]) for _, _, y, _, h, _ in lines) - margin
+    right = max(x + w + max(0, shadow_offset[0]) for _, x, _, w, _, _ in lines) + margin
+    bottom = max(y + b + max(0, shadow_offset[1]) for _, _, y, _, _, b in lines) + margin
+
+    shadow = np.zeros((bottom - top, right - left, 3), np.uint8)
+    shadow_alpha = np.zeros((bottom - top, right - left), np.uint8)
+    text_alpha = np.zeros_like(shadow_alpha)
+    for line, x, y, _, _, _ in lines:
+        shadow_origin = (x + shadow_offset[0] - left, y + shadow_offset[1] - top)
+        cv2.putText(shadow, line, shadow_origin, cv2.FONT_HERSHEY_SIMPLEX, font_scale, shadow_color, font_thickness, cv2.LINE_AA)
+        cv2.putText(shadow_alpha, line, shadow_origin, cv2.FONT_HERSHEY_SIMPLEX, font_scale, 255, font_thickness, cv2.LINE_AA)
+        cv2.putText(text_alpha, line, (x - left, y - top), cv2.FONT_HERSHEY_SIMPLEX, font_scale, 255, font_thickness, cv2.LINE_AA)
+
+    # Text over shadow; drawing on black already gives the shadow premultiplied
+    a_text = text_alpha[:, :, None].astype(np.float32) / 255
+    a_shadow = shadow_alpha[:, :, None].astype(np.float32) / 255
+    premult = np.array(text_color, np.float32) * a_text + shadow.astype(np.float32) * (1 - a_text)
+    alpha = a_text + a_shadow * (1 - a_text)
+    sprite = np.dstack([premult, alpha * 255])
+    return np.clip(np.rint(sprite), 0, 255).astype(np.uint8), left, top
+
+
+def make_caption_layer(text, frame_width, frame_height, font_scale=1, text_color=(255, 255, 255), font_thickness=2,
+                       shadow_color=(0, 0, 0), shadow_offset=(2, 2), font=None):
+    """
+    Lay out and rasterize a caption for a frame size, ready for composite_layer.
+
+    A TrueType font is laid out by caption_layout; without one, or if it is
+    not installed, the caption is drawn with cv2.FONT_HERSHEY_SIMPLEX.
+    """
+    face = get_font_face(font, font_scale, font_thickness) if font else None
+    if face is not None:
+        sprite, x, y = face.render_caption(text, frame_width, frame_height, text_color, shadow_color, shadow_offset)
+    else:
+        wrapped_text = wrap_text(text, frame_width, font_scale, font_thickness)
+        y_start = calculate_text_position(wrapped_text, frame_height, font_scale, font_thickness)
+        sprite, x, y = render_text_sprite(wrapped_text, frame_width, y_start, font_scale, text_color, font_thickness, shadow_color, shadow_offset)
+    return make_overlay_layer(sprite, x, y, frame_width, frame_height)
 
 
-def add_text(cap, out, text, fps, frame_width, frame_height, font_scale=1, text_color=(255, 255, 255), font_thickness=2, shadow_color=(0, 0, 0), shadow_offset=(2, 2), duration=10):
+class FrameTimings:
+    """
+    Per-phase time of a frame loop, summed locally and recorded once as
+    "video.<phase>" spans, so instrumenting every frame costs one clock read.
+    """
+
+    def __init__(self):
+        self.start = self.last = time.perf_counter()
+        self.seconds = {}
+
+    def lap(self, phase):
+        now = time.perf_counter()
+        self.seconds[phase] = self.seconds.get(phase, 0.0) + now - self.last
+        self.last = now
+
+    def record(self, frames):
+        for phase, seconds in self.seconds.items():
+            metrics.record(f"video.{phase}", seconds, max(frames, 1))
+        metrics.record("video.frame_loop", time.perf_counter() - self.start)
+        metrics.increment("video.frames", frames)
+
+
+def add_text(cap, out, text, fps, frame_width, frame_height, font_scale=1, text_color=(255, 255, 255), font_thickness=2, shadow_color=(0, 0, 0), shadow_offset=(2, 2), duration=10, max_frames=None, font=None, logo=None, logo_position=(10, 50)):
     """
     Add text with shadow to the bottom center of the video.
+
+    The caption is rasterized once into a sprite and blended onto the text
+    region of each frame inside the text window. With max_frames, only that
+    many frames are written (the head of a segmented render).
+
+    font selects a TrueType font (a name such as "Arial" or a file path),
+    laid out by caption_layout; without it, or if the font is not installed,
+    the caption is drawn with cv2.FONT_HERSHEY_SIMPLEX.
+
+    logo (from initialize_video) is blended at logo_position on every frame,
+    not only inside the text window.
+    """
+    text_layer = make_caption_layer(text, frame_width, frame_height, font_scale, text_color, font_thickness,
+                                    shadow_color, shadow_offset, font)
+    logo_layer = make_logo_layer(logo, frame_width, frame_height, *logo_position)
+    text_frames = int(duration * fps)
+    frame_count = 0
+    timings = FrameTimings()
+
+    while cap.isOpened() and (max_frames is None or frame_count < max_frames):
+        ret, frame = cap.read()
+        timings.lap("decode")
+        if not ret:
+            break
+
+        frame_count += 1
+        in_text_window = frame_count <= text_frames
+        if (in_text_window or logo_layer is not None) and not frame.flags.writeable:
+            frame = frame.copy()  # Cached template frames are shared read-only views
+        composite_layer(frame, logo_layer)
+        if in_text_window:
+            composite_layer(frame, text_layer)
+        timings.lap("composite")
+
+        out.write(frame)
+        timings.lap("write")
+
+    timings.record(frame_count)
+
+
+def segment_boundary(text_frames, total_frames, gop=SEGMENT_GOP, min_tail=SEGMENT_MIN_TAIL):
+    """
+    First frame of the template tail that can be stream-copied.
+
+    The overlay end is rounded up to a multiple of gop, so captions of
+    slightly different durations share the same pre-encoded tail. A tail
+    shorter than min_tail frames saves less than the extra concat costs, so
+    there is no tail then.
+
+    :param text_frames: Number of frames that carry the caption.
+    :param total_frames: Number of frames in the template.
+    :param gop: Segment alignment in frames.
+    :param min_tail: Minimum number of frames in a tail.
+    :return: The boundary frame index; total_frames means there is no tail.
+    """
+    boundary = -(-text_frames // gop) * gop
+    return boundary if total_frames - boundary >= min_tail else total_frames
+
+
+def get_template_tail(video_path, start_frame, encoder=None, segment_dir=SEGMENT_DIR, logo=None, logo_position=(10, 50)):
+    """
+    Return the template from start_frame on, encoded once with the same libx264
+    settings as the rendered heads so the two can be joined without re-encoding.
+
+    Tails are cached on disk by template (path, size, mtime), start frame,
+    encoder settings and logo, which is blended into the tail as in add_text.
+
+    :param video_path: Path to the template video.
+    :param start_frame: First frame of the tail, see segment_boundary().
+    :param encoder: Dict of libx264 options, see ENCODER_DEFAULTS.
+    :param segment_dir: Directory of the cached tails.
+    :param logo: Logo image from initialize_video, or None.
+    :param logo_position: Top-left corner (x, y) of the logo.
+    :return: Path to the encoded tail.
+    """
+    options = dict(ENCODER_DEFAULTS, **(encoder or {}))
+    stat = os.stat(video_path)
+    logo_key = None if logo is None else [hashlib.sha1(np.ascontiguousarray(logo).tobytes()).hexdigest(),
+                                          list(logo.shape), list(logo_position)]
+    key = json.dumps([os.path.abspath(video_path), stat.st_size, stat.st_mtime_ns, start_frame,
+                      options["preset"], options["crf"], logo_key])
+    tail_path = os.path.join(segment_dir, hashlib.sha1(key.encode()).hexdigest() + ".mp4")
+
+    with _tail_lock:
+        if os.path.exists(tail_path):
+            metrics.increment("segment_cache.hits")
+            return tail_path
+
+        metrics.increment("segment_cache.misses")
+        start = time.perf_counter()
+        os.makedirs(segment_dir, exist_ok=True)
+        metadata = probe_video(video_path)
+        fd, tmp_path = tempfile.mkstemp(suffix=".mp4", dir=segment_dir)
+        os.close(fd)
+        cap = cv2.VideoCapture(video_path)
+        out = FFmpegWriter(tmp_path, metadata["fps"], (metadata["width"], metadata["height"]), **options)
+        logo_layer = make_logo_layer(logo, metadata["width"], metadata["height"], *logo_position)
+        try:
+            for _ in range(start_frame):
+                if not cap.grab():
+                    break
+            while True:
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                composite_layer(frame, logo_layer)
+                out.write(frame)
+        finally:
+            cap.release()
+            out.release()
+        # Other processes may build the same tail; the last rename wins with identical content
+        os.replace(tmp_path, tail_path)
+        metrics.record("video.encode_tail", time.perf_counter() - start)
+        return tail_path
+
+
+def concat_segments(segment_paths, output_path, audio_source=None):
+    """
+    Join H.264 segments encoded with the same settings into one mp4 without
+    re-encoding, copying the audio track of audio_source if it has one.
     """
-    wrapped_text = wrap_text(text, frame_width, font_scale, font_thickness)
-    y_start = calculate_text_position(wrapped_text, frame_height, font_scale, font_thickness)
+    fd, list_path = tempfile.mkstemp(suffix=".txt", dir=os.path.dirname(os.path.abspath(output_path)))
+    try:
+        with os.fdopen(fd, "w") as f:
+            for path in segment_paths:
+                escaped = os.path.abspath(path).replace("'", "'\\''")
+                f.write(f"file '{escaped}'\n")
+        command = ["ffmpeg", "-y", "-loglevel", "error", "-f", "concat", "-safe", "0", "-i", list_path]
+        if audio_source:
+            command += ["-i", audio_source, "-map", "0:v:0", "-map", "1:a:0?", "-shortest"]
+        command += ["-c", "copy", "-movflags", "+faststart", output_path]
+        with metrics.span("video.concat"):
+            subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
+        return True
+    except Exception as e:
+        print(f"Failed to concatenate video segments: {e}")
+        return False
+    finally:
+        os.remove(list_path)
+
+
+def make_frame_transform(frame_width, frame_height, size, fit="crop"):
+    """
+    Build the per-frame geometry for an output rendition.
+
+    "crop" scales the template to cover the output size and cuts the center;
+    "pad" scales it to fit inside and fills the rest with black bars.
+
+    :param frame_width: Template width.
+    :param frame_height: Template height.
+    :param size: Output (width, height), or None to keep the template size.
+    :param fit: "crop" or "pad".
+    :return: A function frame -> new output frame, or None when no change is needed.
+    """
+    if size is None or tuple(size) == (frame_width, frame_height):
+        return None
+    width, height = size
+    if fit == "crop":
+        scale = max(width / frame_width, height / frame_height)
+        crop_width, crop_height = min(round(width / scale), frame_width), min(round(height / scale), frame_height)
+        x, y = (frame_width - crop_width) // 2, (frame_height - crop_height) // 2
+
+        def transform(frame):
+            return cv2.resize(frame[y:y + crop_height, x:x + crop_width], (width, height), interpolation=cv2.INTER_AREA)
+        return transform
+
+    if fit == "pad":
+        scale = min(width / frame_width, height / frame_height)
+        scaled_width, scaled_height = round(frame_width * scale), round(frame_height * scale)
+        left, top = (width - scaled_width) // 2, (height - scaled_height) // 2
+        right, bottom = width - scaled_width - left, height - scaled_height - top
+
+        def transform(frame):
+            scaled = cv2.resize(frame, (scaled_width, scaled_height), interpolation=cv2.INTER_AREA)
+            return cv2.copyMakeBorder(scaled, top, bottom, left, right, cv2.BORDER_CONSTANT, value=(0, 0, 0))
+        return transform
+
+    raise ValueError(f"Unknown fit mode: {fit}")
+
+
+def add_text_renditions(cap, renditions, text, fps, frame_width, frame_height, font_scale=1, text_color=(255, 255, 255),
+                        font_thickness=2, shadow_color=(0, 0, 0), shadow_offset=(2, 2), duration=10, font=None,
+                        logo=None, logo_position=(10, 50)):
+    """
+    Decode the template once and write every frame to several output renditions.
+
+    Each rendition has its own geometry, caption layout and logo layer (built
+    once), and its own writer. The font scale follows the rendition's short
+    side relative to the template, so captions keep their relative size.
+
+    :param renditions: List of tuples (out, size, fit), see make_frame_transform.
+    """
+    outputs = []
+    for out, size, fit in renditions:
+        width, height = size or (frame_width, frame_height)
+        scale = min(width, height) / min(frame_width, frame_height)
+        outputs.append((
+            out,
+            make_frame_transform(frame_width, frame_height, size, fit),
+            make_caption_layer(text, width, height, font_scale * scale, text_color, font_thickness, shadow_color,
+                               shadow_offset, font),
+            make_logo_layer(logo, width, height, *logo_position),
+        ))
     text_frames = int(duration * fps)
     frame_count = 0
+    timings = FrameTimings()
 
     while cap.isOpened():
         ret, frame = cap.read()
+        timings.lap("decode")
         if not ret:
             break
 
         frame_count += 1
-        if frame_count <= text_frames:
-            y = y_start
-            for line in wrapped_text:
-                text_size = cv2.getTextSize(line, cv2.FONT_HERSHEY_SIMPLEX, font_scale, font_thickness)[0]
-                x = (frame_width - text_size[0]) // 2
+        in_text_window = frame_count <= text_frames
+        for out, transform, text_layer, logo_layer in outputs:
+            if transform is not None:
+                output = transform(frame)
+                timings.lap("resize")
+            elif in_text_window or logo_layer is not None:
+                output = frame.copy()  # The source frame is shared by every rendition
+            else:
+                output = frame
+            composite_layer(output, logo_layer)
+            if in_text_window:
+                composite_layer(output, text_layer)
+            timings.lap("composite")
+            out.write(output)
+            timings.lap("write")
 
-                # Draw shadow
-                cv2.putText(frame, line, (x + shadow_offset[0], y + shadow_offset[1]), cv2.FONT_HERSHEY_SIMPLEX, font_scale, shadow_color, font_thickness, cv2.LINE_AA)
+    timings.record(frame_count)
 
-                # Draw main text
-                cv2.putText(frame, line, (x, y), cv2.FONT_HERSHEY_SIMPLEX, font_scale, text_color, font_thickness, cv2.LINE_AA)
-                y += text_size[1] + 9
 
-        out.write(frame)
+def convert_video_to_mp4(input_path, output_path):
+    """
+    Re-encode a video to H.264/AAC so browsers can play it.
+    """
+    try:
+        with metrics.span("video.convert"):
+            subprocess.run([
+                "ffmpeg", "-y", "-i", input_path, "-vcodec", "libx264", "-acodec", "aac", output_path
+            ], check=True)
+        return True
+    except Exception as e:
+        print(f"Failed to convert video: {e}")
+        return False
+
+
+def get_video_resolution(video_path):
+    """
+    Read the width and height of a video from the cached metadata (no ffprobe process).
+    """
+    try:
+        metadata = probe_video(video_path)
+        return metadata["width"], metadata["height"]
+    except Exception as e:
+        print(f"Failed to get video resolution: {e}")
+        return None, None
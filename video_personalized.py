@@ -1,45 +1,76 @@
+import time
+_run_start = time.perf_counter()  # Cold start (first run) or rerun time, shown in the sidebar
+
 import os
 import json
-import subprocess
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
 import streamlit as st
-from get_data import load_data, get_unique_subheaders
-from text_generated import get_response_text
-from video_generated import add_text
-from video_generated import initialize_video
-from video_generated import release_resources
+import metrics
+from caption_layout import get_font_face
+from get_data import warm_up, reload_ner_model
+from merchant_matcher import get_merchant_matcher
+from pipeline import (
+    LOGO_PATH, TEMPLATES, hex_to_bgr, extract_merchants, classify_category, generate_text, output_path_for,
+    select_template,
+)
+from render_queue import POLL_INTERVAL, RENDER_WORKERS, get_render_queue
+from text_generated import get_client
+from video_generated import RENDITIONS
+from transaction_store import load_store
+from video_generated import get_video_resolution, probe_video
 
-def hex_to_bgr(hex_color):
+def warm_up_app():
     """
-    Convert a hex color code (e.g., #FFFFFF) to a BGR tuple for OpenCV.
-    :param hex_color: Hex color code as a string.
-    :return: Tuple (B, G, R)
+    Load the NER model, merchant dictionary, location index, fonts, template
+    metadata and the Groq client, so the first click does not pay for them.
+
+    :return: True if the NER model is ready.
     """
-    hex_color = hex_color.lstrip('#')
-    return tuple(int(hex_color[i:i+2], 16) for i in (4, 2, 0))  # Convert RGB to BGR
+    with metrics.span("app.warm_up"):
+        ready = warm_up()
+        get_font_face("Arial")
+        for template in set(TEMPLATES.values()):
+            if os.path.exists(template):
+                probe_video(template)
+        try:
+            get_client()
+        except Exception as e:
+            print(f"An error occurred while creating the Groq client: {e}")
+    return ready
 
-# Convert video to compatible format using ffmpeg
-def convert_video_to_mp4(input_path, output_path):
-    try:
-        subprocess.run([
-            "ffmpeg", "-y", "-i", input_path, "-vcodec", "libx264", "-acodec", "aac", output_path
-        ], check=True)
-        return True
-    except Exception as e:
-        st.error(f"Failed to convert video: {e}")
-        return False
+# Warm up once per process, in the background while the user fills in the sidebar
+@st.cache_resource
+def start_warm_up():
+    return ThreadPoolExecutor(max_workers=1, thread_name_prefix="warm-up").submit(warm_up_app)
 
-# Check video resolution using ffmpeg
-def get_video_resolution(video_path):
-    try:
-        result = subprocess.run([
-            "ffprobe", "-v", "error", "-select_streams", "v:0", "-show_entries",
-            "stream=width,height", "-of", "csv=p=0", video_path
-        ], stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
-        width, height = map(int, result.stdout.decode().strip().split(","))
-        return width, height
-    except Exception as e:
-        st.error(f"Failed to get video resolution: {e}")
-        return None, None
+start_warm_up()
+
+# First-run and latest rerun times of this process
+@st.cache_resource
+def get_app_timings():
+    return {"cold_start": None, "rerun": None}
+
+# Columnar copy of the Excel file, re-ingested only when the file changes
+@st.cache_resource
+def get_transaction_store(file_path):
+    return load_store(file_path)
+
+# Renders run in worker processes; identical requests reuse the file rendered before
+@st.cache_resource
+def get_app_render_queue():
+    queue = get_render_queue()
+    queue.start_workers(RENDER_WORKERS)
+    return queue
+
+# Background thread for LLM calls that overlap with template preparation
+@st.cache_resource
+def get_text_executor():
+    return ThreadPoolExecutor(max_workers=2)
+
+def generate_text_timed(merchants, use_cache):
+    with metrics.span("stage.llm"):
+        return generate_text(merchants, None, use_cache)
 
 # Set up Streamlit UI
 st.title("📹 Personalized Video Creator")
@@ -67,6 +98,35 @@ shadow_color_hex = st.sidebar.color_picker("Shadow Color", value="#000000")
 shadow_offset_x = st.sidebar.slider("Shadow Offset X", min_value=-10, max_value=10, value=2)
 shadow_offset_y = st.sidebar.slider("Shadow Offset Y", min_value=-10, max_value=10, value=2)
 text_duration = st.sidebar.slider("Text Duration (seconds)", min_value=1, max_value=30, value=10)
+show_logo = st.sidebar.checkbox("Show wondr logo", value=False)
+logo_scale = st.sidebar.slider("Logo Scale", min_value=0.2, max_value=2.0, value=1.0, step=0.1)
+output_formats = st.sidebar.multiselect(
+    "Output Formats", list(RENDITIONS), default=["original"],
+    help="All selected formats are rendered from a single pass over the template."
+)
+bypass_llm_cache = st.sidebar.checkbox("Regenerate text (ignore cached response)", value=False)
+
+if st.sidebar.button("🔄 Reload NER Model"):
+    try:
+        reload_ner_model()
+        st.sidebar.success("NER model reloaded.")
+    except Exception as e:
+        st.sidebar.error(f"Failed to reload the NER model: {e}")
+
+# Time to get here: imports and widgets, before any work triggered by a button
+app_timings = get_app_timings()
+run_seconds = time.perf_counter() - _run_start
+if app_timings["cold_start"] is None:
+    app_timings["cold_start"] = run_seconds
+    metrics.record("app.cold_start", run_seconds)
+else:
+    app_timings["rerun"] = run_seconds
+    metrics.record("app.rerun", run_seconds)
+st.sidebar.caption(
+    f"Cold start: {app_timings['cold_start']:.2f} s"
+    + (f" · last rerun: {app_timings['rerun'] * 1000:.0f} ms" if app_timings["rerun"] is not None else "")
+    + ("" if start_warm_up().done() else " · warming up models...")
+)
 
 
 if st.sidebar.button("Generate Video"):
@@ -74,154 +134,187 @@ if st.sidebar.button("Generate Video"):
         st.error("Please provide all required inputs!")
     else:
         try:
-            # Convert hex colors to BGR
-            text_color = hex_to_bgr(text_color_hex)
-            shadow_color = hex_to_bgr(shadow_color_hex)
-
-            # Step 1: Process Excel Data
-            st.markdown(
-                """
-                <div style="padding: 10px; background-color: #f9f9f9; border-radius: 5px; border: 1px solid #ddd;">
-                    <strong>Processing Excel data...</strong>
-                </div>
-                """,
-                unsafe_allow_html=True
-            )
-            data_processor = load_data(uploaded_file)
-            subheader_values = get_unique_subheaders(data_processor, cif_input)  # Convert CIF to string if needed
-            if not subheader_values:
-                st.error("No matching data found for the given CIF.")
-                st.stop()
-            st.write('list merchant:', subheader_values)
-
-            st.markdown(
-                f"""
-                <div style="padding: 10px; background-color: #f9f9f9; border-radius: 5px; border: 1px solid #ddd;">
-                    <strong>Found {len(subheader_values)} transaction patterns.</strong>
-                </div>
-                """,
-                unsafe_allow_html=True
-            )
-
-            # Step 2: Generate Text with Groq
-            st.markdown(
-                """
-                <div style="padding: 10px; background-color: #f9f9f9; border-radius: 5px; border: 1px solid #ddd;">
-                    <strong>Generating text with Groq...</strong>
-                </div>
-                """,
-                unsafe_allow_html=True
-            )
-            category, generated_text = get_response_text(subheader_values)
-
-            st.write('Category:', category)
-
-            if category == 'makanan & minuman':
-                video_path = './tamplate_video/video_template_mnm.mp4'
-            elif category == 'belanja':
-                video_path = './tamplate_video/video_template_belanja.mp4'
-            elif category == 'hiburan':
-                video_path = './tamplate_video/video_template_hiburan.mp4'
-            else:
-                video_path = './tamplate_video/video_template_hiburan.mp4'
-
-            # Display generated text in a styled bubble
-            st.markdown(
-                f"""
-                <div style="padding: 10px; background-color: #f0f8ff; border-radius: 10px; border: 1px solid #cce7ff;">
-                    <h4 style="color: #007acc;">Generated Text:</h4>
-                    <p style="font-size: 16px; font-family: {selected_font}; color: #333;">{generated_text}</p>
-                </div>
-                """,
-                unsafe_allow_html=True
-            )
-
-            # Step 3: Check Video Resolution
-            st.markdown(
-                """
-                <div style="padding: 10px; background-color: #f9f9f9; border-radius: 5px; border: 1px solid #ddd;">
-                    <strong>Checking video resolution...</strong>
-                </div>
-                """,
-                unsafe_allow_html=True
-            )
-            width, height = get_video_resolution(video_path)
-            if width and height:
+            with metrics.collect() as run_metrics:
+                # Convert hex colors to BGR
+                text_color = hex_to_bgr(text_color_hex)
+                shadow_color = hex_to_bgr(shadow_color_hex)
+
+                # Step 1: Process Excel Data
+                st.markdown(
+                    """
+                    <div style="padding: 10px; background-color: #f9f9f9; border-radius: 5px; border: 1px solid #ddd;">
+                        <strong>Processing Excel data...</strong>
+                    </div>
+                    """,
+                    unsafe_allow_html=True
+                )
+                with metrics.span("stage.warm_up_wait"):
+                    start_warm_up().result()
+                with metrics.span("stage.load_data"):
+                    store = get_transaction_store(uploaded_file)
+                if store is None:
+                    st.error("Failed to load the transaction data.")
+                    st.stop()
+                with metrics.span("stage.extract"):
+                    subheader_values = extract_merchants(store, cif_input)
+                if not subheader_values:
+                    st.error("No matching data found for the given CIF.")
+                    st.stop()
+                st.write('list merchant:', subheader_values)
+                matcher_stats = get_merchant_matcher().stats()
+                st.caption(f"Merchant dictionary hit rate: {matcher_stats['hit_rate']:.0%} of {matcher_stats['lookups']} lookups")
+
                 st.markdown(
                     f"""
                     <div style="padding: 10px; background-color: #f9f9f9; border-radius: 5px; border: 1px solid #ddd;">
-                        <strong>Video resolution: {width}x{height}</strong>
+                        <strong>Found {len(subheader_values)} transaction patterns.</strong>
                     </div>
                     """,
                     unsafe_allow_html=True
                 )
-                if width < height:
-                    st.warning("The video is vertical. Adjusting text position for vertical layout.")
-
-            # Step 4: Create Video with Text
-            st.markdown(
-                """
-                <div style="padding: 10px; background-color: #f9f9f9; border-radius: 5px; border: 1px solid #ddd;">
-                    <strong>Creating video with overlay text...</strong>
-                </div>
-                """,
-                unsafe_allow_html=True
-            )
-            output_path = f"./output/output_video_{cif_input}.mp4"  # Use CIF to name the output file
-            st.write(f"Output path: {os.path.abspath(output_path)}")
-            position = (width // 2, height // 4) if width and height and width < height else (100, 100)
-            
-            cap, out, logo, fps, frame_width, frame_height = initialize_video(video_path, output_path)
-
-            # Now call add_text with the correct parameters
-            add_text(
-                cap=cap, 
-                out=out, 
-                text=generated_text, 
-                fps=fps, 
-                frame_width=frame_width, 
-                frame_height=frame_height, 
-                font_scale=font_scale, 
-                text_color=text_color, 
-                font_thickness=font_thickness, 
-                shadow_color=shadow_color, 
-                shadow_offset=(shadow_offset_x, shadow_offset_y), 
-                duration=text_duration
-            )
-
-            # After the video generation, release resources
-            release_resources(cap, out)
-
-            # Save video and verify
-            if os.path.exists(output_path):
-                file_size = os.path.getsize(output_path)
+
+                # Step 2: Generate Text with Groq
+                st.markdown(
+                    """
+                    <div style="padding: 10px; background-color: #f9f9f9; border-radius: 5px; border: 1px solid #ddd;">
+                        <strong>Generating text with Groq...</strong>
+                    </div>
+                    """,
+                    unsafe_allow_html=True
+                )
+                # The caption request runs in the background while the template is prepared
+                text_future = get_text_executor().submit(
+                    contextvars.copy_context().run, generate_text_timed, subheader_values, not bypass_llm_cache
+                )
+
+                # Template choice only needs the merchant names, not the LLM
+                category = classify_category(subheader_values)
+                st.write('Category:', category)
+
+                video_path = select_template(category)
+
+                # Step 3: Check Video Resolution
+                st.markdown(
+                    """
+                    <div style="padding: 10px; background-color: #f9f9f9; border-radius: 5px; border: 1px solid #ddd;">
+                        <strong>Checking video resolution...</strong>
+                    </div>
+                    """,
+                    unsafe_allow_html=True
+                )
+                width, height = get_video_resolution(video_path)
+                if width and height:
+                    st.markdown(
+                        f"""
+                        <div style="padding: 10px; background-color: #f9f9f9; border-radius: 5px; border: 1px solid #ddd;">
+                            <strong>Video resolution: {width}x{height}</strong>
+                        </div>
+                        """,
+                        unsafe_allow_html=True
+                    )
+                    if width < height and set(output_formats) - {"original", "9:16"}:
+                        st.info("The template is vertical: the 1:1 format is center-cropped and 16:9 is padded, "
+                                "with the caption laid out again for each.")
+
+                generated_text = text_future.result()[1]
+
+                # Display generated text in a styled bubble
                 st.markdown(
                     f"""
-                    <div style="padding: 10px; background-color: #dff0d8; border-radius: 5px; border: 1px solid #d6e9c6;">
-                        <strong>Video file created successfully. File size: {file_size / (1024 * 1024):.2f} MB</strong>
+                    <div style="padding: 10px; background-color: #f0f8ff; border-radius: 10px; border: 1px solid #cce7ff;">
+                        <h4 style="color: #007acc;">Generated Text:</h4>
+                        <p style="font-size: 16px; font-family: {selected_font}; color: #333;">{generated_text}</p>
+                    </div>
+                    """,
+                    unsafe_allow_html=True
+                )
+
+                # Step 4: Create Video with Text
+                st.markdown(
+                    """
+                    <div style="padding: 10px; background-color: #f9f9f9; border-radius: 5px; border: 1px solid #ddd;">
+                        <strong>Creating video with overlay text...</strong>
                     </div>
                     """,
                     unsafe_allow_html=True
                 )
+                render_queue = get_app_render_queue()
+                st.write(f"Output directory: {os.path.abspath(render_queue.output_dir)}")
 
-                # Convert video if necessary, it's really necessary fr
-                converted_path = f"./output/converted_video_{cif_input}.mp4"
-                if convert_video_to_mp4(output_path, converted_path):
-                    st.video(data=converted_path, format="video/mp4", start_time=0)
-
-                    # Provide download link
-                    with open(converted_path, "rb") as video_file:
-                        st.download_button(
-                            label="📥 Download Video",
-                            data=video_file,
-                            file_name=f"converted_video_{cif_input}.mp4",
-                            mime="video/mp4",
-                            help="Click to download your video."
+                style = {
+                    "font_scale": font_scale,
+                    "text_color": text_color,
+                    "font_thickness": font_thickness,
+                    "shadow_color": shadow_color,
+                    "shadow_offset": (shadow_offset_x, shadow_offset_y),
+                    "duration": text_duration,
+                    "font": selected_font,
+                    "logo_path": LOGO_PATH if show_logo else None,
+                    "logo_scale": logo_scale,
+                }
+                renditions = None if output_formats in ([], ["original"]) else output_formats
+                with metrics.span("stage.render"):
+                    job_id = render_queue.submit(video_path, generated_text, style, renditions)
+                    job = render_queue.status(job_id)
+                    if job["status"] == "done":
+                        st.info("The same video was rendered before, reusing it.")
+                    else:
+                        # Poll the job while a worker process renders it
+                        job_status = st.empty()
+                        while job["status"] in ("queued", "running"):
+                            if not render_queue.workers_alive():
+                                job["error"] = "The render workers stopped; restart the app."
+                                break
+                            waited = time.time() - job["created"]
+                            job_status.info(f"Render job {job_id[:8]}: {job['status']} ({waited:.0f} s)")
+                            time.sleep(POLL_INTERVAL)
+                            job = render_queue.status(job_id)
+                        job_status.empty()
+                        run_metrics.merge(job["timings"])
+                outputs = job["outputs"] if job["status"] == "done" else None
+                if job["error"]:
+                    st.error(job["error"])
+                if outputs and all(os.path.exists(path) for path in outputs.values()):
+                    for name, converted_path in outputs.items():
+                        file_size = os.path.getsize(converted_path)
+                        st.markdown(
+                            f"""
+                            <div style="padding: 10px; background-color: #dff0d8; border-radius: 5px; border: 1px solid #d6e9c6;">
+                                <strong>Video file created successfully ({name}). File size: {file_size / (1024 * 1024):.2f} MB</strong>
+                            </div>
+                            """,
+                            unsafe_allow_html=True
                         )
+                        st.video(data=converted_path, format="video/mp4", start_time=0)
+
+                        # Provide download link
+                        with open(converted_path, "rb") as video_file:
+                            st.download_button(
+                                label=f"📥 Download Video ({name})",
+                                data=video_file,
+                                # Files are named by content hash; download under the customer's name
+                                file_name=os.path.basename(output_path_for(cif_input, rendition=name)),
+                                mime="video/mp4",
+                                help="Click to download your video.",
+                                key=f"download_{name}",
+                            )
                 else:
                     st.error("Failed to convert video to a compatible format.")
-            else:
-                st.error("The video file was not found after saving. Please check the video generation logic.")
+
+                # Step 5: Timing breakdown of this run
+                snapshot = run_metrics.snapshot()
+                with st.expander("⏱️ Timing breakdown"):
+                    st.table(metrics.timing_rows(snapshot))
+                    summary = metrics.summarize(snapshot)
+                    if summary["derived"]:
+                        st.caption(", ".join(f"{name}: {value}" for name, value in summary["derived"].items()))
+                    st.download_button(
+                        label="Download metrics (JSON)",
+                        data=json.dumps(summary, indent=2),
+                        file_name=f"metrics_{cif_input}.json",
+                        mime="application/json",
+                        key="download_metrics",
+                    )
 
         except Exception as e:
             st.error(f"An error occurred: {e}")
\ No newline at end of file